@@ -142,6 +142,8 @@ class MplWidgetImport(MplWidget):
         # Scaling
         self.is_scaling = False
         self.scaling_hand = ScalingHandler(self.canvas, self.figure, self.ax)
+        # To publish the handlers changes (set by MainApp)
+        self.app = None
         # Clean stuff !
         self.ax.set_xticks([])
         self.ax.set_xticklabels([])
@@ -174,14 +176,21 @@ class MplWidgetImport(MplWidget):
         self.rect_hand.update_lims(xlim1, xlim2,
                                    ylim1, ylim2)
         self.canvas.draw()
+        self.publish_params()
 
     def update_baseline(self, pt1, pt2):
         self.baseline_hand.update_pts(pt1, pt2)
         self.canvas.draw()
+        self.publish_params()
 
     def update_scaling_pts(self, pts):
         self.scaling_hand.update_pts(pts)
         self.canvas.draw()
+        self.publish_params()
+
+    def publish_params(self):
+        if self.app is not None:
+            self.app.tab1.publish_params()
 
     def get_scale(self):
         return self.scaling_hand.get_scale()
@@ -201,6 +210,7 @@ class MplWidgetImport(MplWidget):
         elif self.is_scaling and len(self.scaling_hand.pts) < 2:
             self.scaling_hand.add_point(event)
             self.canvas.draw()
+            self.publish_params()
         # On a crop handle
         elif self.rect_hand.select_hand_at_point(event):
             self.rect_hand.prepare_for_drag()
@@ -230,6 +240,9 @@ class MplWidgetImport(MplWidget):
         elif self.baseline_hand.is_dragging():
             self.baseline_hand.finish_drag()
             self.baseline_hand.unselect_hand()
+        else:
+            return None
+        self.publish_params()
 
 
 class MplWidgetDetect(MplWidget):
@@ -34,6 +34,7 @@ from PyQt5 import QtWidgets, QtCore, QtGui
 from .design import Ui_MainWindow
 from .dsa_backend import DSA_hdd as DSA
 from .log import Log
+from .quantities import get_displayed_quantities
 from .tab import Tab
 from .tabimport import TabImport
 from .tabedges import TabEdges
@@ -78,6 +79,7 @@ class AppWindow(QMainWindow):
         # Add missing links
         self.ui.mplwidgetanalyze.ui = self.ui
         self.ui.mplwidgetanalyze.app = self
+        self.ui.mplwidgetimport.app = self
         # Initialize progressbar
         self.init_progressbar()
         # Always start from the first tab
@@ -87,17 +89,7 @@ class AppWindow(QMainWindow):
 
     @property
     def plottable_quant(self):
-        pq = ['Frame number', 'Time', 'Position (x, right)',
-              'CL velocity (x, left)', 'CL velocity (x, right)',
-              'Volume (est.)',
-              'Position (x, left)', 'Position (x, center)',
-              'CA (right)', 'CA (left)', 'CA (mean)', 'Base radius',
-              'Height', 'Area', 'Volume']
-        if self.dsa.fit_method == 'wetting ridge':
-            pq += ['Ridge height (left)', 'Ridge height (right)',
-                   'CA (TP, left)', 'CA (TP, right)',
-                   'CA (TP, mean)']
-        return pq
+        return get_displayed_quantities(self.dsa.fit_method)
 
     def init_progressbar(self):
         # Add Progress bar to status bar
@@ -115,7 +107,11 @@ class AppWindow(QMainWindow):
         self.ui.statusbar.addPermanentWidget(self.ui.progressbar)
 
     def cancel_computation(self):
-        self.dsa.stop = True
+        self.dsa.cancel()
+
+    def closeEvent(self, event):
+        self.dsa.close()
+        super().closeEvent(event)
 
     def enable_options(self):
         """ To run after importing at least an image"""
@@ -126,6 +122,12 @@ class AppWindow(QMainWindow):
         # Do nothing if no imported image yet
         if not self.dsa.is_initialized():
             return None
+        # Wait for the current computation to finish
+        if self.dsa.is_computing():
+            self.ui.tabWidget.setCurrentIndex(self.last_tab)
+            self.log.log('Computation in progress, cancel it first',
+                         level=2)
+            return None
         # Leave the current tab
         success = self.tabs[self.last_tab].leave_tab()
         if not success:
@@ -155,7 +157,47 @@ def run():
     description = "Drop shape analyser"
     argparser = argparse.ArgumentParser(prog="PyDSA",
                                         description=description)
+    argparser.add_argument('input', nargs='?',
+                           help="Video, image or glob pattern of images to"
+                                " analyze without the gui")
+    argparser.add_argument('-p', '--params',
+                           help="Infofile with the analysis parameters"
+                                " (default to the one saved next to the"
+                                " input by the gui)")
+    argparser.add_argument('-o', '--output', action='append',
+                           help="File to export the results to (csv, xlsx,"
+                                " npz, h5 or parquet), can be repeated")
+    argparser.add_argument('-j', '--jobs', type=int,
+                           help="Number of worker processes")
+    argparser.add_argument('-t', '--timestamps', action='store_true',
+                           help="Compute the time step of sets of images"
+                                " from their timestamps (EXIF data or"
+                                " modification times)")
+    argparser.add_argument('-b', '--batch',
+                           help="Text file listing the files to analyze"
+                                " without the gui (one per line, optionally"
+                                " followed by an infofile)")
+    argparser.add_argument('-f', '--format', action='append',
+                           help="Format of the batch results (csv, xlsx, npz,"
+                                " h5 or parquet), can be repeated")
     args = argparser.parse_args()
+    # Batch analysis
+    if args.batch is not None:
+        from .batch import BatchQueue
+        log = Log(None)
+        queue = BatchQueue(log, nmb_workers=args.jobs, formats=args.format)
+        queue.add_from_file(args.batch, infofile_path=args.params)
+        success = queue.run()
+        print(queue.get_summary())
+        sys.exit(0 if success else 1)
+    # Headless analysis
+    if args.input is not None:
+        from .headless import HeadlessApp
+        app = HeadlessApp(nmb_workers=args.jobs,
+                          dt_from_timestamps=args.timestamps)
+        success = app.run(args.input, infofile_path=args.params,
+                          outputs=args.output)
+        sys.exit(0 if success else 1)
     # Create apps
     app = QApplication([""])
     app.setStyle('fusion')
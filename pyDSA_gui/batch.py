@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import concurrent.futures as cf
+import glob
+import multiprocessing as mp
+import os
+import time
+
+from .headless import HeadlessApp
+
+
+def _run_item(pattern, infofile_path, formats, nmb_workers):
+    t0 = time.time()
+    app = HeadlessApp(nmb_workers=nmb_workers)
+    success = app.run(pattern, infofile_path=infofile_path, formats=formats)
+    return success, time.time() - t0
+
+
+class BatchItem(object):
+    """
+    File (or set of images) to analyze in a batch.
+    """
+
+    def __init__(self, pattern, infofile_path=None):
+        self.pattern = pattern
+        self.infofile_path = infofile_path
+        self.size = sum(os.path.getsize(path)
+                        for path in glob.glob(pattern))
+        self.status = 'pending'
+        self.duration = None
+
+
+class BatchQueue(object):
+    """
+    Analyze several files without the gui.
+
+    Large files are analyzed one after the other, each one using all the
+    workers. Small files are analyzed in parallel, one file per worker.
+    Results are saved frame by frame in the results stores, so that
+    running again an interrupted batch only computes the missing frames.
+
+    Parameters
+    ----------
+    log: Log object
+        Log for the batch progress.
+    nmb_workers: integer
+        Number of worker processes (default to the number of cpus).
+    large_size: integer
+        Size (in bytes) from which a file is considered large.
+    formats: list of strings
+        Formats of the exported results (see `HeadlessApp.run`).
+    """
+
+    def __init__(self, log, nmb_workers=None, large_size=256*1024**2,
+                 formats=None):
+        if nmb_workers is None:
+            nmb_workers = os.cpu_count() or 1
+        self.log = log
+        self.nmb_workers = nmb_workers
+        self.large_size = large_size
+        self.formats = formats
+        self.items = []
+
+    def add(self, pattern, infofile_path=None):
+        self.items.append(BatchItem(pattern, infofile_path))
+
+    def add_from_file(self, filepath, infofile_path=None):
+        """
+        Add the files listed in a text file.
+
+        Each line contains a video, image or glob pattern of images,
+        optionally followed by the infofile to use (default to
+        `infofile_path`, or to the infofile next to the file).
+        Empty lines and lines starting with '#' are ignored.
+        """
+        with open(filepath, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line == "" or line.startswith('#'):
+                    continue
+                args = line.split(maxsplit=1)
+                if len(args) == 1:
+                    args.append(infofile_path)
+                self.add(*args)
+
+    def _done(self, item, success, duration):
+        item.status = 'done' if success else 'failed'
+        item.duration = duration
+        nmb_done = len([it for it in self.items
+                        if it.status in ['done', 'failed']])
+        self.log.log(f"Batch: [{nmb_done}/{len(self.items)}] "
+                     f"{item.pattern}: {item.status} "
+                     f"({duration:.1f}s)", level=1 if success else 3)
+
+    def run(self):
+        """
+        Analyze all the files of the queue.
+
+        Returns
+        -------
+        success: boolean
+            True if all the files have been analyzed.
+        """
+        items = [item for item in self.items if item.status == 'pending']
+        large = [item for item in items
+                 if item.size >= self.large_size or self.nmb_workers == 1]
+        small = [item for item in items if item not in large]
+        # Small files, in parallel
+        if len(small) != 0:
+            # Qt does not survive forking, so use fresh processes
+            ctx = mp.get_context('spawn')
+            with cf.ProcessPoolExecutor(max_workers=self.nmb_workers,
+                                        mp_context=ctx) as executor:
+                futures = {}
+                for item in small:
+                    item.status = 'running'
+                    future = executor.submit(_run_item, item.pattern,
+                                             item.infofile_path,
+                                             self.formats, 1)
+                    futures[future] = item
+                for future in cf.as_completed(futures):
+                    try:
+                        success, duration = future.result()
+                    except:
+                        self.log.log_unknown_exception()
+                        success, duration = False, 0
+                    self._done(futures[future], success, duration)
+        # Large files, one after the other
+        for item in large:
+            item.status = 'running'
+            try:
+                success, duration = _run_item(item.pattern,
+                                              item.infofile_path,
+                                              self.formats, self.nmb_workers)
+            except:
+                self.log.log_unknown_exception()
+                success, duration = False, 0
+            self._done(item, success, duration)
+        return all(item.status == 'done' for item in self.items)
+
+    def get_summary(self):
+        """
+        Return a summary table of the batch, as text.
+        """
+        width = max([len(item.pattern) for item in self.items] + [4])
+        lines = [f"{'File':<{width}}  {'Size (MB)':>10}  {'Status':<8}"
+                 f"  {'Time (s)':>9}"]
+        for item in self.items:
+            duration = ("" if item.duration is None
+                        else f"{item.duration:.1f}")
+            lines.append(f"{item.pattern:<{width}}  "
+                         f"{item.size/1024**2:>10.1f}  {item.status:<8}"
+                         f"  {duration:>9}")
+        return "\n".join(lines)
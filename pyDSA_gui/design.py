@@ -536,6 +536,9 @@ class Ui_MainWindow(object):
         self.tab4_set_N = QtWidgets.QSpinBox(self.tab4_run_box)
         self.tab4_set_N.setObjectName("tab4_set_N")
         self.verticalLayout_24.addWidget(self.tab4_set_N)
+        self.tab4_progressive_box = QtWidgets.QCheckBox(self.tab4_run_box)
+        self.tab4_progressive_box.setObjectName("tab4_progressive_box")
+        self.verticalLayout_24.addWidget(self.tab4_progressive_box)
         self.tab4_run_button = QtWidgets.QPushButton(self.tab4_run_box)
         self.tab4_run_button.setMinimumSize(QtCore.QSize(0, 30))
         self.tab4_run_button.setObjectName("tab4_run_button")
@@ -703,6 +706,9 @@ class Ui_MainWindow(object):
         self.tab5_export_xlsx_button = QtWidgets.QPushButton(self.tab5_export_box)
         self.tab5_export_xlsx_button.setObjectName("tab5_export_xlsx_button")
         self.verticalLayout_30.addWidget(self.tab5_export_xlsx_button)
+        self.tab5_export_binary_button = QtWidgets.QPushButton(self.tab5_export_box)
+        self.tab5_export_binary_button.setObjectName("tab5_export_binary_button")
+        self.verticalLayout_30.addWidget(self.tab5_export_binary_button)
         self.verticalLayout_28.addWidget(self.tab5_export_box)
         self.tab5_number_format_box = QtWidgets.QGroupBox(self.frame_5)
         self.tab5_number_format_box.setEnabled(False)
@@ -724,14 +730,12 @@ class Ui_MainWindow(object):
         spacerItem22 = QtWidgets.QSpacerItem(20, 562, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         self.verticalLayout_28.addItem(spacerItem22)
         self.horizontalLayout.addWidget(self.frame_5)
-        self.tab5_DataTable = QtWidgets.QTableWidget(self.tabdata)
+        self.tab5_DataTable = QtWidgets.QTableView(self.tabdata)
         self.tab5_DataTable.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.tab5_DataTable.setDragEnabled(True)
         self.tab5_DataTable.setDragDropMode(QtWidgets.QAbstractItemView.DragOnly)
         self.tab5_DataTable.setAlternatingRowColors(True)
         self.tab5_DataTable.setObjectName("tab5_DataTable")
-        self.tab5_DataTable.setColumnCount(0)
-        self.tab5_DataTable.setRowCount(0)
         self.tab5_DataTable.verticalHeader().setVisible(False)
         self.horizontalLayout.addWidget(self.tab5_DataTable)
         self.tabWidget.addTab(self.tabdata, "")
@@ -821,6 +825,9 @@ class Ui_MainWindow(object):
         self.tab1_zoom_to_area.clicked['bool'].connect(MainWindow.tab1.zoom_to_area)
         self.tab4_run_all_button.clicked.connect(MainWindow.tab4.compute_all)
         self.tab5_export_xlsx_button.clicked['bool'].connect(MainWindow.tab5.export_as_xlsx)
+        self.tab5_export_binary_button.clicked['bool'].connect(MainWindow.tab5.export_as_binary)
+        self.tab1_set_dt_text.textChanged['QString'].connect(MainWindow.tab1.publish_params)
+        self.tab1_set_scaling_text.textChanged['QString'].connect(MainWindow.tab1.publish_params)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
     def retranslateUi(self, MainWindow):
@@ -918,6 +925,8 @@ class Ui_MainWindow(object):
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tabfit), _translate("MainWindow", "Fitting"))
         self.label.setText(_translate("MainWindow", "Use every N frames"))
         self.tab4_set_N.setToolTip(_translate("MainWindow", "The default value is calculated so that around 50 frames are analysed."))
+        self.tab4_progressive_box.setToolTip(_translate("MainWindow", "Compute every 64th frame first, then refine the results until every frame is analysed (can be stopped at any time)."))
+        self.tab4_progressive_box.setText(_translate("MainWindow", "Progressive"))
         self.tab4_run_button.setText(_translate("MainWindow", "Compute"))
         self.tab4_run_all_button.setText(_translate("MainWindow", "Compute all"))
         self.tab4_xaxis_box.setTitle(_translate("MainWindow", "X axis"))
@@ -936,6 +945,8 @@ class Ui_MainWindow(object):
         self.tab5_export_csv_button.setText(_translate("MainWindow", "Export as csv"))
         self.tab5_export_xlsx_button.setToolTip(_translate("MainWindow", "Export all the computed data to a csv text file"))
         self.tab5_export_xlsx_button.setText(_translate("MainWindow", "Export as xlsx"))
+        self.tab5_export_binary_button.setToolTip(_translate("MainWindow", "Export the computed data, edges and fits to a binary file (npz, hdf5 or parquet)"))
+        self.tab5_export_binary_button.setText(_translate("MainWindow", "Export as binary"))
         self.tab5_number_format_box.setTitle(_translate("MainWindow", "Number format"))
         self.label_2.setText(_translate("MainWindow", " Significant digits"))
         self.tab5_significativ_numbers.setToolTip(_translate("MainWindow", "Only affects the datatable display"))
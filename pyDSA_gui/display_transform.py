@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import numpy as np
+
+
+class DisplayTransform(object):
+    """
+    Transform from the physical coordinates of the precomputed images
+    to the pixel coordinates of the displayed (raw) images.
+
+    Parameters
+    ----------
+    precomp_params: dict
+        Precomputation parameters the transform is computed from.
+    """
+
+    def __init__(self, precomp_params):
+        self.params = precomp_params
+        dx = precomp_params['dx'].asNumber()
+        lims = precomp_params['lims']
+        self.scale = np.array([1/dx, -1/dx])
+        self.offset = np.array([-lims[0][0], lims[1][1]])
+
+    def __call__(self, pts, axis=0):
+        """
+        Return the display coordinates of the given points.
+
+        Parameters
+        ----------
+        pts: array
+            Points coordinates.
+        axis: integer
+            Axis of `pts` holding the x and y coordinates.
+        """
+        pts = np.asarray(pts, dtype=float)
+        shape = [1]*pts.ndim
+        shape[axis] = 2
+        return pts*self.scale.reshape(shape) + self.offset.reshape(shape)
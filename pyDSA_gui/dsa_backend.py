@@ -27,15 +27,29 @@ __email__ = "gaby.launay@tutanota.com"
 __status__ = "Development"
 
 
-import cv2
 import pyDSA_core as dsa
 from IMTreatment.utils import make_unit
 import numpy as np
 from scipy import ndimage
+import hashlib
 import json
 import os
+import threading
 import unum
 
+from . import dsa_pipeline
+from .display_transform import DisplayTransform
+from .dsa_pool import FitPool
+from .frame_cache import FrameCache
+from .frame_sources import VideoSource, ImagesSource, StackSource, \
+    natural_sort_key
+from .frame_store import MemmapFrames, decode_images
+from .params import GuiParams
+from .prefetcher import Prefetcher
+from .quantities import QuantityEngine
+from .results_store import ResultsStore, get_input_id
+from .workers import BackgroundTask, Cancelled
+
 
 class myJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -43,6 +57,8 @@ class myJSONEncoder(json.JSONEncoder):
             return {"__unum.Unum__": [obj.asNumber(), obj.strUnit()]}
         if isinstance(obj, np.ndarray):
             return list(obj)
+        if isinstance(obj, np.generic):
+            return obj.item()
         return json.JSONEncoder.default(self, obj)
 
 
@@ -60,16 +76,21 @@ class myJSONDecoder(json.JSONDecoder):
 
 
 class DSA(object):
-    def __init__(self, app):
+    def __init__(self, app, params=None):
         self.app = app
         self.ui = app.ui
         self.log = app.log
+        # Computation parameters (from the gui by default)
+        if params is None:
+            params = GuiParams(app)
+        self.params = params
         self.log.log('DSA backend: initializing backend', level=1)
         # Input
         self.input_type = None
         self.filepath = None
         # Computation control
         self.stop = False
+        self.task = None
         # Images
         self.default_image = dsa.Image()
         self.default_image.import_from_arrays(range(300), range(200),
@@ -82,16 +103,20 @@ class DSA(object):
         # Edges
         self.edge_detection_method = 'canny'
         self.edge_cache = []
-        self.edge_cache_params = [None]*3
-        self.edge_cache_method = None
+        self.edge_cache_key = None
         # Fit
         self.fit_method = 'ellipses'
         self.fits = None
         self.fit_cache = []
-        self.fit_cache_params = [None]*3
-        self.fit_cache_method = 'ellipses'
+        self.fit_cache_key = None
+        # Last computed keys, with the parameters they were computed from
+        self.keys_memo = {}
+        self.fits_frames = None
         # Plottable quantities
         self.plottable_quantity_cache = {}
+        self.quantity_engine = None
+        # Display
+        self.display_transform = None
 
     def is_initialized(self):
         return self.nmb_frames != 0
@@ -111,15 +136,28 @@ class DSA(object):
 
     def save_infofile(self):
         # get infos
-        info = self.get_precomp_params()
+        info = dict(self.get_precomp_params())
+        info.update({"edge_method": self.edge_detection_method,
+                     "edge_params": self.get_edge_params(),
+                     "fit_method": self.fit_method,
+                     "fit_params": self.get_fit_params(),
+                     "run_params": self.get_run_params()})
         info.update({"infofile_maker": "pydsaqt5"})
         infofile_path = self.get_infofile()
         # make it serializable
         with open(infofile_path, 'w+') as f:
             json.dump(info, f, cls=myJSONEncoder)
 
-    def read_infofile(self):
-        infofile_path = self.get_infofile()
+    def read_infofile(self, infofile_path=None):
+        """
+        Return the content of an infofile (default to the one next to
+        the imported files), or None if it is not valid.
+
+        Only the default infofile is removed if corrupted.
+        """
+        default = infofile_path is None
+        if default:
+            infofile_path = self.get_infofile()
         # No file (yet)
         if not os.path.isfile(infofile_path):
             return None
@@ -128,6 +166,9 @@ class DSA(object):
             with open(infofile_path, 'r') as f:
                 dic = json.load(f, cls=myJSONDecoder)
         except:
+            if not default:
+                self.log.log(f'Corrupted infofile: {infofile_path}', level=3)
+                return None
             self.log.log('Corrupted infofile, reinitializing...', level=2)
             os.remove(infofile_path)
             return None
@@ -140,19 +181,26 @@ class DSA(object):
         return dic
 
     def check_cache(self):
-        if self.is_precomp_params_changed() or self.is_edges_param_changed():
+        """
+        Drop the cached edges and fits that are not valid anymore.
+
+        Each stage only depends on its own parameters
+        (see `get_edge_key` and `get_fit_key`): changing the fit parameters
+        keeps the edges, and changing the temporal crop or the time step
+        keeps everything.
+        """
+        edge_key = self.get_edge_key()
+        fit_key = self.get_fit_key()
+        changed = False
+        if edge_key != self.edge_cache_key:
             self.reset_cache()
-            self.edge_cache_params = self.get_edge_params()
-            self.fit_cache_params = self.get_fit_params()
-            self.precomp_cache_params = self.get_precomp_params()
-            self.clear_plottable_quantity_cache()
-            return True
-        if self.is_fits_params_changed():
+            changed = True
+        elif fit_key != self.fit_cache_key:
             self.reset_cache(edge=False)
-            self.fit_cache_params = self.get_fit_params()
-            self.clear_plottable_quantity_cache()
-            return True
-        return False
+            changed = True
+        self.edge_cache_key = edge_key
+        self.fit_cache_key = fit_key
+        return changed
 
     def reset_cache(self, edge=True, fit=True):
         if self.nmb_frames is not None:
@@ -163,7 +211,113 @@ class DSA(object):
             self.clear_plottable_quantity_cache()
             self.fits = None
 
+    def close(self):
+        self.cancel()
+
+    def prefetch(self, ind):
+        pass
+
+    def is_computing(self):
+        return self.task is not None
+
+    def cancel(self):
+        """ Stop the running computation, if any. """
+        self.stop = True
+        if self.task is not None:
+            self.task.stop()
+
+    def run_in_background(self, job, text_progress, text_finished,
+                          on_partial=None, on_finished=None):
+        """
+        Run a computation in a separate thread.
+
+        Parameters
+        ----------
+        job: function
+            Function `job(hook, partial)` doing the computation.
+            It should not access the gui, and call `hook(i, maxi)`
+            after each step and `partial(res)` to send intermediate
+            results back to the main thread.
+        text_progress, text_finished: strings
+            Messages to display in the status bar.
+        on_partial: function
+            Called with the intermediate results (in the main thread).
+        on_finished: function
+            Called with the job result (None if the job failed or
+            has been cancelled) when the computation is over
+            (in the main thread).
+        """
+        # Without gui, simply run the job here
+        if self.ui is None:
+            return self._run_now(job, text_progress, text_finished,
+                                 on_partial, on_finished)
+        # Only one computation at a time
+        if self.task is not None:
+            self.task.stop()
+            self.task.wait()
+        # Forbid the user to interact with th gui
+        self.ui.tabWidget.setEnabled(False)
+        self.stop = False
+        hook = self.get_progressbar_hook(text_progress, text_finished)
+        task = None
+
+        def partial(res):
+            if self.task is task and on_partial is not None:
+                on_partial(res)
+
+        def done(res=None):
+            # results from a replaced computation
+            if self.task is not task:
+                return None
+            task.wait()
+            self.task = None
+            self.stop = False
+            hook(0, 1)
+            self.ui.tabWidget.setEnabled(True)
+            if on_finished is not None:
+                on_finished(res)
+
+        def failed(exc_info):
+            if self.task is task:
+                self.log.log_unknown_exception(exc_info)
+            done()
+        task = BackgroundTask(job, on_progress=hook, on_partial=partial,
+                              on_finished=done, on_failed=failed,
+                              on_cancelled=done)
+        self.task = task
+        task.start()
+        return task
+
+    def _run_now(self, job, text_progress, text_finished, on_partial=None,
+                 on_finished=None):
+        """
+        Run a computation in the current thread
+        (see `run_in_background`).
+        """
+        hook = self.get_progressbar_hook(text_progress, text_finished)
+        self.stop = False
+        res = None
+        try:
+            res = job(hook, on_partial or (lambda res: None))
+        except Cancelled:
+            pass
+        except:
+            self.log.log_unknown_exception()
+        if on_finished is not None:
+            on_finished(res)
+        return None
+
     def get_progressbar_hook(self, text_progress, text_finished):
+        # No progressbar, only log the progress
+        if self.ui is None:
+            def hook(i, maxi):
+                i += 1
+                if i == maxi:
+                    self.log.log(text_finished, level=1)
+                elif i % max(maxi//10, 1) == 0:
+                    self.log.log(f"{text_progress}: {i}/{maxi}", level=1)
+            return hook
+
         def hook(i, maxi):
             # base 0 to base 1
             i += 1
@@ -195,6 +349,9 @@ class DSA(object):
     def import_video(self, filepath):
         raise NotImplementedError
 
+    def import_stack(self, filepath):
+        raise NotImplementedError
+
     def is_valid_ind(self, ind):
         if self.nmb_frames == 0:
             return False
@@ -205,40 +362,59 @@ class DSA(object):
     def get_dt(self):
         raise NotImplementedError
 
+    def get_display_transform(self):
+        """
+        Return the transform from physical to display coordinates
+        (only recomputed when the precomputation parameters change).
+        """
+        params = self.get_precomp_params()
+        if self.display_transform is None or \
+           self.display_transform.params is not params:
+            self.display_transform = DisplayTransform(params)
+        return self.display_transform
+
     def get_baseline_display_points(self, ind):
-        precomp_params = self.get_precomp_params()
-        lims = precomp_params['lims']
-        dx = precomp_params['dx'].asNumber()
         baseline = self.get_current_precomp_im(ind).baseline
-        pt1 = baseline.pt1.copy()
-        pt2 = baseline.pt2.copy()
-        # x
-        deltax = lims[0][0]
-        pt1[0] = pt1[0]/dx - deltax
-        pt2[0] = pt2[0]/dx - deltax
-        # y
-        deltay = self.sizey + (lims[1][1] - self.sizey)
-        pt1[1] = deltay - pt1[1]/dx
-        pt2[1] = deltay - pt2[1]/dx
+        pt1, pt2 = self.get_display_transform()([baseline.pt1,
+                                                 baseline.pt2], axis=1)
         return pt1, pt2
 
     def get_current_raw_im(self, ind):
         raise NotImplementedError
 
     def get_precomp_params(self):
-        return self.app.tab1.get_params()
+        return self.params.get_precomp_params()
 
-    def is_precomp_params_changed(self):
+    def is_precomp_params_changed(self, old_params=None, keys=None):
+        """
+        Check if the precomputation parameters changed.
+
+        Parameters
+        ----------
+        old_params: dict
+            Parameters to compare to
+            (default to the parameters of the cached edges and fits).
+        keys: list of strings
+            Parameters to compare (default to all).
+        """
         params = self.get_precomp_params()
-        if self.precomp_cache_params is None:
+        if old_params is None:
+            old_params = self.precomp_cache_params
+        if old_params is None:
             return True
+        if keys is None:
+            keys = ['dx', 'dt', 'lims', 'baseline_pts', 'cropt']
         for d in ['dx', 'dt']:
-            if params[d].strUnit() != self.precomp_cache_params[d].strUnit():
+            if d not in keys:
+                continue
+            if params[d].strUnit() != old_params[d].strUnit():
                 return True
-            elif params[d].asNumber() != self.precomp_cache_params[d].asNumber():
+            elif params[d].asNumber() != old_params[d].asNumber():
                 return True
         for crop in ['lims', 'baseline_pts', 'cropt']:
-            if np.any(params[crop] != self.precomp_cache_params[crop]):
+            if crop not in keys:
+                continue
+            if np.any(params[crop] != old_params[crop]):
                 return True
         return False
 
@@ -246,16 +422,10 @@ class DSA(object):
         raise NotImplementedError
 
     def get_edge_params(self):
-        return self.app.tab2.get_params()
+        return self.params.get_edge_params()
 
     def is_edges_param_changed(self):
-        params = self.get_edge_params()
-        if self.edge_cache_method != self.edge_detection_method:
-            return True
-        for p1, p2 in zip(params, self.edge_cache_params):
-            if p1 != p2:
-                return True
-        return False
+        return self.get_edge_key() != self.edge_cache_key
 
     def get_current_edge(self, ind):
         raise NotImplementedError
@@ -265,27 +435,13 @@ class DSA(object):
         if len(edge.xy) == 0:
             return [[], []]
         # Return edge pts
-        pts = edge.xy.transpose().copy()
-        precomp_params = self.get_precomp_params()
-        lims = precomp_params['lims']
-        dx = precomp_params['dx'].asNumber()
-        deltax = lims[0][0]
-        deltay = lims[1][1]
-        pts[0] = pts[0]/dx - deltax
-        pts[1] = deltay - pts[1]/dx
-        return pts
+        return self.get_display_transform()(edge.xy, axis=1).transpose()
 
     def get_fit_params(self):
-        return self.app.tab3.get_params()
+        return self.params.get_fit_params()
 
     def is_fits_params_changed(self):
-        params = self.get_fit_params()
-        if self.fit_cache_method != self.fit_method:
-            return True
-        for p1, p2 in zip(params, self.fit_cache_params):
-            if p1 != p2:
-                return True
-        return False
+        return self.get_fit_key() != self.fit_cache_key
 
     def get_current_fit(self, ind):
         raise NotImplementedError
@@ -304,7 +460,7 @@ class DSA(object):
         if self.fit_method in ['circle', 'ellipse']:
             if fit.fits is None:
                 return [[-999, -998], [-999, -998]], np.array([[-999], [-999]])
-            fit_center = fit.fits[0].copy()
+            fit_center = fit.fits[0]
         elif self.fit_method in ['wetting ridge']:
             fit_center = []
             for i in range(3):
@@ -316,16 +472,8 @@ class DSA(object):
         else:
             fit_center = np.array([[-999], [-999]])
         # Return fit pts
-        precomp_params = self.get_precomp_params()
-        lims = precomp_params['lims']
-        dx = precomp_params['dx'].asNumber()
-        deltax = lims[0][0]
-        deltay = lims[1][1]
-        pts[0] = pts[0]/dx - deltax
-        pts[1] = deltay - pts[1]/dx
-        fit_center[0] = fit_center[0]/dx - deltax
-        fit_center[1] = deltay - fit_center[1]/dx
-        return pts, fit_center
+        transform = self.get_display_transform()
+        return transform(pts), transform(fit_center)
 
     def get_current_ca(self, ind):
         # get the fit
@@ -349,15 +497,7 @@ class DSA(object):
         # return angles
         lines = fit._get_angle_display_lines()
         lines = lines[0:2]
-        precomp_params = self.get_precomp_params()
-        dx = precomp_params['dx'].asNumber()
-        lines = np.array(lines)/dx
-        lims = precomp_params['lims']
-        deltax = lims[0][0]
-        deltay = lims[1][1]
-        lines[:, 0] -= deltax
-        lines[:, 1] = deltay - lines[:, 1]
-        return lines
+        return self.get_display_transform()(lines, axis=1)
 
     def get_params_hash(self):
         """
@@ -365,30 +505,98 @@ class DSA(object):
 
         This is intended to check if the params have changed or not.
         """
+        return hash((self.get_precomp_params(), self.get_edge_params(),
+                     self.edge_detection_method, self.fit_method,
+                     self.get_fit_params(), self.get_run_params()))
+
+    def _get_key(self, params):
+        # json is used (instead of hash()) to have keys stable between sessions
+        text = json.dumps(params, sort_keys=True, cls=myJSONEncoder)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def _get_memoized_key(self, name, deps, compute):
+        """
+        Return the key computed by `compute`, reusing the last one
+        if computed from the same parameters snapshots (`deps`).
+        """
+        memo = self.keys_memo.get(name)
+        # (snapshots are replaced, not modified, when parameters change)
+        if memo is not None and len(memo[0]) == len(deps) \
+           and all(old is new for old, new in zip(memo[0], deps)):
+            return memo[1]
+        key = compute()
+        self.keys_memo[name] = (deps, key)
+        return key
+
+    def get_edge_key(self):
+        """
+        Return a key of the parameters the edges depend on.
+
+        Contrary to `get_params_hash`, this key is the same
+        from one session to the other.
+        """
         precomp_params = self.get_precomp_params()
-        precomp_params['dt'] = precomp_params['dt'].asNumber()
-        precomp_params['dx'] = precomp_params['dx'].asNumber()
-        params = (precomp_params, self.get_edge_params(),
-                  self.edge_detection_method, self.fit_method,
-                  self.get_fit_params(), self.get_run_params())
-        # freeze evertyhing recursively
-        def freeze(o):
-            if isinstance(o, dict):
-                return frozenset({k: freeze(v) for k, v in o.items()}.items())
-            if isinstance(o, list) or isinstance(o, np.ndarray) \
-               or isinstance(o, tuple):
-                return tuple([freeze(v) for v in o])
-            return o
-        return hash(freeze(params))
-
-    def compute_fits(self):
+        edge_params = self.get_edge_params()
+        method = self.edge_detection_method
+
+        def compute():
+            if method in dsa_pipeline.EDGE_METHODS:
+                args = edge_params[dsa_pipeline.EDGE_METHODS.index(method)]
+                args = dict(args, **edge_params[-1])
+            else:
+                args = None
+            params = {'precomp': {key: precomp_params[key]
+                                  for key in ['dx', 'lims', 'baseline_pts']},
+                      'method': method,
+                      'args': args}
+            return self._get_key(params)
+        return self._get_memoized_key(
+            'edge', (precomp_params, edge_params, method), compute)
+
+    def get_fit_key(self):
+        """
+        Return a key of the parameters the fits depend on.
+        """
+        edge_key = self.get_edge_key()
+        fit_params = self.get_fit_params()
+        method = self.fit_method
+
+        def compute():
+            if method in dsa_pipeline.FIT_METHODS:
+                args = fit_params[dsa_pipeline.FIT_METHODS.index(method)]
+            else:
+                args = None
+            params = {'edge': edge_key,
+                      'method': method,
+                      'args': args}
+            return self._get_key(params)
+        return self._get_memoized_key(
+            'fit', (edge_key, fit_params, method), compute)
+
+    def compute_fits(self, on_finished=None, progressive=False,
+                     on_update=None):
         raise NotImplementedError
 
     def compute_cas(self, ind):
         raise NotImplementedError
 
     def get_run_params(self):
-        return self.app.tab4.get_params()
+        return self.params.get_run_params()
+
+    def get_run_inds(self, N=None):
+        """
+        Return the indices of the frames to analyze.
+
+        Frames are taken every `N` frames from the first frame of the
+        temporal crop, so that the frames analyzed with a given `N` are
+        also analyzed with any divisor of `N`.
+        """
+        if self.nmb_frames == 1:
+            return [0]
+        if N is None:
+            N = self.get_run_params()['N']
+        ff, lf = self.get_precomp_params()['cropt']
+        return [ind - 1 for ind in range(ff, lf + 1, max(N, 1))]
 
     def get_plotable_quantity(self, quant, smooth=0):
         # fits should be computed already...
@@ -401,112 +609,15 @@ class DSA(object):
             return self.plottable_quantity_cache[cache_name]
         except:
             pass
-        # Get units
-        precomp_params = self.get_precomp_params()
-        dx = precomp_params['dx']
-        dt = precomp_params['dt']
-        ff, lf = precomp_params['cropt']
-        unit_x = dx.strUnit()[1:-1]
-        unit_t = dt.strUnit()[1:-1]
-        dt = float(dt.asNumber())
-        #
-        run_params = self.get_run_params()
-        N = run_params['N']
         # Get quantity
         try:
-            if quant == 'Frame number':
-                if self.nmb_frames == 1:
-                    vals, unit = [0, 1], ""
-                else:
-                    vals, unit = np.arange(ff, ff + N*len(self.fits), N), ""
-            elif quant == 'Time':
-                vals, unit = self.fits.times, unit_t
-            elif quant == 'Position (x, right)':
-                _, pt2s = self.fits.get_drop_positions()
-                vals, unit = pt2s[:, 0], unit_x
-            elif quant == 'Position (x, left)':
-                pt1s, _ = self.fits.get_drop_positions()
-                vals, unit = pt1s[:, 0], unit_x
-            elif quant == 'Volume (est.)':
-                vals = self.fits.get_drop_volumes()
-                vals[vals == 0] = np.nan
-                unit = (make_unit(unit_x)**3).strUnit()[1:-1]
-            elif quant == 'CL velocity (x, left)':
-                pt1s, _ = self.fits.get_drop_positions()
-                pt1s = pt1s[:, 0]
-                vel = np.gradient(pt1s, self.fits.dt)
-                vals, unit = vel, f"{unit_x}/{unit_t}"
-            elif quant == 'CL velocity (x, right)':
-                _, pt2s = self.fits.get_drop_positions()
-                pt2s = pt2s[:, 0]
-                vel = np.gradient(pt2s, self.fits.dt)
-                vals, unit = vel, f"{unit_x}/{unit_t}"
-            elif quant == 'Position (x, center)':
-                xys = self.fits.get_drop_centers()
-                vals, unit = xys[:, 0], unit_x
-            elif quant == 'CA (right)':
-                vals, unit = 180 - self.fits.get_contact_angles()[:, 1], "°"
-            elif quant == 'CA (left)':
-                vals, unit = self.fits.get_contact_angles()[:, 0], "°"
-            elif quant == 'CA (mean)':
-                thetas = self.fits.get_contact_angles()
-                thetas[:, 1] = 180 - thetas[:, 1]
-                vals, unit = np.mean(thetas, axis=1), "°"
-            elif quant == 'Base radius':
-                vals, unit = self.fits.get_base_diameters()/2, unit_x
-            elif quant == 'Height':
-                vals, unit = self.fits.get_drop_heights(), unit_x
-            elif quant == 'Area':
-                vals, unit = self.fits.get_drop_areas(), f'{unit_x}^2'
-            elif quant == 'Volume':
-                vals, unit = self.fits.get_drop_volumes(), f'{unit_x}^3'
-            elif quant == 'Ridge height (left)':
-                if self.fit_method == "wetting ridge":
-                    vals = self.fits.get_ridge_height()[0]
-                    unit = f'{unit_x}'
-                else:
-                    vals, unit = [], ""
-            elif quant == 'Ridge height (right)':
-                if self.fit_method == "wetting ridge":
-                    vals = self.fits.get_ridge_height()[1]
-                    unit = f'{unit_x}'
-                else:
-                    vals, unit = [], ""
-            elif quant == 'Ridge height (mean)':
-                if self.fit_method == "wetting ridge":
-                    tps = self.fits.get_triple_points()
-                    vals1 = tps[0][:, 1]
-                    vals2 = tps[1][:, 1]
-                    vals = (vals1 + vals2)/2
-                    unit = f'{unit_x}'
-                else:
-                    vals, unit = [], ""
-            elif quant == 'CA (TP, left)':
-                if self.fit_method == "wetting ridge":
-                    tps = self.fits.get_triple_pts_contact_angles()
-                    vals, unit = tps[:, 0], f'{unit_x}'
-                else:
-                    vals, unit = [], ""
-            elif quant == 'CA (TP, right)':
-                if self.fit_method == "wetting ridge":
-                    tps = self.fits.get_triple_pts_contact_angles()
-                    vals, unit = 180 - tps[:, 1], f'{unit_x}'
-                else:
-                    vals, unit = [], ""
-            elif quant == 'CA (TP, mean)':
-                if self.fit_method == "wetting ridge":
-                    tps = self.fits.get_triple_pts_contact_angles()
-                    tps1 = tps[:, 0]
-                    tps2 = 180 - tps[:, 1]
-                    vals, unit = (tps1 + tps2)/2, f'{unit_x}'
-                else:
-                    vals, unit = [], ""
-            else:
-                self.log.log(f'Non-plotable quantity: {quant}', level=3)
-                vals, unit = [], ""
+            vals, unit = self.get_quantity_engine().get(quant)
+        except KeyError:
+            self.log.log(f'Non-plotable quantity: {quant}', level=3)
+            vals, unit = np.array([]), ""
         except:
             self.log.log_unknown_exception()
-            vals, unit = [], ""
+            vals, unit = np.array([]), ""
         # Smooth if asked
         if smooth != 0 and len(vals) > 1 and np.any(~np.isnan(vals)):
             nans = np.isnan(vals)
@@ -535,15 +646,68 @@ class DSA(object):
         # return
         return vals, vals_ori, unit
 
+    def get_plotable_quantities(self, quants, smooth=0):
+        """
+        Return the values, unsmoothed values and units of several quantities.
+        """
+        return [self.get_plotable_quantity(quant, smooth=smooth)
+                for quant in quants]
+
+    def get_quantity_engine(self):
+        if self.quantity_engine is None:
+            precomp_params = self.get_precomp_params()
+            unit_x = precomp_params['dx'].strUnit()[1:-1]
+            unit_t = precomp_params['dt'].strUnit()[1:-1]
+            if self.nmb_frames == 1:
+                frames = [0, 1]
+            elif self.fits_frames is not None:
+                frames = self.fits_frames
+            else:
+                ff, _ = precomp_params['cropt']
+                N = self.get_run_params()['N']
+                frames = np.arange(ff, ff + N*len(self.fits), N)
+            self.quantity_engine = QuantityEngine(
+                self.fits, frames, unit_x, unit_t,
+                wetting_ridge=self.fit_method == 'wetting ridge')
+        return self.quantity_engine
+
     def clear_plottable_quantity_cache(self):
         self.plottable_quantity_cache = {}
+        self.quantity_engine = None
+
+    def get_fits_edges(self):
+        """
+        Return the edges associated to each fit (None if not available).
+        """
+        if self.fits is None:
+            return []
+        if self.fits_frames is None:
+            return [None]*len(self.fits)
+        edges = [self.edge_cache[frame - 1] for frame in self.fits_frames]
+        if self.nmb_frames == 1:
+            edges = edges*2
+        return edges
 
 
 class DSA_mem(DSA):
-    def __init__(self, app):
-        super().__init__(app)
+    """
+    Backend holding all the frames in memory.
+
+    Parameters
+    ----------
+    use_memmap: boolean
+        If True, videos and image sets are decoded once into
+        a memory-mapped file (next to the infofile, see `MemmapFrames`),
+        instead of being loaded in memory.
+    """
+
+    def __init__(self, app, params=None, use_memmap=False):
+        super().__init__(app, params=params)
         # Ims
         self.ims = None
+        self.use_memmap = use_memmap
+        self.frames = None
+        self.frames_dt = None
         # Precompute
         self.ims_precomp = None
         # Edges
@@ -568,6 +732,7 @@ class DSA_mem(DSA):
             self.log.log_unknown_exception()
             return False
         self.ims = ims
+        self.frames = None
         self.input_type = 'image'
         self.filepath = filepath
         self.reset_cache()
@@ -576,29 +741,73 @@ class DSA_mem(DSA):
         self.sizey = self.ims.shape[1]
         return True
 
+    def import_frames(self, source, log=True):
+        """
+        Decode the frames of a source into a memory-mapped file
+        (next to the infofile).
+        """
+        hook = self.get_progressbar_hook('Decoding frames', 'Frames decoded')
+        try:
+            source.open()
+            self.input_type = source.input_type
+            self.filepath = source.filepath
+            filepath = os.path.splitext(self.get_infofile())[0] + ".frames.npy"
+            frames = MemmapFrames.from_source(source, filepath, hook=hook)
+            self.frames_dt = source.get_dt()
+        except OSError as e:
+            if log:
+                self.log.log(f"Couldn't import '{source.filepath}': {e}",
+                             level=3)
+            return False
+        except:
+            if log:
+                self.log.log_unknown_exception()
+            return False
+        finally:
+            source.close()
+        self.frames = frames
+        self.ims = None
+        self.ims_precomp = None
+        self.nmb_frames = frames.nmb_frames
+        self.reset_cache()
+        self.sizex = frames.sizex
+        self.sizey = frames.sizey
+        return True
+
     def import_images(self, filepaths):
         self.log.log(f'DSA backend: Importing {len(filepaths)} '
                      f'images from folder: {os.path.dirname(filepaths[0])}',
                      level=1)
+        filepaths.sort(key=natural_sort_key)
+        if self.use_memmap:
+            return self.import_frames(ImagesSource(filepaths))
         ims = dsa.TemporalImages(filepath=None, cache_infos=False)
-        filepaths.sort()
         import_hook = self.get_progressbar_hook('Importing image set',
                                                 'Imported image set')
         try:
+            frames = decode_images(filepaths, hook=import_hook)
+            # Images are views on the decoded frames
+            template = dsa.Image()
+            template.import_from_arrays(range(frames.shape[1]),
+                                        range(frames.shape[2]),
+                                        values=frames[0], dtype=np.uint8,
+                                        unit_x="", unit_y="",
+                                        dontchecknans=True)
             for i, filepath in enumerate(filepaths):
-                tmpim = dsa.import_from_image(filepath, cache_infos=False)
+                tmpim = dsa_pipeline.view_image(template)
+                tmpim.values = frames[i]
+                tmpim.filepath = filepath
                 ims.add_field(tmpim, time=i+1, unit_times="", copy=False)
-                import_hook(i, len(filepaths))
-        except IOError:
-            self.log.log(f"Couldn't import selected files: {filepath}",
-                         level=3)
+        except IOError as e:
+            self.log.log(f"Couldn't import selected files: {e}", level=3)
             return False
         except:
             self.log.log_unknown_exception()
             return False
         self.ims = ims
+        self.frames = None
         self.input_type = 'images'
-        self.filepath = filepath
+        self.filepath = filepaths
         self.reset_cache()
         self.nmb_frames = len(self.ims)
         self.sizex = self.ims[0].shape[0]
@@ -607,6 +816,8 @@ class DSA_mem(DSA):
 
     def import_video(self, filepath):
         self.log.log(f'DSA backend: Importing video: {filepath}', level=1)
+        if self.use_memmap:
+            return self.import_frames(VideoSource(filepath))
         hook = self.get_progressbar_hook('Importing video',
                                          'Video imported')
         try:
@@ -623,6 +834,7 @@ class DSA_mem(DSA):
             self.log.log_unknown_exception()
             return None
         self.ims = ims
+        self.frames = None
         self.input_type = 'video'
         self.filepath = filepath
         self.reset_cache()
@@ -631,14 +843,63 @@ class DSA_mem(DSA):
         self.sizey = self.ims[0].shape[1]
         return True
 
+    def import_stack(self, filepath, log=True):
+        self.log.log(f'DSA backend: Importing stack: {filepath}', level=1)
+        source = StackSource(filepath)
+        if self.use_memmap:
+            return self.import_frames(source, log=log)
+        hook = self.get_progressbar_hook('Importing stack', 'Stack imported')
+        ims = dsa.TemporalImages(filepath=None, cache_infos=False)
+        try:
+            source.open()
+            for i in range(source.nmb_frames):
+                ims.add_field(source.get_frame(i), time=i+1, unit_times="",
+                              copy=False)
+                hook(i, source.nmb_frames)
+        except OSError as e:
+            if log:
+                self.log.log(f"Couldn't import '{filepath}': {e}", level=3)
+            return False
+        except:
+            if log:
+                self.log.log_unknown_exception()
+            return False
+        finally:
+            source.close()
+        self.ims = ims
+        self.frames = None
+        self.input_type = 'stack'
+        self.filepath = filepath
+        self.reset_cache()
+        self.nmb_frames = len(self.ims)
+        self.sizex = self.ims[0].shape[0]
+        self.sizey = self.ims[0].shape[1]
+        return True
+
     def get_dt(self):
+        if self.frames is not None:
+            return self.frames_dt
         return self.ims.dt
 
     def get_current_raw_im(self, ind):
+        if self.frames is not None:
+            return self.frames.get_image(ind)
         if self.ims is None:
             return self.default_image
         return self.ims[ind]
 
+    def _crop_frames(self, params):
+        """
+        Return the cropped frames (temporally and spatially),
+        as views on the memory-mapped frames.
+        """
+        ims = dsa.TemporalImages(filepath=None, cache_infos=False)
+        ff, lf = params['cropt']
+        for ind in range(ff - 1, lf):
+            ims.add_field(self.frames.get_image(ind, params['lims']),
+                          time=ind + 1, unit_times="", copy=False)
+        return ims
+
     def precompute_images(self):
         params = self.get_precomp_params()
         if self.ims_precomp is not None:
@@ -649,8 +910,17 @@ class DSA_mem(DSA):
         # store new parameters
         hook = self.get_progressbar_hook('Preparing images for edge detection',
                                          'Images ready for edge detection')
+        # (images are not copied, see `dsa_pipeline.view_image`)
+        # Memory-mapped frames: crop first
+        if self.frames is not None:
+            ims_precomp = self._crop_frames(params)
+        else:
+            ims_precomp = dsa.TemporalImages(filepath=None, cache_infos=False)
+            for t, im in self.ims:
+                ims_precomp.add_field(dsa_pipeline.view_image(im), time=float(t),
+                                      unit_times=self.ims.unit_times,
+                                      copy=False)
         # set baseline
-        ims_precomp = self.ims.copy()
         try:
             base1, base2 = params['baseline_pts']
             ims_precomp.set_baseline(base1, base2)
@@ -658,14 +928,15 @@ class DSA_mem(DSA):
             self.log.log_unknown_exception()
         hook(0, 4)
         # apply crop
-        try:
-            lims = params['lims']
-            limst = params['cropt']
-            ims_precomp.crop(intervx=lims[0], intervy=lims[1],
-                             intervt=[limst[0] - 1, limst[1]],
-                             inplace=True)
-        except:
-            self.log.log_unknown_exception()
+        if self.frames is None:
+            try:
+                lims = params['lims']
+                limst = params['cropt']
+                ims_precomp.crop(intervx=lims[0], intervy=lims[1],
+                                 intervt=[limst[0] - 1, limst[1]],
+                                 inplace=True)
+            except:
+                self.log.log_unknown_exception()
         hook(2, 4)
         # apply scaling
         try:
@@ -679,8 +950,10 @@ class DSA_mem(DSA):
         # store
         self.ims_precomp = ims_precomp
         self.precomp_cache_params = params
-        # reset following edges and fits
-        self.reset_cache()
+        # reset the edges and fits of the analyzed frames
+        # (the frames ones are only dropped if not valid anymore,
+        #  see `check_cache`)
+        self.clear_plottable_quantity_cache()
         self.edges = None
         self.fits = None
 
@@ -696,7 +969,7 @@ class DSA_mem(DSA):
 
     def get_current_edge(self, ind):
         params = self.get_edge_params()
-        params_precomp = self.app.tab1.get_params()
+        params_precomp = self.get_precomp_params()
         im = self.get_current_precomp_im(ind)
         if self.edge_detection_method is None:
             return dsa.DropEdges([], im, None)
@@ -714,7 +987,7 @@ class DSA_mem(DSA):
             contour_args.update(params[-1])
             # Edge detection
             try:
-                params_precomp = self.app.tab1.get_params()
+                params_precomp = self.get_precomp_params()
                 if self.edge_detection_method == 'canny':
                     edge = im.edge_detection(**canny_args)
                 elif self.edge_detection_method == 'contour':
@@ -731,8 +1004,6 @@ class DSA_mem(DSA):
                 return dsa.DropEdges([], im, None)
             # Update cache
             self.edge_cache[ind] = edge
-            self.edge_cache_params = params
-            self.edge_cache_method = self.edge_detection_method
         else:
             self.log.log('DSA backend: Using cached edges for current image',
                          level=1)
@@ -749,7 +1020,7 @@ class DSA_mem(DSA):
         fit = self.fit_cache[ind]
         if fit is None:
             # Ensure the edge is computed
-            edge_params = self.app.tab2.get_params()
+            edge_params = self.get_edge_params()
             edge = self.get_current_edge(ind)
             if edge is None:
                 return dsa.DropFit(edge.baseline, edge.x_bounds, edge.y_bounds)
@@ -795,8 +1066,6 @@ class DSA_mem(DSA):
                 return dsa.DropFit(edge.baseline, edge.x_bounds, edge.y_bounds)
             # Update cache
             self.fit_cache[ind] = fit
-            self.fit_cache_params = params
-            self.fit_cache_method = self.fit_method
         else:
             self.log.log('DSA backend: Using cached fits for current image',
                          level=1)
@@ -826,16 +1095,17 @@ class DSA_mem(DSA):
                     return True
         return False
 
-    def compute_edges(self):
+    def compute_edges(self, on_finished=None):
         params = self.get_edge_params()
         self.log.log('DSA backend: Computing edges for the image set', level=1)
         #
         if self.edge_detection_method is None:
             self.edges = None
             self.fits = None
+            if on_finished is not None:
+                on_finished()
             return None
         # precompute
-        precomp_params = self.app.tab1.get_params()
         if self.ims_precomp is None:
             self.precompute_images()
         if self.is_precomp_params_changed():
@@ -851,6 +1121,8 @@ class DSA_mem(DSA):
                       'args': new_args[self.edge_detection_method]}
         # Check if need to recompute
         if not self.is_edges_param_changed():
+            if on_finished is not None:
+                on_finished()
             return None
         # Only use certains frames
         self.precompute_images()
@@ -864,35 +1136,42 @@ class DSA_mem(DSA):
         except:
             tmp_ims = self.ims_precomp
             self.log.log_unknown_exception()
-        # Edge detection
-        hook = self.get_progressbar_hook('Detecting edges', 'Detected edges')
-        try:
-            if self.edge_detection_method == 'canny':
-                edges = tmp_ims.edge_detection(iteration_hook=hook,
-                                               **canny_args)
-            elif self.edge_detection_method == 'contour':
-                edges = tmp_ims.edge_detection_contour(iteration_hook=hook,
-                                                       **contour_args)
-            else:
-                self.log.log("No edge detection method selected", level=2)
-                self.edges = None
-                self.fits = None
-                return None
-        except Exception:
-                self.log.log("No edges at all could be detected here", level=2)
-                self.edges = None
-                self.fits = None
-                return None
-        except:
-            self.log.log_unknown_exception()
+        method = self.edge_detection_method
+        if method not in ['canny', 'contour']:
+            self.log.log("No edge detection method selected", level=2)
             self.edges = None
             self.fits = None
+            if on_finished is not None:
+                on_finished()
             return None
-        # Store
-        self.edges = edges
-        self.edges_old_params = new_params
-        self.edges_old_method = self.edge_detection_method
-        self.fits = None
+
+        # Edge detection
+        def job(hook, partial):
+            try:
+                if method == 'canny':
+                    return tmp_ims.edge_detection(iteration_hook=hook,
+                                                  **canny_args)
+                else:
+                    return tmp_ims.edge_detection_contour(
+                        iteration_hook=hook, **contour_args)
+            except Cancelled:
+                raise
+            except Exception:
+                return None
+
+        def store(edges):
+            if edges is None:
+                self.log.log("No edges at all could be detected here",
+                             level=2)
+            else:
+                self.edges_old_params = new_params
+                self.edges_old_method = method
+            self.edges = edges
+            self.fits = None
+            if on_finished is not None:
+                on_finished()
+        self.run_in_background(job, 'Detecting edges', 'Detected edges',
+                               on_finished=store)
 
     def is_fits_params_changed(self):
         params = self.get_fit_params()
@@ -925,17 +1204,26 @@ class DSA_mem(DSA):
                     return True
         return False
 
-    def compute_fits(self):
-        params = self.get_fit_params()
-        self.log.log('DSA backend: fitting edges for the image set', level=1)
-        # Check
-        if self.edges is None:
-            self.compute_edges()
+    def compute_fits(self, on_finished=None, progressive=False,
+                     on_update=None):
+        # (progressive mode is not available with in-memory images)
+        # Ensure the edges are up to date first
+        def edges_done():
             if self.edges is None:
                 self.fits = None
+                if on_finished is not None:
+                    on_finished()
                 return None
+            self._compute_fits(on_finished)
+        self.compute_edges(on_finished=edges_done)
+
+    def _compute_fits(self, on_finished=None):
+        params = self.get_fit_params()
+        self.log.log('DSA backend: fitting edges for the image set', level=1)
         if self.fit_method is None:
             self.fits = None
+            if on_finished is not None:
+                on_finished()
             return None
         # Get params
         circle_args = params[0]
@@ -954,75 +1242,128 @@ class DSA_mem(DSA):
                       'args': new_args}
         # Check if need to recompute
         if not self.is_fits_params_changed():
+            if on_finished is not None:
+                on_finished()
             return None
+        method = self.fit_method
+        edges = self.edges
+
         # Fit
-        hook = self.get_progressbar_hook('Fitting edges',
-                                         'Fitted edges')
-        try:
-            if self.fit_method == 'circle':
-                fits = self.edges.fit_circle(iteration_hook=hook,
-                                             **circle_args)
-            elif self.fit_method == 'ellipse':
-                fits = self.edges.fit_ellipse(iteration_hook=hook,
-                                              **ellipse_args)
-            elif self.fit_method == 'ellipses':
-                fits = self.edges.fit_ellipses(iteration_hook=hook,
-                                               **ellipses_args)
-            elif self.fit_method == 'polyline':
-                fits = self.edges.fit_polyline(iteration_hook=hook,
-                                               **polyline_args)
-            elif self.fit_method == 'spline':
-                fits = self.edges.fit_spline(iteration_hook=hook,
-                                             **spline_args)
-            elif self.fit_method == 'wetting ridge':
+        def job(hook, partial):
+            if method == 'circle':
+                fits = edges.fit_circle(iteration_hook=hook, **circle_args)
+            elif method == 'ellipse':
+                fits = edges.fit_ellipse(iteration_hook=hook, **ellipse_args)
+            elif method == 'ellipses':
+                fits = edges.fit_ellipses(iteration_hook=hook,
+                                          **ellipses_args)
+            elif method == 'polyline':
+                fits = edges.fit_polyline(iteration_hook=hook,
+                                          **polyline_args)
+            elif method == 'spline':
+                fits = edges.fit_spline(iteration_hook=hook, **spline_args)
+            elif method == 'wetting ridge':
                 # get triple points from polyfit
-                fits = self.edges.fit_polyline(deg=wr_args['deg'])
+                fits = edges.fit_polyline(deg=wr_args['deg'])
                 fits.detect_triple_points()
                 tps = zip(fits.get_triple_points())
                 # get fitting
-                fits = self.edges.fit_circles(tps, sigma_max=wr_args['sigma'])
+                fits = edges.fit_circles(tps, sigma_max=wr_args['sigma'])
             else:
-                self.app.log.log('No fitting method selected', level=2)
-                self.fits = None
                 return None
-        except:
-            self.log.log_unknown_exception()
-            self.fits = None
-            return None
-        # cas
-        try:
-            self.fits.compute_contact_angle(iteration_hook=hook)
-        except:
-            self.log.log_unknown_exception()
-        # Store
-        self.fits = fits
-        self.fits_old_params = new_params
-        self.fits_old_method = self.fit_method
+            # cas
+            try:
+                fits.compute_contact_angle(iteration_hook=hook)
+            except Cancelled:
+                raise
+            except:
+                pass
+            return fits
+
+        def store(fits):
+            if fits is None and method not in dsa_pipeline.FIT_METHODS:
+                self.log.log('No fitting method selected', level=2)
+            elif fits is not None:
+                self.fits_old_params = new_params
+                self.fits_old_method = method
+            self.fits = fits
+            self.clear_plottable_quantity_cache()
+            if on_finished is not None:
+                on_finished()
+        self.run_in_background(job, 'Fitting edges', 'Fitted edges',
+                               on_finished=store)
 
     def compute_cas(self):
         pass
 
+    def get_fits_edges(self):
+        if self.fits is None:
+            return []
+        edges = [] if self.edges is None else list(self.edges)
+        if len(edges) != len(self.fits):
+            return [None]*len(self.fits)
+        return edges
 
-class DSA_hdd(DSA):
 
-    def __init__(self, app):
-        super().__init__(app)
-        self.cached_current_raw_im = None
-        self.cached_current_precomp_im = None
-        self.cached_current_ind = None
+class DSA_hdd(DSA):
 
-    def reset_cache(self, edge=True, fit=True):
-        super().reset_cache(edge=edge, fit=fit)
-        self.cached_current_raw_im = None
-        self.cached_current_precomp_im = None
-        self.cached_current_ind = None
+    def __init__(self, app, params=None):
+        super().__init__(app, params=params)
+        self.source = None
+        # Frame caches (raw and precomputed frames)
+        self.raw_frames = FrameCache(512*1024**2)
+        self.precomp_frames = FrameCache(256*1024**2)
+        self.precomp_frames_params = None
+        self.frames_lock = threading.Lock()
+        self.prefetcher = None
+        # Results saved on disk
+        self.results_store = None
+        # Parallel computation
+        self.nmb_workers = os.cpu_count() or 1
+        self.pool = None
+
+    def log_frame_cache_stats(self):
+        self.log.log(f'DSA backend: raw frame cache: '
+                     f'{self.raw_frames.get_stats()}', level=1)
+        self.log.log(f'DSA backend: precomputed frame cache: '
+                     f'{self.precomp_frames.get_stats()}', level=1)
+
+    def close(self):
+        self.log_frame_cache_stats()
+        self.stop_prefetching()
+        super().close()
+        if self.task is not None:
+            self.task.wait()
+        self.close_results_store()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.source is not None:
+            self.source.close()
+
+    def _set_source(self, source):
+        if self.source is not None:
+            self.log_frame_cache_stats()
+            self.stop_prefetching()
+            self.close_results_store()
+            self.source.close()
+        self.raw_frames.clear()
+        self.precomp_frames.clear()
+        self.source = source
+        self.input_type = source.input_type
+        self.filepath = source.filepath
+        self.ims = None
+        self.nmb_frames = source.nmb_frames
+        self.sizex = source.sizex
+        self.sizey = source.sizey
+        self.reset_cache()
 
     def import_image(self, filepath, log=True):
         success = self.import_images([filepath], log=log)
         self.input_type = "image"
         return success
 
-    def import_images(self, filepaths, log=True):
+    def import_images(self, filepaths, log=True, dt_from_timestamps=False):
         if len(filepaths) == 1:
             self.log.log(f'DSA backend: Importing image: \'{filepaths[0]}\'',
                          level=1)
@@ -1032,9 +1373,10 @@ class DSA_hdd(DSA):
                          f' \'{os.path.dirname(filepaths[0])}\'',
                          level=1)
         try:
-            filepaths.sort()
-            tmp_im = dsa.import_from_image(filepaths[0], dtype=np.uint8,
-                                           cache_infos=False)
+            filepaths.sort(key=natural_sort_key)
+            source = ImagesSource(filepaths,
+                                  dt_from_timestamps=dt_from_timestamps)
+            source.open()
         except OSError:
             if log:
                 self.log.log(f'Could not load images from first image: '
@@ -1044,24 +1386,14 @@ class DSA_hdd(DSA):
             if log:
                 self.log.log_unknown_exception()
             return None
-        self.reset_cache()
-        self.filepath = filepaths
-        self.vid = filepaths
-        self.input_type = 'images'
-        self.ims = None
-        self.nmb_frames = len(filepaths)
-        self.sizex = tmp_im.shape[0]
-        self.sizey = tmp_im.shape[1]
+        self._set_source(source)
         return True
 
     def import_video(self, filepath, log=True):
         self.log.log(f'DSA backend: Importing video: {filepath}', level=1)
         try:
-            vid = cv2.VideoCapture()
-            vid.open(filepath)
-            success, data = vid.read()
-            if not success:
-                raise OSError()
+            source = VideoSource(filepath)
+            source.open()
         except OSError:
             if log:
                 self.log.log(f'Could not load video from: '
@@ -1071,15 +1403,24 @@ class DSA_hdd(DSA):
             if log:
                 self.log.log_unknown_exception()
             return None
-        self.reset_cache()
-        self.vid = vid
-        self.input_type = 'video'
-        self.filepath = filepath
-        self.ims = None
-        self.nmb_frames = int(self.vid.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.sizex = int(self.vid.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.sizey = int(self.vid.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        self.dt = 1
+        self._set_source(source)
+        return True
+
+    def import_stack(self, filepath, log=True):
+        self.log.log(f'DSA backend: Importing stack: {filepath}', level=1)
+        try:
+            source = StackSource(filepath)
+            source.open()
+        except OSError as e:
+            if log:
+                self.log.log(f'Could not load stack from: '
+                             f'{filepath}: {e}', level=3)
+            return None
+        except:
+            if log:
+                self.log.log_unknown_exception()
+            return None
+        self._set_source(source)
         return True
 
     def is_initialized(self):
@@ -1088,104 +1429,132 @@ class DSA_hdd(DSA):
         return False
 
     def get_dt(self):
-        if isinstance(self.vid, cv2.VideoCapture):
-            return 1/float(self.vid.get(cv2.CAP_PROP_FPS))
-        elif isinstance(self.vid, list):
-            return self.dt
-        else:
+        if self.source is None:
             self.log.log("Cannot get the value of dt...", level=3)
             return 1
+        return self.source.get_dt()
 
-    def get_current_raw_im(self, ind):
+    def get_current_raw_im(self, ind, lims=None):
+        """
+        Return the raw frame `ind`.
+
+        If `lims` is specified and the frame is not already in memory,
+        only this region of the frame is read (and not cached).
+        """
         if not self.is_valid_ind(ind):
             self.log.log(f"Couldn't get the asked frame number: {ind}", level=3)
             return self.default_image
         # check if can use the cached one
-        if (self.cached_current_ind is not None
-            and self.cached_current_raw_im is not None):
-            if self.cached_current_ind == ind:
-                return self.cached_current_raw_im
+        im = self.raw_frames.get(ind)
+        if im is not None:
+            return im
         # Import from hdd
-        im = dsa.Image()
-        if isinstance(self.vid, cv2.VideoCapture):
-            self.vid.set(cv2.CAP_PROP_POS_FRAMES, ind)
-            try:
-                success, data = self.vid.read()
-            except OSError:
-                self.log.log(f'Could not load video from: '
-                             f'{self.filepath}', level=3)
-                return self.default_image
-            except:
-                self.log.log_unknown_exception()
-                return self.default_image
-            if not success:
-                self.log.log(f"Can't decode frame number {ind}", level=3)
-                return self.default_image
-            data = cv2.cvtColor(data, cv2.COLOR_RGB2GRAY)
-            data = data.transpose()[:, ::-1]
-            im.import_from_arrays(range(self.sizex), range(self.sizey),
-                                  unit_x="", unit_y="",
-                                  values=data, dtype=np.uint8,
-                                  dontchecknans=True)
-        elif isinstance(self.vid, list):
-            try:
-                im = dsa.import_from_image(self.vid[ind], cache_infos=False,
-                                           dtype=np.uint8)
-            except OSError:
-                self.log.log(f'Could not load image from: '
-                             f'{self.vid[ind]}', level=3)
-                return self.default_image
-            except:
-                self.log.log_unknown_exception()
-                return self.default_image
-        else:
+        if self.source is None:
             self.log.log("Cannot get the current image... ", level=3)
-            im = self.default_image
+            return self.default_image
+        try:
+            im = self.source.get_frame(ind, lims=lims)
+        except OSError as e:
+            self.log.log(str(e), level=3)
+            return self.default_image
+        except:
+            self.log.log_unknown_exception()
+            return self.default_image
+        if lims is not None:
+            return im
         # update the cache
-        if self.cached_current_ind != ind:
-            self.cached_current_precomp_im = None
-            self.cached_current_ind = ind
-        self.cached_current_raw_im = im
+        self.raw_frames.put(ind, im)
         # return
         return im
 
     def get_current_precomp_im(self, ind):
+        params = self.get_precomp_params()
+        # Precomputed frames are not valid anymore
+        if self.precomp_frames_params is None or \
+           self.is_precomp_params_changed(self.precomp_frames_params,
+                                          keys=['dx', 'lims',
+                                                'baseline_pts']):
+            if len(self.precomp_frames) != 0:
+                self.log_frame_cache_stats()
+            with self.frames_lock:
+                self.precomp_frames.clear()
+                self.precomp_frames_params = params
         # check if can use the cached one
-        if (self.cached_current_ind is not None
-            and self.cached_current_precomp_im is not None):
-            if self.cached_current_ind == ind:
-                return self.cached_current_precomp_im
+        im_precomp = self.precomp_frames.get(ind)
+        if im_precomp is not None:
+            return im_precomp
         # import from hdd
-        params = self.get_precomp_params()
-        im_precomp = self.get_current_raw_im(ind).copy()
-        # Baseline
-        try:
-            base1, base2 = params['baseline_pts']
-            im_precomp.set_baseline(base1, base2)
-        except:
-            self.log.log_unknown_exception()
-        # apply crop
-        try:
-            lims = params['lims']
-            im_precomp.crop(intervx=lims[0], intervy=lims[1],
-                            inplace=True)
-        except:
-            self.log.log_unknown_exception()
-        # apply scaling
-        try:
-            im_precomp.scale(scalex=params['dx'],
-                             scaley=params['dx'],
-                             inplace=True)
-        except:
-            self.log.log_unknown_exception()
+        im_precomp = dsa_pipeline.precompute_image(
+            self.get_current_raw_im(ind, lims=params['lims']), params,
+            log=self.log)
         # update the cache
-        if self.cached_current_ind != ind:
-            self.cached_current_raw_im = None
-            self.cached_current_ind = ind
-        self.cached_current_precomp_im = im_precomp
+        self.precomp_frames.put(ind, im_precomp)
         # store
         return im_precomp
 
+    def get_results_store(self):
+        """
+        Return the store of the results, next to the infofile.
+        """
+        if self.results_store is None:
+            filepath = os.path.splitext(self.get_infofile())[0] + ".results"
+            try:
+                input_id = get_input_id(self.source.filepath)
+                self.results_store = ResultsStore(filepath, input_id)
+            except:
+                self.log.log(f"Cannot save results in {filepath}", level=2)
+                return None
+        return self.results_store
+
+    def close_results_store(self):
+        if self.results_store is not None:
+            try:
+                self.results_store.close()
+            except:
+                self.log.log_unknown_exception()
+            self.results_store = None
+
+    def load_stored_results(self, inds, edge_key, fit_key):
+        """
+        Fill the caches with the results computed in previous sessions.
+        """
+        store = self.get_results_store()
+        if store is None:
+            return None
+        inds = [ind for ind in inds if self.fit_cache[ind] is None]
+        if len(inds) == 0:
+            return None
+        try:
+            edges = store.load_edges(edge_key, inds)
+            fits = store.load_fits(fit_key, inds)
+        except:
+            self.log.log_unknown_exception()
+            return None
+        for ind, edge in edges.items():
+            if self.edge_cache[ind] is None:
+                self.edge_cache[ind] = edge
+        for ind, fit in fits.items():
+            self.fit_cache[ind] = fit
+        if len(fits) != 0:
+            self.log.log(f'DSA backend: loaded {len(fits)} fits from '
+                         f'{store.filepath}', level=1)
+
+    def prefetch(self, ind):
+        """
+        Prepare, in the background, the frames likely to be displayed
+        after frame `ind`.
+        """
+        if self.source is None or self.precomp_frames_params is None:
+            return None
+        if self.prefetcher is None:
+            self.prefetcher = Prefetcher(self)
+        self.prefetcher.request(ind, self.precomp_frames_params)
+
+    def stop_prefetching(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+
     def get_current_edge(self, ind):
         # Reset cache if not valid anymore
         self.check_cache()
@@ -1196,21 +1565,15 @@ class DSA_hdd(DSA):
         # Use cache if possible
         edge = self.edge_cache[ind]
         if edge is None:
-            # Get params
-            canny_args = params[0].copy()
-            canny_args.update(params[-1])
-            contour_args = params[1].copy()
-            contour_args.update(params[-1])
             # Edge detection
+            if self.edge_detection_method not in dsa_pipeline.EDGE_METHODS:
+                self.log.log("No edge detection method selected",
+                             level=2)
+                return dsa.DropEdges([], im, None)
             try:
-                if self.edge_detection_method == 'canny':
-                    edge = im.edge_detection(**canny_args)
-                elif self.edge_detection_method == 'contour':
-                    edge = im.edge_detection_contour(**contour_args)
-                else:
-                    self.log.log("No edge detection method selected",
-                                 level=2)
-                    return dsa.DropEdges([], im, None)
+                edge = dsa_pipeline.detect_edge(im,
+                                                self.edge_detection_method,
+                                                params)
             except Exception:
                 self.log.log("Couldn't find a drop here", level=2)
                 return dsa.DropEdges([], im, None)
@@ -1219,8 +1582,6 @@ class DSA_hdd(DSA):
                 return dsa.DropEdges([], im, None)
             # Update cache
             self.edge_cache[ind] = edge
-            self.edge_cache_params = params
-            self.edge_cache_method = self.edge_detection_method
         return edge
 
     def get_current_fit(self, ind):
@@ -1230,44 +1591,17 @@ class DSA_hdd(DSA):
         # nothing to compute
         if self.fit_method is None:
             return dsa.DropFit(None, [None, None], [None, None])
-        # update cached params
-        self.edge_cache_params = self.get_edge_params()
-        self.fit_cache_params = self.get_fit_params()
         # Use cache if possible
         fit = self.fit_cache[ind]
         if fit is None:
             # Ensure the edge is computed
             edge = self.get_current_edge(ind)
-            # Get params
-            circle_args = params[0]
-            ellipse_args = params[1]
-            ellipses_args = params[2]
-            polyline_args = params[3]
-            spline_args = params[4]
-            wr_args = params[5]
+            if self.fit_method not in dsa_pipeline.FIT_METHODS:
+                self.log.log("No fitting method selected", level=2)
+                return dsa.DropFit(edge.baseline, edge.x_bounds,
+                                   edge.y_bounds)
             try:
-                if self.fit_method == 'circle':
-                    fit = edge.fit_circle(**circle_args)
-                elif self.fit_method == 'ellipse':
-                    fit = edge.fit_ellipse(**ellipse_args)
-                elif self.fit_method == 'ellipses':
-                    fit = edge.fit_ellipses(**ellipses_args)
-                elif self.fit_method == 'polyline':
-                    fit = edge.fit_polyline(**polyline_args)
-                elif self.fit_method == 'spline':
-                    fit = edge.fit_spline(**spline_args)
-                elif self.fit_method == 'wetting ridge':
-                    # triple point estimate
-                    miny = np.min(edge.xy[:, 1])
-                    maxy = np.max(edge.xy[:, 1])
-                    tp_y = miny + (maxy - miny)*wr_args['pos_estimate']
-                    # get fitting
-                    fit = edge.fit_circles([[0, tp_y], [0, tp_y]],
-                                           sigma_max=wr_args['sigma'])
-                else:
-                    self.log.log("No fitting method selected", level=2)
-                    return dsa.DropFit(edge.baseline, edge.x_bounds,
-                                       edge.y_bounds)
+                fit = dsa_pipeline.fit_edge(edge, self.fit_method, params)
             except Exception:
                 self.log.log("Couldn't find a fit here...", level=2)
                 fit = dsa.DropFit(edge.baseline, edge.x_bounds,
@@ -1282,53 +1616,163 @@ class DSA_hdd(DSA):
                 pass
             # Update cache
             self.fit_cache[ind] = fit
-            self.fit_cache_params = params
-            self.fit_cache_method = self.fit_method
         return fit
 
     def compute_edges(self):
         pass
 
-    def compute_fits(self):
+    def compute_fits(self, on_finished=None, progressive=False,
+                     on_update=None):
+        """
+        Compute the fits for the analyzed frames, in the background.
+
+        Parameters
+        ----------
+        on_finished: function
+            Called when the computation is over.
+        progressive: boolean
+            If True, compute every 64th frame first, and then fill the gaps
+            by bisection (every 32th frame, 16th, ..., until every frame),
+            updating `self.fits` after each pass.
+        on_update: function
+            Called after each pass, in progressive mode.
+        """
         self.log.log('DSA backend: fitting edges for the image set', level=1)
-        # Forbid the user to interact with th gui
-        self.ui.tabWidget.setEnabled(False)
-        # Just for safety...
-        self.stop = False
         # checks
         if self.edge_detection_method is None:
             self.edges = None
             self.fits = None
-            self.ui.tabWidget.setEnabled(True)
+            if on_finished is not None:
+                on_finished()
             return None
-        # Get params
-        precomp_params = self.app.tab1.get_params()
-        run_params = self.get_run_params()
-        N = run_params['N']
+        # Get params (before leaving the main thread)
+        precomp_params = self.get_precomp_params()
         dt = float(precomp_params['dt'].asNumber())
-        ff, lf = precomp_params['cropt']
         im = self.get_current_precomp_im(0)
-        hook = self.get_progressbar_hook('Computing', 'Computation done')
+        if progressive:
+            strides = [2**i for i in range(6, -1, -1)]
+        else:
+            strides = [None]
+        passes = [self.get_run_inds(N=stride) for stride in strides]
+        # Only compute the frames that are not cached yet
+        # (computed with another N, or in a previous session)
+        self.check_cache()
+        edge_key = self.get_edge_key()
+        fit_key = self.get_fit_key()
+        self.load_stored_results(passes[-1], edge_key, fit_key)
+        to_compute = []
+        computed = set()
+        for inds in passes:
+            pass_inds = [ind for ind in inds if self.fit_cache[ind] is None
+                         and ind not in computed]
+            computed.update(pass_inds)
+            to_compute.append(pass_inds)
+        nmb_to_compute = len(computed)
+        self.log.log(f'DSA backend: {nmb_to_compute} frames to compute, '
+                     f'{len(passes[-1]) - nmb_to_compute} already computed',
+                     level=1)
+        args = (self.get_precomp_params(), self.edge_detection_method,
+                self.get_edge_params(), self.fit_method,
+                self.get_fit_params())
+        # Use worker processes if worth it
+        use_pool = self.nmb_workers > 1 and nmb_to_compute > 1
+        if use_pool and self.pool is None:
+            self.pool = FitPool(self.nmb_workers)
+        pool = self.pool
+        source = self.source.clone()
+        results_store = self.get_results_store()
+        # Frames of the last finished pass
+        done_inds = passes[0]
+
+        def job(hook, partial):
+            i = 0
+            try:
+                for n, pass_inds in enumerate(to_compute):
+                    if use_pool:
+                        frames = pool.iter_frames(source, pass_inds, *args,
+                                                  poll=lambda: self.stop)
+                    else:
+                        frames = dsa_pipeline.iter_frames(source, pass_inds,
+                                                          *args)
+                    try:
+                        for ind, edge, fit, message in frames:
+                            if self.stop:
+                                break
+                            # fit could not be sent back, refit from the edge
+                            if fit is None and edge is not None:
+                                fit, _ = dsa_pipeline.compute_fit(edge,
+                                                                  args[3],
+                                                                  args[4])
+                            partial(('frame', ind, edge, fit, message))
+                            hook(i, nmb_to_compute)
+                            i += 1
+                    finally:
+                        frames.close()
+                    # Cancelled during the pass (the pool only returns):
+                    # keep the results of the last finished pass
+                    if self.stop:
+                        raise Cancelled()
+                    partial(('pass', n))
+            finally:
+                source.close()
+
+        def store_result(res):
+            nonlocal done_inds
+            if res[0] == 'pass':
+                if not progressive:
+                    return None
+                done_inds = passes[res[1]]
+                self.fits = self._gather_fits(done_inds, dt, im.baseline)
+                self.clear_plottable_quantity_cache()
+                if on_update is not None:
+                    on_update()
+                return None
+            _, ind, edge, fit, message = res
+            if message is not None:
+                self.log.log(f"Frame {ind + 1}: {message}", level=2)
+            if edge is not None:
+                self.edge_cache[ind] = edge
+            if fit is not None:
+                self.fit_cache[ind] = fit
+            # Save on disk
+            if results_store is not None:
+                try:
+                    if edge is not None:
+                        results_store.save_edge(edge_key, ind, edge)
+                    if fit is not None:
+                        results_store.save_fit(fit_key, ind, fit)
+                except:
+                    self.log.log_unknown_exception()
+
+        def finish(res=None):
+            if results_store is not None:
+                try:
+                    results_store.flush()
+                except:
+                    self.log.log_unknown_exception()
+            inds = passes[-1] if not progressive else done_inds
+            self.fits = self._gather_fits(inds, dt, im.baseline)
+            self.clear_plottable_quantity_cache()
+            if on_finished is not None:
+                on_finished()
+        self.run_in_background(job, 'Computing', 'Computation done',
+                               on_partial=store_result, on_finished=finish)
+
+    def _gather_fits(self, inds, dt, baseline):
+        # Gather fits (empty fits for the frames not computed)
         fits = []
-        ts = []
-        # Compute
+        for ind in inds:
+            fit = self.fit_cache[ind]
+            if fit is None:
+                fit = dsa.DropFit(baseline, [np.nan, np.nan],
+                                  [np.nan, np.nan])
+            fits.append(fit)
+        self.fits_frames = np.array(inds) + 1
         if self.nmb_frames == 1:
-            fits = [self.get_current_fit(0)]*2
+            fits = fits*2
             ts = [0, 1]
         else:
-            for i, ind in enumerate(np.arange(ff, lf+1, N)):
-                self.app.globalapp.processEvents()
-                if self.stop:
-                    fit = fits[-1]
-                    fit.fits = None
-                    fit.thetas = None
-                else:
-                    fit = self.get_current_fit(ind-1)
-                fits.append(fit)
-                ts.append(ind*dt)
-                hook(i, int((lf - ff)/N))
-        self.stop = False
-        hook(99, 100)
+            ts = [(ind + 1)*dt for ind in inds]
         # Create dummy edges (necessary to create a fitting class...)
         class Dummy(object):
             pass
@@ -1338,7 +1782,7 @@ class DSA_hdd(DSA):
         edges.unit_times = make_unit("s")
         edges.unit_x = make_unit("")
         edges.unit_y = make_unit("")
-        edges.baseline = im.baseline
+        edges.baseline = baseline
         # store
         if self.fit_method == 'circle':
             fits2 = dsa.temporalfits.TemporalCircleFits(fits, edges)
@@ -1353,7 +1797,6 @@ class DSA_hdd(DSA):
         elif self.fit_method == 'wetting ridge':
             fits2 = dsa.temporalfits.TemporalCirclesFits(fits, edges)
         else:
-            self.app.log.log('No fitting method selected', level=2)
+            self.log.log('No fitting method selected', level=2)
             fits2 = None
-        self.fits = fits2
-        self.ui.tabWidget.setEnabled(True)
+        return fits2
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import copy
+import pyDSA_core as dsa
+import numpy as np
+
+
+EDGE_METHODS = ['canny', 'contour']
+FIT_METHODS = ['circle', 'ellipse', 'ellipses', 'polyline', 'spline',
+               'wetting ridge']
+
+
+def view_image(im):
+    """
+    Return a copy of the image sharing its pixels with `im`.
+
+    Cropping (that slices the pixels) and scaling (that only modifies
+    the axes) can then be applied to the copy without copying the pixels.
+    """
+    view = copy.copy(im)
+    # (axes are modified in place when scaling, the setters copy them)
+    view.axe_x = im.axe_x
+    view.axe_y = im.axe_y
+    return view
+
+
+def precompute_image(im, params, log=None):
+    """
+    Return a copy of the image with the baseline, crop and scaling applied.
+
+    The pixels are not copied (see `view_image`).
+
+    Parameters
+    ----------
+    im: Image object
+        Raw image.
+    params: dict
+        Precomputation parameters (as returned by `TabImport.get_params`).
+    log: Log object
+        If given, errors are logged and the remaining steps still applied.
+        Else, errors are raised.
+    """
+    im_precomp = view_image(im)
+
+    def apply(step, *args, **kwargs):
+        try:
+            step(*args, **kwargs)
+        except:
+            if log is None:
+                raise
+            log.log_unknown_exception()
+    # Baseline
+    base1, base2 = params['baseline_pts']
+    apply(im_precomp.set_baseline, base1, base2)
+    # apply crop
+    lims = params['lims']
+    apply(im_precomp.crop, intervx=lims[0], intervy=lims[1], inplace=True)
+    # apply scaling
+    apply(im_precomp.scale, scalex=params['dx'], scaley=params['dx'],
+          inplace=True)
+    return im_precomp
+
+
+def detect_edge(im, method, params):
+    """
+    Detect the drop edge on a precomputed image.
+    """
+    if method == 'canny':
+        canny_args = params[0].copy()
+        canny_args.update(params[-1])
+        return im.edge_detection(**canny_args)
+    elif method == 'contour':
+        contour_args = params[1].copy()
+        contour_args.update(params[-1])
+        return im.edge_detection_contour(**contour_args)
+    raise ValueError(f"Unknown edge detection method: {method}")
+
+
+def fit_edge(edge, method, params):
+    """
+    Fit a drop edge.
+    """
+    circle_args, ellipse_args, ellipses_args, polyline_args, \
+        spline_args, wr_args = params
+    if method == 'circle':
+        return edge.fit_circle(**circle_args)
+    elif method == 'ellipse':
+        return edge.fit_ellipse(**ellipse_args)
+    elif method == 'ellipses':
+        return edge.fit_ellipses(**ellipses_args)
+    elif method == 'polyline':
+        return edge.fit_polyline(**polyline_args)
+    elif method == 'spline':
+        return edge.fit_spline(**spline_args)
+    elif method == 'wetting ridge':
+        # triple point estimate
+        miny = np.min(edge.xy[:, 1])
+        maxy = np.max(edge.xy[:, 1])
+        tp_y = miny + (maxy - miny)*wr_args['pos_estimate']
+        # get fitting
+        return edge.fit_circles([[0, tp_y], [0, tp_y]],
+                                sigma_max=wr_args['sigma'])
+    raise ValueError(f"Unknown fitting method: {method}")
+
+
+def compute_fit(edge, fit_method, fit_params):
+    """
+    Fit a drop edge, and compute the associated contact angles.
+
+    Returns
+    -------
+    fit: DropFit object
+        Edge fitting (empty if the fitting failed).
+    message: string
+        Reason of the failure, if any.
+    """
+    message = None
+    try:
+        fit = fit_edge(edge, fit_method, fit_params)
+    except Exception:
+        message = "Couldn't find a fit here..."
+        fit = dsa.DropFit(edge.baseline, edge.x_bounds, edge.y_bounds)
+    # contact angle
+    try:
+        fit.compute_contact_angle()
+    except:
+        pass
+    return fit, message
+
+
+def process_image(im, edge_method, edge_params, fit_method, fit_params):
+    """
+    Detect and fit the drop edge on a precomputed image.
+
+    Returns
+    -------
+    edge: DropEdges object
+        Detected edge, or None if the detection failed.
+    fit: DropFit object
+        Edge fitting, with contact angles computed when possible.
+    message: string
+        Reason of the failure, if any.
+    """
+    # Edge detection
+    try:
+        edge = detect_edge(im, edge_method, edge_params)
+    except Exception:
+        edge = None
+        tmp_edge = dsa.DropEdges([], im, None)
+        fit, _ = compute_fit(tmp_edge, fit_method, fit_params)
+        return edge, fit, "Couldn't find a drop here"
+    # Fit
+    fit, message = compute_fit(edge, fit_method, fit_params)
+    return edge, fit, message
+
+
+def process_frame(source, ind, precomp_params, edge_method, edge_params,
+                  fit_method, fit_params):
+    """
+    Read, precompute, detect and fit the frame number `ind` of a source.
+
+    Returns
+    -------
+    edge, fit, message:
+        See `process_image`. Edge and fit are None if the frame
+        could not be read.
+    """
+    try:
+        # (only the cropped region is read)
+        im = source.get_frame(ind, lims=precomp_params['lims'])
+        im = precompute_image(im, precomp_params)
+    except Exception as e:
+        return None, None, f"Can't process frame number {ind}: {e}"
+    return process_image(im, edge_method, edge_params, fit_method,
+                         fit_params)
+
+
+def iter_frames(source, inds, *args):
+    """
+    Process the given frames one by one.
+
+    Yields (ind, edge, fit, message) for each frame,
+    with the arguments of `process_frame`.
+    """
+    for ind in inds:
+        yield (ind, ) + process_frame(source, ind, *args)
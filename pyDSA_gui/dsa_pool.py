@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import collections
+import concurrent.futures as cf
+import multiprocessing as mp
+import numpy as np
+import os
+import pickle
+import sys
+
+import pyDSA_core as dsa
+
+from . import dsa_pipeline
+
+
+# Worker process state
+_stop_event = None
+_source = None
+_shm = None
+_templates = {}
+
+
+def _init_worker(stop_event, source):
+    global _stop_event, _source
+    _stop_event = stop_event
+    # (opened on first access)
+    _source = source
+
+
+def _has_shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        # (python < 3.8)
+        return False
+    return True
+
+
+def _attach_shared_memory(name):
+    """
+    Attach to the shared memory `name`, without tracking it.
+
+    The calling process owns (and unlinks) the shared memory, workers
+    tracking it would unlink it when exiting.
+    """
+    from multiprocessing import shared_memory
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Workers share the resource tracker of the calling process,
+    # so unregistering after attaching would also drop the caller's
+    # registration: do not register in the first place
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _get_shared_values(name, offset, shape):
+    """
+    Return a view on the frame values stored in the shared memory `name`.
+    """
+    global _shm
+    if _shm is None or _shm.name != name:
+        if _shm is not None:
+            try:
+                _shm.close()
+            except BufferError:
+                # still viewed by a previous frame
+                pass
+        _shm = _attach_shared_memory(name)
+    return np.ndarray(shape, dtype=np.uint8, buffer=_shm.buf, offset=offset)
+
+
+def _get_template(shape, origin):
+    """ Image with the axes of a frame region, to be viewed on. """
+    key = (shape, origin)
+    if key not in _templates:
+        im = dsa.Image()
+        im.import_from_arrays(range(origin[0], origin[0] + shape[0]),
+                              range(origin[1], origin[1] + shape[1]),
+                              unit_x="", unit_y="",
+                              values=np.zeros(shape, dtype=np.uint8),
+                              dtype=np.uint8, dontchecknans=True)
+        _templates.clear()
+        _templates[key] = im
+    return _templates[key]
+
+
+def _pack_result(ind, edge, fit, message):
+    if edge is None and fit is None:
+        return ind, None, message
+    # Some fits (polylines) hold local functions that cannot be sent back,
+    # only send back the edge in this case, and let the caller refit
+    try:
+        payload = pickle.dumps((edge, fit))
+    except Exception:
+        payload = pickle.dumps((edge, None))
+    return ind, payload, message
+
+
+def _process_frame(source, ind, *args):
+    return _pack_result(ind, *dsa_pipeline.process_frame(source, ind, *args))
+
+
+def _process_chunk(inds, *args):
+    results = []
+    for ind in inds:
+        if _stop_event.is_set():
+            break
+        results.append(_process_frame(_source, ind, *args))
+    return results
+
+
+def _process_shared_frame(name, offset, shape, origin, ind, precomp_params,
+                          *args):
+    if _stop_event.is_set():
+        return ind, None, "Stopped"
+    try:
+        # (the frame values are not copied)
+        im = dsa_pipeline.view_image(_get_template(shape, origin))
+        im.values = _get_shared_values(name, offset, shape)
+        im = dsa_pipeline.precompute_image(im, precomp_params)
+    except Exception as e:
+        return ind, None, f"Can't process frame number {ind}: {e}"
+    return _pack_result(ind, *dsa_pipeline.process_image(im, *args))
+
+
+class SharedFrames(object):
+    """
+    Ring of slots in shared memory, holding frames for the workers.
+
+    Parameters
+    ----------
+    nmb_slots: integer
+        Number of frames that can be stored at the same time.
+    shape: 2x1 tuple of integers
+        Shape of the frames.
+    """
+
+    def __init__(self, nmb_slots, shape):
+        from multiprocessing import shared_memory
+        self.shape = tuple(shape)
+        self.slot_size = int(np.prod(self.shape))
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=max(nmb_slots*self.slot_size, 1))
+        self.free_slots = collections.deque(range(nmb_slots))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def has_free_slot(self):
+        return len(self.free_slots) != 0
+
+    def put(self, values):
+        """
+        Copy frame values to a free slot.
+
+        Returns
+        -------
+        slot: integer
+            Slot number.
+        offset: integer
+            Position of the slot in the shared memory.
+        """
+        if np.shape(values) != self.shape:
+            raise ValueError(f"Frame of shape {np.shape(values)} instead"
+                             f" of {self.shape}")
+        slot = self.free_slots.popleft()
+        offset = slot*self.slot_size
+        dest = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf,
+                          offset=offset)
+        dest[:] = values
+        return slot, offset
+
+    def release(self, slot):
+        self.free_slots.append(slot)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FitPool(object):
+    """
+    Pool of worker processes detecting and fitting edges frame by frame.
+
+    The source is sent once to the workers, when starting them,
+    then only the frames numbers are sent, by chunks of contiguous frames
+    (so that each worker decodes its frames sequentially).
+
+    Alternatively, frames can be decoded once in the calling thread and
+    sent to the workers through shared memory (see `SharedFrames`),
+    only the results are then pickled. This is used for videos,
+    whose frames are cheaper to decode sequentially.
+    """
+
+    def __init__(self, nmb_workers=None, max_chunk_size=64):
+        if nmb_workers is None:
+            nmb_workers = os.cpu_count() or 1
+        self.nmb_workers = nmb_workers
+        self.max_chunk_size = max_chunk_size
+        self.executor = None
+        self.stop_event = None
+        self.source = None
+
+    def start(self, source):
+        """
+        Start the workers, reading their frames from `source`.
+        """
+        # Qt does not survive forking, so use fresh processes
+        ctx = mp.get_context('spawn')
+        self.stop_event = ctx.Event()
+        self.source = source.clone()
+        self.executor = cf.ProcessPoolExecutor(
+            max_workers=self.nmb_workers, mp_context=ctx,
+            initializer=_init_worker, initargs=(self.stop_event, self.source))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.stop_event.set()
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            self.source = None
+
+    def _is_started_with(self, source):
+        return (self.executor is not None
+                and type(source) == type(self.source)
+                and source.filepath == self.source.filepath)
+
+    def stop(self):
+        """ Ask the workers to stop after their current frame. """
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def _get_chunks(self, inds):
+        chunk_size = len(inds)//(4*self.nmb_workers)
+        chunk_size = min(max(chunk_size, 1), self.max_chunk_size)
+        return [inds[i:i + chunk_size]
+                for i in range(0, len(inds), chunk_size)]
+
+    def iter_frames(self, source, inds, precomp_params, edge_method,
+                    edge_params, fit_method, fit_params, poll=None,
+                    poll_interval=0.1, shared=None):
+        """
+        Process the given frames in the worker processes.
+
+        Parameters
+        ----------
+        source: FrameSource object
+            Source of the raw frames.
+        inds: list of integers
+            Frames to process.
+        precomp_params, edge_params, fit_params: dict
+            Parameters for each step of the computation.
+        edge_method, fit_method: strings
+            Edge detection and fitting methods.
+        poll: function
+            Called regularly while waiting for the workers.
+            Returning True stops the computation.
+        shared: boolean
+            If True, frames are decoded here and sent through shared
+            memory. Default to True for videos only
+            (requires python >= 3.8).
+
+        Yields
+        ------
+        ind: integer
+            Frame number, in increasing order.
+        edge: DropEdges object
+            Detected edge (None if it could not be processed).
+        fit: DropFit object
+            Fit (None if it could not be processed or sent back).
+        message: string
+            Reason of the failure, if any.
+        """
+        # Workers read from another file, restart them
+        if not self._is_started_with(source):
+            self.shutdown()
+            self.start(source)
+        self.stop_event.clear()
+        if shared is None:
+            shared = (source.input_type == 'video'
+                      and _has_shared_memory())
+        args = (precomp_params, edge_method, edge_params, fit_method,
+                fit_params)
+        if shared:
+            yield from self._iter_shared_frames(source, list(inds), args,
+                                                poll, poll_interval)
+            return
+        futures = [self.executor.submit(_process_chunk, chunk,
+                                        precomp_params,
+                                        edge_method, edge_params,
+                                        fit_method, fit_params)
+                   for chunk in self._get_chunks(list(inds))]
+        try:
+            for future in futures:
+                while True:
+                    try:
+                        results = future.result(timeout=poll_interval)
+                        break
+                    except cf.TimeoutError:
+                        if poll is not None and poll():
+                            return
+                for ind, payload, message in results:
+                    if payload is None:
+                        edge, fit = None, None
+                    else:
+                        edge, fit = pickle.loads(payload)
+                    yield ind, edge, fit, message
+        finally:
+            # Stop the remaining chunks (if any)
+            self.stop_event.set()
+            for future in futures:
+                future.cancel()
+            cf.wait(futures)
+
+    def _wait(self, future, poll, poll_interval):
+        """ Return the future result, or None if stopped by `poll`. """
+        while True:
+            try:
+                return future.result(timeout=poll_interval)
+            except cf.TimeoutError:
+                if poll is not None and poll():
+                    return None
+
+    def _iter_shared_frames(self, source, inds, args, poll, poll_interval):
+        """
+        Same as `iter_frames`, with the frames decoded here and sent
+        to the workers through shared memory.
+        """
+        lims = args[0]['lims']
+        frames = None
+        # frames being processed, in order: (ind, slot, future or result)
+        pending = collections.deque()
+        next_ind = 0
+        try:
+            while next_ind < len(inds) or len(pending) != 0:
+                # Decode frames while there is room for them
+                while next_ind < len(inds) and (frames is None
+                                                or frames.has_free_slot()):
+                    ind = inds[next_ind]
+                    next_ind += 1
+                    try:
+                        im = source.get_frame(ind, lims=lims)
+                        origin = (int(im.axe_x[0]), int(im.axe_y[0]))
+                        if frames is None:
+                            frames = SharedFrames(2*self.nmb_workers,
+                                                  im.shape)
+                        slot, offset = frames.put(im.values)
+                    except Exception as e:
+                        pending.append((ind, None, (
+                            ind, None, f"Can't process frame number {ind}:"
+                            f" {e}")))
+                        continue
+                    future = self.executor.submit(
+                        _process_shared_frame, frames.name, offset,
+                        frames.shape, origin, ind, *args)
+                    pending.append((ind, slot, future))
+                # Send back the next result
+                ind, slot, res = pending.popleft()
+                if slot is not None:
+                    future = res
+                    res = self._wait(future, poll, poll_interval)
+                    if res is None:
+                        pending.appendleft((ind, slot, future))
+                        return
+                    frames.release(slot)
+                ind, payload, message = res
+                if payload is None:
+                    edge, fit = None, None
+                else:
+                    edge, fit = pickle.loads(payload)
+                yield ind, edge, fit, message
+        finally:
+            # Stop the remaining frames (if any)
+            self.stop_event.set()
+            futures = [res for _, slot, res in pending if slot is not None]
+            for future in futures:
+                future.cancel()
+            # (workers should be done with the shared memory before freeing)
+            cf.wait(futures)
+            if frames is not None:
+                frames.close()
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+from datetime import datetime
+import json
+import numbers
+import os
+import numpy as np
+import re
+
+
+def add_extension(filepath, ext, filetype=None):
+    """
+    Add an extension to a file path, if it has none.
+
+    Parameters
+    ----------
+    ext: string
+        Default extension (with the dot).
+    filetype: string
+        File type selected in the file dialog (as 'Name (*.ext ...)'),
+        whose first extension is used instead of `ext`.
+    """
+    if os.path.splitext(filepath)[1] != "":
+        return filepath
+    if filetype is not None:
+        match = re.search(r'\*(\.\w+)', filetype)
+        if match is not None:
+            ext = match.group(1)
+    return filepath + ext
+
+
+def get_quantities(dsa, quants, log):
+    """
+    Return the names, values (as float arrays) and units
+    of the quantities to export.
+    """
+    names = []
+    columns = []
+    units = {}
+    values = dsa.get_plotable_quantities(quants)
+    for quant, (val, _, unit) in zip(quants, values):
+        # check that length matches
+        if len(columns) > 0:
+            if len(columns[0]) != len(val):
+                log.log(f"Quantity {quant} does not have the right"
+                        f" length ({len(val)} instead of"
+                        f" {len(columns[0])})", level=3)
+                continue
+        names.append(quant)
+        columns.append(np.asarray(val, dtype=float))
+        units[quant] = unit
+    return names, columns, units
+
+
+def get_headers(names, units):
+    return [f'{name.replace(",", "")} [{units[name].replace(",", "")}]'
+            for name in names]
+
+
+def iter_chunks(columns, chunk_size):
+    """
+    Yield the rows of data, by chunks.
+    """
+    nmb_rows = len(columns[0]) if len(columns) > 0 else 0
+    for start in range(0, nmb_rows, chunk_size):
+        stop = start + chunk_size
+        yield start, np.column_stack([col[start:stop] for col in columns])
+
+
+def save_csv(filepath, names, columns, units, metadata, chunk_size=10000):
+    with open(filepath, 'w') as f:
+        header = (f"File: {metadata['file']}\n"
+                  f"Analysis date: {metadata['date']}\n"
+                  + ", ".join(get_headers(names, units)))
+        f.write('# ' + header.replace('\n', '\n# ') + '\n')
+        for _, chunk in iter_chunks(columns, chunk_size):
+            np.savetxt(f, chunk, delimiter=', ')
+
+
+def save_xlsx(filepath, names, columns, units, metadata, chunk_size=10000):
+    import xlsxwriter
+    # (constant memory: rows are written to disk one after the other)
+    wb = xlsxwriter.Workbook(filepath, {'nan_inf_to_errors': True,
+                                        'constant_memory': True})
+    ws = wb.add_worksheet()
+    # write headers
+    # (no merged cells, not available in constant memory mode)
+    ws.write('A1', "File")
+    ws.write('B1', f"{metadata['file']}")
+    ws.write('A2', "Analysis date")
+    ws.write('B2', f"{metadata['date']}")
+    ws.write_row(2, 0, get_headers(names, units))
+    for start, chunk in iter_chunks(columns, chunk_size):
+        for i, row in enumerate(chunk.tolist()):
+            ws.write_row(start + i + 3, 0, row)
+    wb.close()
+
+
+def flatten_fit_params(fit):
+    """
+    Return the numerical parameters of a fit as a flat array
+    (empty if the fit has no numerical parameters).
+    """
+    params = []
+
+    def flatten(obj):
+        if isinstance(obj, (list, tuple, np.ndarray)):
+            for o in obj:
+                if not flatten(o):
+                    return False
+            return True
+        if isinstance(obj, numbers.Number):
+            params.append(float(obj))
+            return True
+        return False
+    if fit is None or fit.fits is None or not flatten(fit.fits):
+        return np.array([])
+    return np.array(params)
+
+
+def pack_point_clouds(edges):
+    """
+    Pack the edge points of each frame in a single array.
+
+    Returns
+    -------
+    xy: (M, 2) array
+        Edge points of all the frames.
+    offsets: (n + 1, ) array
+        Edge points of frame `i` are `xy[offsets[i]:offsets[i + 1]]`.
+    """
+    xys = []
+    for edge in edges:
+        if edge is None or len(edge.xy) == 0:
+            xys.append(np.zeros((0, 2)))
+        else:
+            xys.append(np.asarray(edge.xy, dtype=float))
+    offsets = np.zeros(len(xys) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(xy) for xy in xys])
+    if len(xys) == 0:
+        return np.zeros((0, 2)), offsets
+    return np.concatenate(xys), offsets
+
+
+def get_results_arrays(columns, names, units, fits, edges):
+    """
+    Gather the results to export as typed arrays.
+
+    Returns
+    -------
+    arrays: dict of arrays
+        Quantities (one array per quantity), edge points (`edges_xy` and
+        `edges_offsets`, see `pack_point_clouds`) and fit parameters
+        (`fit_params`, one row per frame, padded with NaN).
+    """
+    arrays = {}
+    for name, col in zip(names, columns):
+        arrays[name] = np.asarray(col, dtype=float)
+    # edges
+    arrays['edges_xy'], arrays['edges_offsets'] = pack_point_clouds(edges)
+    # fits
+    params = [flatten_fit_params(fit) for fit in fits]
+    nmb_params = max([len(p) for p in params] + [0])
+    fit_params = np.full((len(params), nmb_params), np.nan)
+    for i, p in enumerate(params):
+        fit_params[i, :len(p)] = p
+    arrays['fit_params'] = fit_params
+    return arrays
+
+
+def save_npz(filepath, arrays, metadata):
+    # (not compressed, so that it is fast to load,
+    #  but cannot be memory-mapped, use hdf5 for that)
+    np.savez(filepath, metadata=np.array(json.dumps(metadata)), **arrays)
+
+
+def save_hdf5(filepath, arrays, metadata):
+    import h5py
+    with h5py.File(filepath, 'w') as f:
+        for name, arr in arrays.items():
+            # (contiguous and uncompressed, so that it can be memory-mapped)
+            dset = f.create_dataset(name, data=arr, chunks=None)
+            if name in metadata['units']:
+                dset.attrs['unit'] = metadata['units'][name]
+        for key, value in metadata.items():
+            f.attrs[key] = json.dumps(value)
+
+
+def save_parquet(filepath, arrays, metadata):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    # One row per frame
+    offsets = arrays['edges_offsets']
+    xy = arrays['edges_xy']
+    data = {name: arr for name, arr in arrays.items()
+            if name in metadata['units']}
+    data['edge_x'] = pa.array([xy[offsets[i]:offsets[i + 1], 0]
+                               for i in range(len(offsets) - 1)])
+    data['edge_y'] = pa.array([xy[offsets[i]:offsets[i + 1], 1]
+                               for i in range(len(offsets) - 1)])
+    data['fit_params'] = pa.array(list(arrays['fit_params']))
+    # Make all columns the same length
+    nmb_rows = len(offsets) - 1
+    for name, arr in data.items():
+        if len(arr) != nmb_rows:
+            raise ValueError(f"'{name}' does not have one value per frame")
+    table = pa.table(data)
+    table = table.replace_schema_metadata(
+        {key: json.dumps(value) for key, value in metadata.items()})
+    pq.write_table(table, filepath)
+
+
+def export_results(dsa, quants, filepath, log, chunk_size=10000):
+    """
+    Export the computed quantities (and edges and fits, for the binary
+    formats) to a file.
+
+    The format is chosen from the file extension:
+    '.csv', '.xlsx', '.npz', '.h5' (or '.hdf5') or '.parquet'.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext not in ['.csv', '.xlsx', '.npz', '.h5', '.hdf5', '.parquet']:
+        raise ValueError(f"Unknown export format: '{ext}'")
+    names, columns, units = get_quantities(dsa, quants, log)
+    metadata = {'file': dsa.filepath,
+                'date': datetime.now().strftime("%y-%m-%d %I:%M%p"),
+                'edge_method': dsa.edge_detection_method,
+                'fit_method': dsa.fit_method,
+                'units': units}
+    if ext == '.csv':
+        save_csv(filepath, names, columns, units, metadata, chunk_size)
+    elif ext == '.xlsx':
+        save_xlsx(filepath, names, columns, units, metadata, chunk_size)
+    else:
+        arrays = get_results_arrays(columns, names, units, list(dsa.fits),
+                                    dsa.get_fits_edges())
+        if ext in ['.h5', '.hdf5']:
+            save_hdf5(filepath, arrays, metadata)
+        elif ext == '.parquet':
+            save_parquet(filepath, arrays, metadata)
+        else:
+            save_npz(filepath, arrays, metadata)
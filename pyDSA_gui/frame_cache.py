@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import threading
+from collections import OrderedDict
+
+
+def get_image_size(im):
+    """ Estimate the memory used by an image (in bytes). """
+    size = 0
+    for attr in ['values', 'mask', 'axe_x', 'axe_y']:
+        arr = getattr(im, attr, None)
+        size += getattr(arr, 'nbytes', 0)
+    return size
+
+
+class FrameCache(object):
+    """
+    Least-recently-used cache of frames, limited in memory.
+
+    The cache can be safely shared between threads.
+
+    Parameters
+    ----------
+    max_size: integer
+        Maximum memory used by the cached frames (in bytes).
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, ind):
+        return ind in self.frames
+
+    def get(self, ind):
+        """ Return the cached frame, or None if not cached. """
+        with self.lock:
+            try:
+                im, _ = self.frames[ind]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(ind)
+            self.hits += 1
+            return im
+
+    def peek(self, ind):
+        """
+        Return the cached frame, or None if not cached,
+        without counting it as an access.
+        """
+        with self.lock:
+            if ind not in self.frames:
+                return None
+            return self.frames[ind][0]
+
+    def put(self, ind, im):
+        size = get_image_size(im)
+        if size > self.max_size:
+            return None
+        with self.lock:
+            self._remove(ind)
+            self.frames[ind] = (im, size)
+            self.size += size
+            # Evict the least recently used frames
+            while self.size > self.max_size:
+                _, (_, old_size) = self.frames.popitem(last=False)
+                self.size -= old_size
+
+    def remove(self, ind):
+        with self.lock:
+            self._remove(ind)
+
+    def _remove(self, ind):
+        if ind in self.frames:
+            _, size = self.frames.pop(ind)
+            self.size -= size
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.size = 0
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        ratio = self.hits/total*100 if total != 0 else 0
+        return (f"{self.hits} hits, {self.misses} misses ({ratio:.0f}%), "
+                f"{len(self.frames)} frames, "
+                f"{self.size/1024**2:.1f}/{self.max_size/1024**2:.0f} MB")
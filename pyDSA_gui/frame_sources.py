@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import copy
+import cv2
+from datetime import datetime
+import os
+import pyDSA_core as dsa
+import numpy as np
+import re
+import struct
+
+
+def natural_sort_key(filepath):
+    """
+    Key to sort file names in natural order ('img2' before 'img10').
+    """
+    return [int(part) if part.isdigit() else part.lower()
+            for part in re.split(r'(\d+)', filepath)]
+
+
+def probe_image_size(filepath):
+    """
+    Return the size (width, height) of an image.
+
+    Only the image header is read if pillow is available.
+    """
+    try:
+        from PIL import Image as PILImage
+        with PILImage.open(filepath) as im:
+            return im.size
+    except Exception:
+        pass
+    data = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+    if data is None:
+        raise OSError(f"{filepath} is not a valid image.")
+    return data.shape[::-1]
+
+
+def get_exif_time(filepath):
+    """
+    Return the acquisition time (in seconds) stored in the image
+    EXIF data, or None.
+    """
+    try:
+        from PIL import Image as PILImage
+        with PILImage.open(filepath) as im:
+            exif = im.getexif()
+            exif_ifd = exif.get_ifd(0x8769)
+            date = exif_ifd.get(36867) or exif.get(306)
+            subsec = exif_ifd.get(37521)
+        if date is None:
+            return None
+        t = datetime.strptime(date, "%Y:%m:%d %H:%M:%S").timestamp()
+        if subsec:
+            t += float(f"0.{subsec.strip()}")
+        return t
+    except Exception:
+        return None
+
+
+def roi_slices(lims, sizex, sizey):
+    """
+    Return the pixel ranges `(ix0, ix1), (iy0, iy1)` of a frame
+    covered by `lims` (`(xmin, xmax), (ymin, ymax)`, in pixels).
+
+    The whole frame is covered if `lims` is None.
+    """
+    if lims is None:
+        return (0, sizex), (0, sizey)
+    (xmin, xmax), (ymin, ymax) = lims
+    ix0 = max(int(np.ceil(xmin)), 0)
+    ix1 = min(int(np.floor(xmax)) + 1, sizex)
+    iy0 = max(int(np.ceil(ymin)), 0)
+    iy1 = min(int(np.floor(ymax)) + 1, sizey)
+    return (ix0, ix1), (iy0, iy1)
+
+
+def crop_array(data, lims=None):
+    """
+    Return the region `lims` of a frame stored as a (height, width)
+    array (as decoded by opencv), as a view.
+
+    Returns
+    -------
+    data: array
+        Region values.
+    origin: 2x1 tuple of integers
+        Position of the region in the whole frame.
+    """
+    height, width = data.shape[:2]
+    (ix0, ix1), (iy0, iy1) = roi_slices(lims, width, height)
+    # (rows are stored from top to bottom)
+    return data[height - iy1:height - iy0, ix0:ix1], (ix0, iy0)
+
+
+def image_from_array(data, origin=(0, 0)):
+    """
+    Return the Image of a (height, width) array, positioned at `origin`.
+    """
+    if data.ndim == 3:
+        data = cv2.cvtColor(data, cv2.COLOR_RGB2GRAY)
+    # (view, only copied once when creating the image)
+    data = data.transpose()[:, ::-1]
+    ix0, iy0 = origin
+    im = dsa.Image()
+    im.import_from_arrays(range(ix0, ix0 + data.shape[0]),
+                          range(iy0, iy0 + data.shape[1]),
+                          unit_x="", unit_y="",
+                          values=data, dtype=np.uint8,
+                          dontchecknans=True)
+    return im
+
+
+class FrameSource(object):
+    """
+    Random access to the raw frames of an imported file.
+
+    A source only needs its file path to be rebuilt, so it can be sent
+    to worker processes, where the file is reopened on first access.
+    """
+    input_type = None
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.nmb_frames = None
+        self.sizex = None
+        self.sizey = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in self._handles:
+            state[key] = None
+        return state
+
+    @property
+    def _handles(self):
+        """ Attributes that cannot be shared between processes. """
+        return []
+
+    def clone(self):
+        """
+        Return an unopened copy of the source,
+        to be used from another thread.
+        """
+        source = copy.copy(self)
+        for key in self._handles:
+            setattr(source, key, None)
+        return source
+
+    def open(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def get_frame(self, ind, lims=None):
+        """
+        Return the frame number `ind` as an Image.
+
+        Raise an OSError if the frame cannot be read.
+
+        Parameters
+        ----------
+        lims: 2x2 tuple of numbers
+            Region of interest (`(xmin, xmax), (ymin, ymax)`, in pixels).
+            If specified, only this part of the frame is converted
+            (and read, if the format allows it).
+        """
+        raise NotImplementedError
+
+    def get_dt(self):
+        return 1
+
+
+class VideoSource(FrameSource):
+    """
+    Frames from a video file.
+
+    Frames are decoded sequentially when possible: asking for a frame
+    slightly ahead of the last one only grabs (without retrieving)
+    the frames in between, instead of seeking.
+
+    When the backend supports it, frames are decoded as grayscale
+    (luma plane only), without colour conversion. Luma values are
+    expanded to the gray levels opencv gives when converting
+    (usually from the limited 16-235 range), so that the parameters
+    (thresholds) do not depend on the decoding.
+    """
+    input_type = 'video'
+    # Farthest frame to reach by grabbing instead of seeking
+    max_skip = 32
+    # Gray levels of the luma values, for limited and full range videos
+    luma_luts = [np.clip(np.round((np.arange(256) - 16)*255/219),
+                         0, 255).astype(np.uint8),
+                 np.arange(256, dtype=np.uint8)]
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self.vid = None
+        self.fps = None
+        # index of the next frame to be read
+        self.pos = None
+        # Gray levels of the luma values
+        # (None if frames are converted by opencv)
+        self.luma_lut = None
+        # (None until the source has been opened once)
+        self.use_luma = None
+
+    @property
+    def _handles(self):
+        return ['vid']
+
+    def open(self):
+        vid = cv2.VideoCapture()
+        vid.open(self.filepath)
+        self.sizex = int(vid.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.sizey = int(vid.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # Ask for the luma plane only
+        # (clones use the mode found when opening the source)
+        if self.use_luma is not False:
+            gray = vid.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        success, data = vid.read()
+        if success and self.use_luma is None:
+            self.use_luma = False
+            if gray and self._is_luma(data):
+                self.luma_lut = self._get_luma_lut(data[:self.sizey])
+                self.use_luma = self.luma_lut is not None
+            if gray and not self.use_luma:
+                # Let opencv convert the frames
+                # (the conversion cannot be switched on after reading)
+                vid.release()
+                vid = cv2.VideoCapture()
+                vid.open(self.filepath)
+                success, _ = vid.read()
+        if not success:
+            raise OSError(f"Could not load video from: {self.filepath}")
+        self.vid = vid
+        self.nmb_frames = int(vid.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = float(vid.get(cv2.CAP_PROP_FPS))
+        self.pos = 1
+
+    def _is_luma(self, data):
+        """
+        Return True if the raw frame starts with an 8-bit luma plane
+        (grayscale, or planar YUV 4:2:0 such as I420 or NV12).
+        """
+        if data.dtype != np.uint8 or data.ndim != 2:
+            return False
+        return data.shape in [(self.sizey, self.sizex),
+                              (self.sizey*3//2, self.sizex)]
+
+    def _get_luma_lut(self, luma):
+        """
+        Return the table giving the gray levels of the luma values,
+        checked against the first frame converted by opencv
+        (None if the luma values do not match the gray levels).
+        """
+        vid = cv2.VideoCapture()
+        vid.open(self.filepath)
+        try:
+            success, data = vid.read()
+        finally:
+            vid.release()
+        if not success:
+            return None
+        if data.ndim == 3:
+            # (same conversion as `image_from_array`)
+            data = cv2.cvtColor(data, cv2.COLOR_RGB2GRAY)
+        for lut in self.luma_luts:
+            diff = np.abs(cv2.LUT(luma, lut).astype(int) - data)
+            if np.mean(diff) < 1:
+                return lut
+        return None
+
+    def close(self):
+        if self.vid is not None:
+            self.vid.release()
+            self.vid = None
+        self.pos = None
+
+    def _seek(self, ind):
+        """ Move so that the next frame read is the frame `ind`. """
+        if self.pos is not None and 0 <= ind - self.pos <= self.max_skip:
+            # Walk forward, without retrieving the skipped frames
+            while self.pos < ind:
+                if not self.vid.grab():
+                    break
+                self.pos += 1
+            if self.pos == ind:
+                return None
+        self.vid.set(cv2.CAP_PROP_POS_FRAMES, ind)
+        self.pos = ind
+
+    def get_frame(self, ind, lims=None):
+        if self.vid is None:
+            self.open()
+        self._seek(ind)
+        success, data = self.vid.read()
+        if not success:
+            self.pos = None
+            raise OSError(f"Can't decode frame number {ind}")
+        self.pos = ind + 1
+        if not self.use_luma:
+            # Crop before any conversion
+            return image_from_array(*crop_array(data, lims))
+        # Only keep the luma plane of planar YUV frames
+        data, origin = crop_array(data[:self.sizey], lims)
+        return image_from_array(cv2.LUT(data, self.luma_lut), origin)
+
+    def get_dt(self):
+        return 1/self.fps
+
+
+class ImagesSource(FrameSource):
+    """
+    Frames from a sequence of image files (one frame per file).
+
+    Opening the source only reads the header of the first image
+    (and the timestamps of the images, if used for the time step).
+
+    Parameters
+    ----------
+    filepath: list of strings
+        Paths of the images, in the frames order.
+    dt_from_timestamps: boolean
+        If True, the time step is computed from the frames timestamps
+        (see `get_timestamps`), instead of being 1.
+    """
+    input_type = 'images'
+
+    def __init__(self, filepath, dt_from_timestamps=False):
+        super().__init__(filepath)
+        self.dt_from_timestamps = dt_from_timestamps
+        self.timestamps = None
+
+    def open(self):
+        self.nmb_frames = len(self.filepath)
+        self.sizex, self.sizey = probe_image_size(self.filepath[0])
+        if self.dt_from_timestamps:
+            self.get_timestamps()
+
+    def get_timestamps(self):
+        """
+        Return the time of each frame (in seconds), from the images
+        EXIF data if available, else from the files modification times.
+
+        Timestamps are only read once.
+        """
+        if self.timestamps is None:
+            times = [get_exif_time(path) for path in self.filepath]
+            if any(t is None for t in times):
+                times = [os.path.getmtime(path) for path in self.filepath]
+            self.timestamps = np.array(times)
+        return self.timestamps
+
+    def get_frame(self, ind, lims=None):
+        filepath = self.filepath[ind]
+        data = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+        if data is None:
+            raise OSError(f"{filepath} is not a valid image.")
+        im = image_from_array(*crop_array(data, lims))
+        im.filepath = filepath
+        return im
+
+    def get_dt(self):
+        if not self.dt_from_timestamps or self.nmb_frames < 2:
+            return 1
+        dt = np.median(np.diff(self.get_timestamps()))
+        return dt if dt > 0 else 1
+
+
+STACK_EXTS = ['.tif', '.tiff', '.npy']
+# Tiff tags used to locate the pages data
+TIFF_TAGS = {256: 'width', 257: 'height', 258: 'bits', 259: 'compression',
+             262: 'photometric', 273: 'offsets', 277: 'samples',
+             279: 'bytecounts', 322: 'tile_width', 339: 'sample_format'}
+TIFF_TYPES = {1: 'B', 3: 'H', 4: 'I', 16: 'Q'}
+# Pages of the last tiff file read: {(filepath, mtime, size): (pages, bo)}
+_tiff_pages = {}
+
+
+def read_tiff_pages(filepath):
+    """
+    Read the page directories of a (multi-page) tiff file.
+
+    Only the headers are read, not the pixel data.
+    The pages of the last file read are kept, so that checking the file
+    (see `is_stack`) and opening it only read them once.
+
+    Returns
+    -------
+    pages: list of dicts
+        Tags of each page (see `TIFF_TAGS`).
+    byteorder: string
+        '<' or '>'.
+    """
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_mtime_ns, stat.st_size)
+    if key not in _tiff_pages:
+        pages = _read_tiff_pages(filepath)
+        _tiff_pages.clear()
+        _tiff_pages[key] = pages
+    return _tiff_pages[key]
+
+
+def _read_tiff_pages(filepath):
+    with open(filepath, 'rb') as f:
+        head = f.read(4)
+        if head[:2] == b'II':
+            bo = '<'
+        elif head[:2] == b'MM':
+            bo = '>'
+        else:
+            raise OSError(f"{filepath} is not a valid tiff file.")
+        magic = int.from_bytes(head[2:4], 'little' if bo == '<' else 'big')
+        if magic != 42:
+            raise OSError(f"{filepath}: only classic tiff files are "
+                          f"supported")
+        offset, = struct.unpack(bo + 'I', f.read(4))
+        pages = []
+        seen = set()
+        while offset != 0 and offset not in seen:
+            seen.add(offset)
+            f.seek(offset)
+            nmb_entries, = struct.unpack(bo + 'H', f.read(2))
+            entries = f.read(12*nmb_entries)
+            page = {}
+            for i in range(nmb_entries):
+                tag, typ, count, value = struct.unpack(
+                    bo + 'HHI4s', entries[12*i:12*(i + 1)])
+                if tag not in TIFF_TAGS or typ not in TIFF_TYPES:
+                    continue
+                fmt = f"{bo}{count}{TIFF_TYPES[typ]}"
+                size = struct.calcsize(fmt)
+                if size > 4:
+                    pos = f.tell()
+                    f.seek(struct.unpack(bo + 'I', value)[0])
+                    value = f.read(size)
+                    f.seek(pos)
+                page[TIFF_TAGS[tag]] = struct.unpack(fmt, value[:size])
+            pages.append(page)
+            offset, = struct.unpack(bo + 'I', f.read(4))
+    return pages, bo
+
+
+def is_stack(filepath):
+    """
+    Return True if the file is a stack of frames
+    (multi-page tiff or '.npy' array).
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == '.npy':
+        return True
+    if ext not in STACK_EXTS:
+        return False
+    try:
+        return len(read_tiff_pages(filepath)[0]) > 1
+    except OSError:
+        return False
+
+
+class StackSource(FrameSource):
+    """
+    Frames from a single file holding a stack of frames:
+    a multi-page tiff, or a '.npy' array of shape (nmb_frames, height,
+    width).
+
+    Page offsets are read once when opening, frames are then read
+    (in any order) from a memory-mapped view on the file.
+    Compressed or tiled tiffs are read through pillow instead.
+
+    Frames with more than 8 bits are shifted to fit in 8 bits,
+    using the range of all the frames.
+
+    The pages layout and the shift are kept by the clones
+    (see `FrameSource.clone`), that only reopen the file.
+    """
+    input_type = 'stack'
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self.data = None
+        self.offsets = None
+        self.dtype = None
+        self.pil_im = None
+        # (None until the source has been opened once)
+        self.shift = None
+        # Maximum value of WhiteIsZero tiffs (None if not inverted)
+        self.white = None
+
+    @property
+    def _handles(self):
+        return ['data', 'pil_im']
+
+    def open(self):
+        # Clone of an opened source: only reopen the file
+        if self.shift is not None:
+            self._open_file()
+            return None
+        if os.path.splitext(self.filepath)[1].lower() == '.npy':
+            self._open_npy()
+        else:
+            self._open_tiff()
+        self.shift = self._get_shift()
+
+    def _open_file(self):
+        if self.offsets is not None:
+            self.data = np.memmap(self.filepath, dtype=np.uint8, mode='r')
+        elif self.dtype is not None:
+            self.data = np.load(self.filepath, mmap_mode='r')
+        else:
+            from PIL import Image as PILImage
+            self.pil_im = PILImage.open(self.filepath)
+
+    def _get_shift(self):
+        """
+        Return the shift fitting the values of all the frames in 8 bits.
+        """
+        if self._read(0).dtype == np.uint8:
+            return 0
+        if self.white is not None:
+            vmax = self.white - min(self._read(i).min()
+                                    for i in range(self.nmb_frames))
+        else:
+            vmax = max(self._read(i).max() for i in range(self.nmb_frames))
+        return max(int(vmax).bit_length() - 8, 0)
+
+    def _open_npy(self):
+        try:
+            data = np.load(self.filepath, mmap_mode='r')
+        except ValueError:
+            raise OSError(f"{self.filepath} is not a valid array file.")
+        if data.ndim != 3 or data.dtype.kind not in 'ui':
+            raise OSError(f"{self.filepath} should contain a "
+                          f"(nmb_frames, height, width) array of integers")
+        self.data = data
+        self.dtype = data.dtype
+        self.nmb_frames, self.sizey, self.sizex = data.shape
+
+    def _open_tiff(self):
+        pages, bo = read_tiff_pages(self.filepath)
+        first = pages[0]
+        self.nmb_frames = len(pages)
+        self.sizex = first['width'][0]
+        self.sizey = first['height'][0]
+        # Check if the pages can be read directly from the file
+        bits = first.get('bits', (1, ))[0]
+        photometric = first.get('photometric', (1, ))
+        raw = (bits in [8, 16]
+               and photometric[0] in [0, 1]
+               and all(page.get('compression', (1, ))[0] == 1
+                       and page.get('samples', (1, ))[0] == 1
+                       and page.get('sample_format', (1, ))[0] == 1
+                       and 'tile_width' not in page
+                       and page['width'] == first['width']
+                       and page['height'] == first['height']
+                       and page.get('bits', (1, )) == (bits, )
+                       and page.get('photometric', (1, )) == photometric
+                       for page in pages))
+        if raw:
+            self.offsets = []
+            for page in pages:
+                offsets, counts = page['offsets'], page['bytecounts']
+                # strips should be contiguous
+                if any(offsets[i] + counts[i] != offsets[i + 1]
+                       for i in range(len(offsets) - 1)):
+                    raw = False
+                    break
+                self.offsets.append(offsets[0])
+        if raw:
+            self.dtype = np.dtype(f"{bo}u{bits//8}")
+            if photometric[0] == 0:
+                self.white = 2**bits - 1
+        else:
+            # (pillow also inverts WhiteIsZero pages)
+            self.offsets = None
+            self.dtype = None
+            self.white = None
+        self._open_file()
+
+    def close(self):
+        if self.pil_im is not None:
+            self.pil_im.close()
+        self.pil_im = None
+        self.data = None
+
+    def _read(self, ind):
+        """
+        Return the frame `ind` as a (height, width) array.
+
+        Memory-mapped frames are not read until the array is accessed.
+        """
+        if ind < 0 or ind >= self.nmb_frames:
+            raise OSError(f"Can't decode frame number {ind}")
+        if self.pil_im is not None:
+            self.pil_im.seek(ind)
+            return np.asarray(self.pil_im.convert('L'))
+        if self.offsets is None:
+            return self.data[ind]
+        size = self.sizex*self.sizey*self.dtype.itemsize
+        buf = self.data[self.offsets[ind]:self.offsets[ind] + size]
+        return buf.view(self.dtype).reshape(self.sizey, self.sizex)
+
+    def get_frame(self, ind, lims=None):
+        if self.data is None and self.pil_im is None:
+            self.open()
+        # Only the rows of the region are read from the file
+        data, origin = crop_array(self._read(ind), lims)
+        if self.white is not None:
+            data = self.white - data
+        if data.dtype != np.uint8:
+            data = np.clip(data >> self.shift, 0, 255).astype(np.uint8)
+        return image_from_array(data, origin)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import concurrent.futures as cf
+import cv2
+import os
+import pyDSA_core as dsa
+import numpy as np
+
+from . import dsa_pipeline
+from .frame_sources import roi_slices
+
+
+def decode_images(filepaths, hook=None, nmb_threads=None):
+    """
+    Decode images (in parallel) into a (nmb_images, sizex, sizey)
+    uint8 array, in the orientation of the Image objects.
+
+    Parameters
+    ----------
+    filepaths: list of strings
+        Images to decode, in order.
+    hook: function
+        Called with `(i, nmb_images)` after each decoded image.
+    nmb_threads: integer
+        Number of decoding threads (default to the number of cpus).
+        Opencv does not hold the GIL while decoding.
+    """
+    def read(filepath):
+        data = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+        if data is None:
+            raise IOError(f"{filepath} is not a valid image.")
+        return data
+    first = read(filepaths[0])
+    frames = np.empty((len(filepaths), first.shape[1], first.shape[0]),
+                      dtype=np.uint8)
+
+    def decode(i):
+        data = first if i == 0 else read(filepaths[i])
+        if data.shape[::-1] != frames.shape[1:]:
+            raise IOError(f"{filepaths[i]} does not have the same size"
+                          f" as {filepaths[0]}")
+        frames[i] = data.transpose()[:, ::-1]
+    with cf.ThreadPoolExecutor(max_workers=nmb_threads) as executor:
+        futures = [executor.submit(decode, i) for i in range(len(filepaths))]
+        try:
+            for i, future in enumerate(cf.as_completed(futures)):
+                future.result()
+                if hook is not None:
+                    hook(i, len(filepaths))
+        except:
+            for future in futures:
+                future.cancel()
+            raise
+    return frames
+
+
+class MemmapFrames(object):
+    """
+    Raw frames of a source, decoded once into a memory-mapped file.
+
+    Frames are stored as a (nmb_frames, sizex, sizey) uint8 array
+    in a '.npy' file, so that the OS page cache (and not the process
+    memory) holds the frames in use. The file is reused as long as it
+    is more recent than the imported files.
+
+    Parameters
+    ----------
+    filepath: string
+        Path of the '.npy' file.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        # (copy-on-write, as Images need writable values,
+        #  but the file is never modified)
+        self.values = np.load(filepath, mmap_mode='c')
+        self.nmb_frames, self.sizex, self.sizey = self.values.shape
+        self.templates = {}
+
+    @staticmethod
+    def is_up_to_date(filepath, source):
+        if not os.path.isfile(filepath):
+            return False
+        paths = source.filepath
+        if isinstance(paths, str):
+            paths = [paths]
+        mtime = os.path.getmtime(filepath)
+        if any(os.path.getmtime(path) > mtime for path in paths):
+            return False
+        shape = np.load(filepath, mmap_mode='r').shape
+        return shape == (source.nmb_frames, source.sizex, source.sizey)
+
+    @classmethod
+    def from_source(cls, source, filepath, hook=None):
+        """
+        Decode the frames of an (opened) source into `filepath`,
+        unless it has already been done.
+
+        Parameters
+        ----------
+        hook: function
+            Called with `(i, nmb_frames)` after each decoded frame.
+        """
+        if not cls.is_up_to_date(filepath, source):
+            # Decode to a temporary file first,
+            # so that an interrupted decoding is never reused
+            tmp_filepath = filepath + ".tmp"
+            values = np.lib.format.open_memmap(
+                tmp_filepath, mode='w+', dtype=np.uint8,
+                shape=(source.nmb_frames, source.sizex, source.sizey))
+            try:
+                for i in range(source.nmb_frames):
+                    values[i] = source.get_frame(i).values
+                    if hook is not None:
+                        hook(i, source.nmb_frames)
+                values.flush()
+            except:
+                del values
+                os.remove(tmp_filepath)
+                raise
+            del values
+            os.replace(tmp_filepath, filepath)
+        return cls(filepath)
+
+    def get_values(self, ind, lims=None):
+        """
+        Return the values of the frame `ind`, cropped to `lims`
+        (a view on the file, no copy is made).
+
+        Returns
+        -------
+        values: array
+            Frame values.
+        origin: 2x1 tuple of integers
+            Position of the first value in the whole frame.
+        """
+        (ix0, ix1), (iy0, iy1) = roi_slices(lims, self.sizex, self.sizey)
+        return self.values[ind, ix0:ix1, iy0:iy1], (ix0, iy0)
+
+    def _get_template(self, shape, origin):
+        """
+        Return an Image with the axes of a frame region, to be viewed on,
+        and a mask shared by all the frames (that have no masked values).
+        """
+        key = (shape, origin)
+        if key not in self.templates:
+            ix0, iy0 = origin
+            im = dsa.Image()
+            im.import_from_arrays(range(ix0, ix0 + shape[0]),
+                                  range(iy0, iy0 + shape[1]),
+                                  unit_x="", unit_y="",
+                                  values=np.zeros(shape, dtype=np.uint8),
+                                  dtype=np.uint8, dontchecknans=True)
+            self.templates[key] = im, np.broadcast_to(False, shape)
+        return self.templates[key]
+
+    def get_image(self, ind, lims=None):
+        """
+        Return the frame `ind`, cropped to `lims`, as an Image.
+
+        The image values are a view on the file.
+        """
+        values, origin = self.get_values(ind, lims)
+        template, mask = self._get_template(values.shape, origin)
+        im = dsa_pipeline.view_image(template)
+        im.values = values
+        im.mask = mask
+        return im
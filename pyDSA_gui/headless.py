@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import glob
+import os
+
+from . import exports
+from .dsa_backend import DSA_hdd as DSA
+from .frame_sources import natural_sort_key, is_stack
+from .log import Log
+from .params import DSAParams
+from .quantities import get_displayed_quantities
+
+
+IMAGE_EXTS = ['.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff']
+
+
+class HeadlessApp(object):
+    """
+    Run analyses without the gui.
+
+    Parameters
+    ----------
+    nmb_workers: integer
+        Number of worker processes (default to the number of cpus).
+    dt_from_timestamps: boolean
+        If True, the time step of sets of images is computed from
+        their timestamps (EXIF data or modification times).
+    """
+
+    def __init__(self, nmb_workers=None, dt_from_timestamps=False):
+        self.ui = None
+        self.statusbar_delay = 0
+        self.log = Log(None)
+        self.dsa = DSA(self)
+        if nmb_workers is not None:
+            self.dsa.nmb_workers = nmb_workers
+        self.dt_from_timestamps = dt_from_timestamps
+
+    @property
+    def plottable_quant(self):
+        return get_displayed_quantities(self.dsa.fit_method)
+
+    def import_files(self, pattern):
+        """
+        Import a video, an image, a stack (multi-page tiff or .npy)
+        or a set of images (glob pattern).
+        """
+        filepaths = sorted(glob.glob(pattern), key=natural_sort_key)
+        if len(filepaths) == 0:
+            self.log.log(f"No file matching '{pattern}'", level=3)
+            return None
+        if len(filepaths) > 1:
+            return self.dsa.import_images(
+                filepaths, dt_from_timestamps=self.dt_from_timestamps)
+        if is_stack(filepaths[0]):
+            return self.dsa.import_stack(filepaths[0])
+        if os.path.splitext(filepaths[0])[1].lower() in IMAGE_EXTS:
+            return self.dsa.import_image(filepaths[0])
+        return self.dsa.import_video(filepaths[0])
+
+    def set_params(self, infofile_path=None):
+        """
+        Use the parameters of an infofile
+        (default to the one saved next to the imported files).
+        """
+        # (never removed, even if corrupted)
+        if infofile_path is None:
+            infofile_path = self.dsa.get_infofile()
+        infos = self.dsa.read_infofile(infofile_path)
+        if infos is None:
+            self.log.log(f"No valid infofile found at {infofile_path}",
+                         level=3)
+            return None
+        try:
+            params = DSAParams.from_infofile(infos)
+        except ValueError as e:
+            self.log.log(str(e), level=3)
+            return None
+        self.dsa.params = params
+        self.dsa.edge_detection_method = params.edge_method
+        self.dsa.fit_method = params.fit_method
+        return True
+
+    def run(self, pattern, infofile_path=None, outputs=None, formats=None):
+        """
+        Analyze the given files, and export the results.
+
+        Parameters
+        ----------
+        pattern: string
+            Video, image or glob pattern of images.
+        infofile_path: string
+            Infofile with the analysis parameters
+            (default to the one saved next to the imported files).
+        outputs: list of strings
+            Files to export the results to (format chosen from the
+            extension, see `exports.export_results`).
+        formats: list of strings
+            If `outputs` is not given, export the results next to the
+            infofile, in these formats (default to ['csv']).
+
+        Returns
+        -------
+        success: boolean
+        """
+        try:
+            if not self.import_files(pattern):
+                return False
+            if not self.set_params(infofile_path):
+                return False
+            # Compute (done here, as there is no gui)
+            self.dsa.compute_fits()
+            if self.dsa.fits is None:
+                self.log.log("Nothing could be computed", level=3)
+                return False
+            # Export
+            if not outputs:
+                base = os.path.splitext(self.dsa.get_infofile())[0]
+                outputs = [f"{base}.{fmt}" for fmt in formats or ['csv']]
+            for output in outputs:
+                exports.export_results(self.dsa, self.plottable_quant,
+                                       output, self.log)
+                self.log.log(f"Saved data in {output}", level=1)
+        except:
+            self.log.log_unknown_exception()
+            return False
+        finally:
+            self.dsa.close()
+        return True
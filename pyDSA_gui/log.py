@@ -111,6 +111,9 @@ class Log(object):
         self.logs.append(text)
         # Print in shell
         print(text)
+        # No gui
+        if self.ui is None:
+            return None
         # Update log tab
         if self.ui.logarea is not None:
             self.ui.logarea.setTextColor(self.level_colors[level - 1])
@@ -124,9 +127,10 @@ class Log(object):
                 self.ui.status_bar.showMessage(f"Error: {short_mess}",
                                                self.delay)
 
-    def log_unknown_exception(self):
+    def log_unknown_exception(self, exc_info=None):
         # Get last exception
-        exc_info = sys.exc_info()
+        if exc_info is None:
+            exc_info = sys.exc_info()
         # log the error
         errmess = "Unknown error: " + str(exc_info[1])
         self.log(errmess, level=3)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import numpy as np
+import unum
+
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError("Parameters are read-only")
+
+
+def _hashable(obj):
+    if isinstance(obj, FrozenDict):
+        return frozenset((key, _hashable(val)) for key, val in obj.items())
+    if isinstance(obj, tuple):
+        return tuple(_hashable(val) for val in obj)
+    if isinstance(obj, unum.Unum):
+        return (obj.asNumber(), obj.strUnit())
+    return obj
+
+
+class FrozenDict(dict):
+    """
+    Read-only and hashable dictionary.
+    """
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash(_hashable(self))
+            return self._hash
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self), ))
+
+
+def freeze(obj):
+    """
+    Return a read-only (and hashable) copy of a set of parameters.
+
+    Dictionaries become FrozenDicts, lists and arrays become tuples.
+    """
+    if isinstance(obj, dict):
+        return FrozenDict({key: freeze(val) for key, val in obj.items()})
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return tuple(freeze(val) for val in obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+class GuiParams(object):
+    """
+    Computation parameters, published by the gui tabs.
+
+    The tabs call `update` when their widgets change, and the parameters
+    are then read once from the widgets (as read-only snapshots,
+    see `freeze`).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.snapshots = {}
+
+    def update(self, kind=None):
+        """
+        Signal that some parameters changed.
+
+        Parameters
+        ----------
+        kind: string
+            'precomp', 'edge', 'fit' or 'run' (default to all of them).
+        """
+        # (fit parameters depend on the scaling)
+        if kind is None or kind == 'precomp':
+            self.snapshots = {}
+        else:
+            self.snapshots.pop(kind, None)
+
+    def _get(self, kind, tab):
+        params = self.snapshots.get(kind)
+        if params is None:
+            params = freeze(tab.get_params())
+            self.snapshots[kind] = params
+        return params
+
+    def get_precomp_params(self):
+        return self._get('precomp', self.app.tab1)
+
+    def get_edge_params(self):
+        return self._get('edge', self.app.tab2)
+
+    def get_fit_params(self):
+        return self._get('fit', self.app.tab3)
+
+    def get_run_params(self):
+        return self._get('run', self.app.tab4)
+
+
+class DSAParams(object):
+    """
+    Computation parameters, independent of the gui.
+
+    Parameters
+    ----------
+    precomp: dict
+        Precomputation parameters (see `TabImport.get_params`).
+    edges: tuple
+        Edge detection parameters (see `TabEdges.get_params`).
+    fits: tuple
+        Fitting parameters (see `TabFits.get_params`).
+    run: dict
+        Run parameters (see `TabAnalyze.get_params`).
+    edge_method, fit_method: strings
+        Edge detection and fitting methods.
+    """
+
+    def __init__(self, precomp, edges, fits, run=None, edge_method='canny',
+                 fit_method='ellipses'):
+        self.precomp = freeze(precomp)
+        self.edges = freeze(edges)
+        self.fits = freeze(fits)
+        if run is None:
+            run = {'N': 1}
+        self.run = freeze(run)
+        self.edge_method = edge_method
+        self.fit_method = fit_method
+
+    def get_precomp_params(self):
+        return self.precomp
+
+    def get_edge_params(self):
+        return self.edges
+
+    def get_fit_params(self):
+        return self.fits
+
+    def get_run_params(self):
+        return self.run
+
+    @classmethod
+    def from_infofile(cls, infos):
+        """
+        Create the parameters from the content of an infofile
+        (see `DSA.read_infofile`).
+        """
+        for key in ['edge_params', 'fit_params']:
+            if key not in infos:
+                raise ValueError(f"No '{key}' in the infofile, save it again"
+                                 f" from the gui")
+        return cls(precomp={key: infos[key]
+                            for key in ['dt', 'dx', 'dl', 'scaling_pts',
+                                        'lims', 'baseline_pts', 'cropt']},
+                   edges=infos['edge_params'],
+                   fits=infos['fit_params'],
+                   run=infos.get('run_params'),
+                   edge_method=infos.get('edge_method', 'canny'),
+                   fit_method=infos.get('fit_method', 'ellipses'))
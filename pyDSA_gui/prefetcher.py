@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import threading
+
+from . import dsa_pipeline
+
+
+class Prefetcher(object):
+    """
+    Decode and precompute, in a background thread, the frames
+    that are likely to be displayed next.
+
+    The scrubbing direction and stride are guessed from the last
+    displayed frames, and the next frames are put in the frame caches
+    of the backend.
+
+    Parameters
+    ----------
+    dsa: DSA_hdd object
+        Backend to prefetch frames for.
+    nmb_frames: integer
+        Number of frames to read ahead.
+    max_step: integer
+        Largest step between two displayed frames
+        still considered as scrubbing.
+    """
+
+    def __init__(self, dsa, nmb_frames=8, max_step=16):
+        self.dsa = dsa
+        self.nmb_frames = nmb_frames
+        self.max_step = max_step
+        # Own source, to not interfere with the main thread one
+        self.source = dsa.source.clone()
+        self.last_ind = None
+        self.direction = 1
+        self.queue = []
+        self.params = None
+        self.running = True
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(self, ind, params):
+        """
+        Tell the prefetcher that frame `ind` has been displayed,
+        using the given precomputation parameters.
+        """
+        # Guess the scrubbing direction and stride
+        step = 1
+        if self.last_ind is not None:
+            delta = ind - self.last_ind
+            if delta != 0 and abs(delta) <= self.max_step:
+                self.direction = 1 if delta > 0 else -1
+                step = abs(delta)
+        self.last_ind = ind
+        inds = [ind + self.direction*step*k
+                for k in range(1, self.nmb_frames + 1)]
+        inds = [i for i in inds if 0 <= i < self.dsa.nmb_frames]
+        # Replace the previous requests
+        with self.cond:
+            self.queue = inds
+            self.params = params
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.queue = []
+            self.cond.notify()
+        self.thread.join()
+        self.source.close()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and len(self.queue) == 0:
+                    self.cond.wait()
+                if not self.running:
+                    return None
+                ind = self.queue.pop(0)
+                params = self.params
+            try:
+                self._prefetch(ind, params)
+            except Exception:
+                # The frame will be read again when asked for
+                pass
+
+    def _prefetch(self, ind, params):
+        dsa = self.dsa
+        if params is not dsa.precomp_frames_params:
+            return None
+        if dsa.precomp_frames.peek(ind) is not None:
+            return None
+        # Raw frame (only the cropped region if not already read)
+        im = dsa.raw_frames.peek(ind)
+        if im is None:
+            im = self.source.get_frame(ind, lims=params['lims'])
+        # Precomputed frame (if the parameters did not change meanwhile)
+        im_precomp = dsa_pipeline.precompute_image(im, params)
+        with dsa.frames_lock:
+            if params is dsa.precomp_frames_params:
+                dsa.precomp_frames.put(ind, im_precomp)
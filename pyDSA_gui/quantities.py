@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+from IMTreatment.utils import make_unit
+import numpy as np
+
+
+# Arrays computed from the temporal fits
+ARRAYS = {
+    'positions': lambda fits: fits.get_drop_positions(),
+    'centers': lambda fits: fits.get_drop_centers(),
+    'thetas': lambda fits: fits.get_contact_angles(),
+    'base_diameters': lambda fits: fits.get_base_diameters(),
+    'heights': lambda fits: fits.get_drop_heights(),
+    'areas': lambda fits: fits.get_drop_areas(),
+    'volumes': lambda fits: fits.get_drop_volumes(),
+    'ridge_heights': lambda fits: fits.get_ridge_height(),
+    'triple_points': lambda fits: fits.get_triple_points(),
+    'tp_thetas': lambda fits: fits.get_triple_pts_contact_angles(),
+}
+
+# Plottable quantities: name -> (function, unit, wetting ridge only)
+QUANTITIES = {}
+# Quantities displayed in the data table and exported, in order
+DISPLAYED_QUANTITIES = [
+    'Frame number', 'Time', 'Position (x, right)',
+    'CL velocity (x, left)', 'CL velocity (x, right)',
+    'Volume (est.)',
+    'Position (x, left)', 'Position (x, center)',
+    'CA (right)', 'CA (left)', 'CA (mean)', 'Base radius',
+    'Height', 'Area', 'Volume',
+    'Ridge height (left)', 'Ridge height (right)',
+    'CA (TP, left)', 'CA (TP, right)',
+    'CA (TP, mean)']
+
+
+def get_displayed_quantities(fit_method):
+    """
+    Return the quantities to display and export for a fitting method.
+    """
+    return [name for name in DISPLAYED_QUANTITIES
+            if not QUANTITIES[name][2] or fit_method == 'wetting ridge']
+
+
+def quantity(name, unit="", wetting_ridge=False):
+    """
+    Register a plottable quantity.
+
+    The decorated function gets a `QuantityEngine` and returns the values.
+    `unit` can refer to the length and time units as '{x}' and '{t}'.
+    """
+    def decorator(fun):
+        QUANTITIES[name] = (fun, unit, wetting_ridge)
+        return fun
+    return decorator
+
+
+class QuantityEngine(object):
+    """
+    Compute the plottable quantities of a set of temporal fits.
+
+    Each underlying array (drop positions, contact angles, ...) is
+    computed once, and shared between all the quantities derived from it.
+
+    Parameters
+    ----------
+    fits: TemporalFits object
+        Fits.
+    frames: array of integers
+        Frame numbers of the fits.
+    unit_x, unit_t: strings
+        Length and time units.
+    wetting_ridge: boolean
+        If the fits are wetting ridge fits.
+    """
+
+    def __init__(self, fits, frames, unit_x, unit_t, wetting_ridge=False):
+        self.fits = fits
+        self.frames = frames
+        self.units = {'x': unit_x, 't': unit_t,
+                      'x3': (make_unit(unit_x)**3).strUnit()[1:-1]}
+        self.wetting_ridge = wetting_ridge
+        self.arrays = {}
+
+    def __getitem__(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = ARRAYS[name](self.fits)
+        return self.arrays[name]
+
+    def get(self, quant):
+        """
+        Return the values and unit of a quantity.
+
+        Raise a KeyError if the quantity is unknown.
+        """
+        fun, unit, wetting_ridge = QUANTITIES[quant]
+        if wetting_ridge and not self.wetting_ridge:
+            return np.array([]), ""
+        # (copy, to not modify the shared arrays)
+        vals = np.array(fun(self), dtype=float)
+        return vals, unit.format(**self.units)
+
+
+@quantity('Frame number')
+def _frame_number(eng):
+    return eng.frames
+
+
+@quantity('Time', unit='{t}')
+def _time(eng):
+    return eng.fits.times
+
+
+@quantity('Position (x, left)', unit='{x}')
+def _position_left(eng):
+    return eng['positions'][0][:, 0]
+
+
+@quantity('Position (x, right)', unit='{x}')
+def _position_right(eng):
+    return eng['positions'][1][:, 0]
+
+
+@quantity('Position (x, center)', unit='{x}')
+def _position_center(eng):
+    return eng['centers'][:, 0]
+
+
+@quantity('CL velocity (x, left)', unit='{x}/{t}')
+def _velocity_left(eng):
+    return np.gradient(eng['positions'][0][:, 0], eng.fits.dt)
+
+
+@quantity('CL velocity (x, right)', unit='{x}/{t}')
+def _velocity_right(eng):
+    return np.gradient(eng['positions'][1][:, 0], eng.fits.dt)
+
+
+@quantity('CA (left)', unit='°')
+def _ca_left(eng):
+    return eng['thetas'][:, 0]
+
+
+@quantity('CA (right)', unit='°')
+def _ca_right(eng):
+    return 180 - eng['thetas'][:, 1]
+
+
+@quantity('CA (mean)', unit='°')
+def _ca_mean(eng):
+    thetas = eng['thetas']
+    return (thetas[:, 0] + 180 - thetas[:, 1])/2
+
+
+@quantity('Base radius', unit='{x}')
+def _base_radius(eng):
+    return eng['base_diameters']/2
+
+
+@quantity('Height', unit='{x}')
+def _height(eng):
+    return eng['heights']
+
+
+@quantity('Area', unit='{x}^2')
+def _area(eng):
+    return eng['areas']
+
+
+@quantity('Volume', unit='{x}^3')
+def _volume(eng):
+    return eng['volumes']
+
+
+@quantity('Volume (est.)', unit='{x3}')
+def _volume_est(eng):
+    vols = np.array(eng['volumes'], dtype=float)
+    vols[vols == 0] = np.nan
+    return vols
+
+
+@quantity('Ridge height (left)', unit='{x}', wetting_ridge=True)
+def _ridge_height_left(eng):
+    return eng['ridge_heights'][0]
+
+
+@quantity('Ridge height (right)', unit='{x}', wetting_ridge=True)
+def _ridge_height_right(eng):
+    return eng['ridge_heights'][1]
+
+
+@quantity('Ridge height (mean)', unit='{x}', wetting_ridge=True)
+def _ridge_height_mean(eng):
+    tps = eng['triple_points']
+    return (tps[0][:, 1] + tps[1][:, 1])/2
+
+
+@quantity('CA (TP, left)', unit='°', wetting_ridge=True)
+def _ca_tp_left(eng):
+    return eng['tp_thetas'][:, 0]
+
+
+@quantity('CA (TP, right)', unit='°', wetting_ridge=True)
+def _ca_tp_right(eng):
+    return 180 - eng['tp_thetas'][:, 1]
+
+
+@quantity('CA (TP, mean)', unit='°', wetting_ridge=True)
+def _ca_tp_mean(eng):
+    tps = eng['tp_thetas']
+    return (tps[:, 0] + 180 - tps[:, 1])/2
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import hashlib
+import io
+import os
+import pickle
+import sqlite3
+
+
+# Version of the stored data layout
+RESULTS_FORMAT = 1
+# Classes and functions found in the stored edges and fits
+SAFE_GLOBALS = [
+    # pyDSA objects
+    ('pyDSA_core.baseline', 'Baseline'),
+    ('pyDSA_core.dropedges', 'DropEdges'),
+    ('pyDSA_core.dropfit', 'DropFit'),
+    ('pyDSA_core.dropfit', 'DropSplineFit'),
+    ('pyDSA_core.dropfit', 'DropCircleFit'),
+    ('pyDSA_core.dropfit', 'DropCirclesFit'),
+    ('pyDSA_core.dropfit', 'DropEllipseFit'),
+    ('pyDSA_core.dropfit', 'DropEllipsesFit'),
+    # their attributes
+    ('unum', 'Unum'),
+    ('scipy.interpolate._fitpack2', 'UnivariateSpline'),
+    ('scipy.interpolate._fitpack2', 'LSQUnivariateSpline'),
+    ('scipy.interpolate.fitpack2', 'UnivariateSpline'),
+    ('scipy.interpolate.fitpack2', 'LSQUnivariateSpline'),
+    # numpy arrays and scalars
+    ('numpy', 'ndarray'),
+    ('numpy', 'dtype'),
+    ('numpy.core.multiarray', '_reconstruct'),
+    ('numpy.core.multiarray', 'scalar'),
+    ('numpy._core.multiarray', '_reconstruct'),
+    ('numpy._core.multiarray', 'scalar'),
+    ('copyreg', '_reconstructor'),
+    ('builtins', 'object')]
+
+
+def get_core_version():
+    """ Return the version of pyDSA_core, used to compute the results. """
+    try:
+        from importlib.metadata import version
+        return version('pyDSA_core')
+    except Exception:
+        return 'unknown'
+
+
+def get_input_id(filepaths):
+    """
+    Return the identity of the analyzed files
+    (names, sizes and modification times).
+    """
+    if isinstance(filepaths, str):
+        filepaths = [filepaths]
+    sha = hashlib.sha1()
+    for path in filepaths:
+        stat = os.stat(path)
+        sha.update(f"{os.path.basename(path)}:{stat.st_size}:"
+                   f"{stat.st_mtime_ns}\n".encode())
+    return sha.hexdigest()
+
+
+class SafeUnpickler(pickle.Unpickler):
+    """
+    Unpickler only creating pyDSA objects (and their attributes),
+    see `SAFE_GLOBALS`.
+
+    The results file sits next to the user data, and may come from
+    anywhere: unpickling arbitrary objects would allow to run any code.
+    """
+
+    def find_class(self, module, name):
+        if (module, name) in SAFE_GLOBALS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Forbidden object in the results:"
+                                     f" {module}.{name}")
+
+
+def safe_loads(data):
+    return SafeUnpickler(io.BytesIO(data)).load()
+
+
+class ResultsStore(object):
+    """
+    On-disk store of the per-frame edges and fits.
+
+    Edges are stored by edge parameters key and frame number,
+    and fits by fit parameters key and frame number,
+    so that results can be reused between sessions.
+
+    Results stored with another version of the store or of pyDSA_core,
+    or for other input files, are dropped when opening. Stored objects
+    are only loaded if they are made of pyDSA objects
+    (see `SafeUnpickler`), else they are recomputed.
+
+    Parameters
+    ----------
+    filepath: string
+        Path of the database file.
+    input_id: string
+        Identity of the analyzed files (see `get_input_id`).
+    flush_every: integer
+        Number of results to buffer before writing them to disk.
+    """
+
+    def __init__(self, filepath, input_id=None, flush_every=200):
+        self.filepath = filepath
+        self.input_id = input_id
+        self.flush_every = flush_every
+        self.pending = {'edges': [], 'fits': []}
+        self.db = sqlite3.connect(filepath)
+        for table in ['edges', 'fits']:
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS {table} ("
+                            "key TEXT, frame INTEGER, data BLOB, "
+                            "PRIMARY KEY (key, frame))")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta ("
+                        "name TEXT PRIMARY KEY, value TEXT)")
+        self._check_version()
+        self.db.commit()
+
+    def get_version(self):
+        return {'format': str(RESULTS_FORMAT),
+                'pyDSA_core': get_core_version(),
+                'input': str(self.input_id)}
+
+    def _check_version(self):
+        """ Drop the results stored with other versions or inputs. """
+        version = self.get_version()
+        stored = dict(self.db.execute("SELECT name, value FROM meta"))
+        if stored == version:
+            return None
+        for table in ['edges', 'fits']:
+            self.db.execute(f"DELETE FROM {table}")
+        self.db.execute("DELETE FROM meta")
+        self.db.executemany("INSERT INTO meta VALUES (?, ?)",
+                            version.items())
+
+    def _load(self, table, key, inds):
+        self.flush()
+        inds = set(inds)
+        res = {}
+        rows = self.db.execute(f"SELECT frame, data FROM {table} "
+                               "WHERE key = ?", (key, ))
+        for ind, data in rows:
+            if ind not in inds:
+                continue
+            try:
+                res[ind] = safe_loads(data)
+            except Exception:
+                # Corrupted or unsafe, will be recomputed
+                continue
+        return res
+
+    def load_edges(self, key, inds):
+        """ Return a dictionary of the stored edges for the given frames. """
+        return self._load('edges', key, inds)
+
+    def load_fits(self, key, inds):
+        """ Return a dictionary of the stored fits for the given frames. """
+        return self._load('fits', key, inds)
+
+    def _save(self, table, key, ind, obj):
+        try:
+            data = pickle.dumps(obj)
+        except Exception:
+            # Some fits (polylines) cannot be stored
+            return None
+        self.pending[table].append((key, int(ind), data))
+        if len(self.pending[table]) >= self.flush_every:
+            self.flush()
+
+    def save_edge(self, key, ind, edge):
+        self._save('edges', key, ind, edge)
+
+    def save_fit(self, key, ind, fit):
+        self._save('fits', key, ind, fit)
+
+    def flush(self):
+        for table, rows in self.pending.items():
+            if len(rows) == 0:
+                continue
+            self.db.executemany(f"INSERT OR REPLACE INTO {table} "
+                                "VALUES (?, ?, ?)", rows)
+            self.pending[table] = []
+        self.db.commit()
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -91,7 +91,12 @@ class TabAnalyze(Tab):
         self.params_hash = hashe
         # Compute fits
         if replot or self.dsa.fits is None:
-            self.dsa.compute_fits()
+            self.dsa.compute_fits(
+                on_finished=lambda: self.show_results(replot))
+        else:
+            self.show_results(replot)
+
+    def show_results(self, replot=True):
         # Enable data table
         self.ui.tabdata.setEnabled(True)
         # plot
@@ -108,21 +113,20 @@ class TabAnalyze(Tab):
         return dic
 
     def compute(self):
+        self.dsa.params.update('run')
         # Clean
         if self.already_opened:
             self.clean_plot()
-        # compute edges for every frames !
-        try:
-            self.dsa.compute_edges()
-        except:
-            self.log.log_unknown_exception()
-            return None
-        # compute fits for every frames !
+        # compute edges and fits for every frames !
+        progressive = self.ui.tab4_progressive_box.isChecked()
         try:
-            self.dsa.compute_fits()
+            self.dsa.compute_fits(on_finished=self.show_computed,
+                                  progressive=progressive,
+                                  on_update=self.show_computed)
         except:
             self.log.log_unknown_exception()
-            return None
+
+    def show_computed(self):
         # Clear quantity cache
         self.dsa.clear_plottable_quantity_cache()
         #
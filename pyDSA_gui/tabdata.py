@@ -18,114 +18,156 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt5.QtWidgets import QTableWidgetItem
+from PyQt5 import QtCore, QtGui, QtWidgets
 import numpy as np
-from datetime import datetime
 
 
 from .tab import Tab
 from .files_helper import select_new_file
+from . import exports
+
+
+class DataTableModel(QtCore.QAbstractTableModel):
+    """
+    Table model displaying columns of values.
+
+    Values are only formatted when displayed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.headers = []
+        self.columns = []
+        self.nmb_rows = 0
+        self.sign_nmb = 3
+
+    def set_data(self, headers, columns, sign_nmb=3):
+        self.beginResetModel()
+        self.headers = list(headers)
+        self.columns = [np.asarray(col) for col in columns]
+        self.nmb_rows = len(self.columns[0]) if len(self.columns) > 0 else 0
+        self.sign_nmb = sign_nmb
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return self.nmb_rows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headers)
+
+    def get_text(self, row, column):
+        if column >= len(self.columns):
+            return ""
+        col = self.columns[column]
+        if row >= len(col):
+            return ""
+        return f"{col[row]:.{self.sign_nmb}f}"
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return self.get_text(index.row(), index.column())
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
 
 
 class TabData(Tab):
+    def __init__(self, ui, app, dsa, log):
+        super().__init__(ui, app, dsa, log)
+        self.model = None
+        # Number of rows used to guess the columns widths
+        self.nmb_sampled_rows = 50
+        # Number of rows exported at once
+        self.export_chunk_size = 10000
 
     def enter_tab(self):
         self.update_data_table()
 
     def update_data_table(self, *args, **kwargs):
+        if self.model is None:
+            self.model = DataTableModel()
+            self.ui.tab5_DataTable.setModel(self.model)
         # get significative number
         sign_nmb = self.ui.tab5_significativ_numbers.value()
-        # resize
-        self.ui.tab5_DataTable.setColumnCount(len(self.app.plottable_quant))
-        # Update headers
-        self.ui.tab5_DataTable.setHorizontalHeaderLabels(self.app.plottable_quant)
         # check
         if self.dsa.fits is None:
+            self.model.set_data(self.app.plottable_quant, [], sign_nmb)
             return None
         # Update table
-        for n, quant in enumerate(self.app.plottable_quant):
-            val, _, unit = self.dsa.get_plotable_quantity(quant, smooth=0)
-            if n == 0:
-                self.ui.tab5_DataTable.setRowCount(len(val))
-            for m, item in enumerate(val):
-                newitem = QTableWidgetItem(f"{item:.{sign_nmb}f}")
-                self.ui.tab5_DataTable.setItem(m, n, newitem)
+        quants = self.dsa.get_plotable_quantities(self.app.plottable_quant)
+        self.model.set_data(self.app.plottable_quant,
+                            [val for val, _, _ in quants], sign_nmb)
         # resize
-        self.ui.tab5_DataTable.resizeColumnsToContents()
-        self.ui.tab5_DataTable.resizeRowsToContents()
+        self.resize_columns()
+
+    def resize_columns(self):
+        """ Resize the columns to fit a sample of their values. """
+        table = self.ui.tab5_DataTable
+        metrics = QtGui.QFontMetrics(table.font())
+        header_metrics = QtGui.QFontMetrics(table.horizontalHeader().font())
+        nmb_rows = self.model.rowCount()
+        step = max(nmb_rows//self.nmb_sampled_rows, 1)
+        rows = range(0, nmb_rows, step)
+        margin = 4*table.style().pixelMetric(QtWidgets.QStyle.PM_HeaderMargin)
+        for col, header in enumerate(self.model.headers):
+            width = header_metrics.width(header)
+            for row in rows:
+                width = max(width,
+                            metrics.width(self.model.get_text(row, col)))
+            table.setColumnWidth(col, width + margin)
 
     def enable_options(self):
         self.ui.tab5_export_box.setEnabled(True)
         self.ui.tab5_number_format_box.setEnabled(True)
 
-    def _get_data_to_export(self):
-        data = []
-        headers = []
-        for quant in self.app.plottable_quant:
-            val, _, unit = self.dsa.get_plotable_quantity(quant, smooth=0)
-            # check that length matches
-            if len(data) > 0:
-                if len(data[0]) != len(val):
-                    self.log.log(f"Quantity {quant} does not have the right"
-                                 f" length ({len(val)} instead of"
-                                 f" {len(data[0])})", level=3)
-                    continue
-            data.append(list(val))
-            headers.append(f'{quant.replace(",", "")}'
-                           f' [{unit.replace(",", "")}]')
-        data = np.array(data, dtype=float).transpose()
-        return data, headers
-
-    def _get_filepath_to_export(self, filepath, ext):
+    def _get_filepath_to_export(self, filepath, ext, filetypes=None):
         # get fiel to save to
+        filetype = None
         if filepath is None:
-            filepath, _ = select_new_file("Save as")
+            filepath, filetype = select_new_file("Save as",
+                                                 filetypes=filetypes)
             if filepath == "":
                 return None
-        # Add extension
-        if '.' not in filepath[-5:-1]:
-            filepath += ext
-        # Return
-        return filepath
+        # Add extension (from the selected file type if possible)
+        return exports.add_extension(filepath, ext, filetype)
 
-    def export_as_csv(self, toggle, filepath=None):
+    def _export(self, filepath, ext, filetypes=None):
         try:
             # Get filepath
-            filepath = self._get_filepath_to_export(filepath, ext=".csv")
+            filepath = self._get_filepath_to_export(filepath, ext=ext,
+                                                    filetypes=filetypes)
             if filepath is None:
                 return None
+            # check
+            if self.dsa.fits is None:
+                self.log.log("Nothing to export", level=2)
+                return None
             # get and store data
-            data, headers = self._get_data_to_export()
-            date = datetime.now().strftime("%y-%m-%d %I:%M%p")
-            np.savetxt(filepath, data, delimiter=', ',
-                       header=f"File: {self.dsa.filepath}\n"
-                       f"Analysis date: {date}\n"
-                       + ", ".join(headers))
+            exports.export_results(self.dsa, self.app.plottable_quant,
+                                   filepath, self.log,
+                                   chunk_size=self.export_chunk_size)
             self.log.log(f"Saved data in {filepath}", level=1)
         except:
             self.log.log_unknown_exception()
 
+    def export_as_csv(self, toggle, filepath=None):
+        self._export(filepath, ext=".csv")
+
     def export_as_xlsx(self, toggle, filepath=None):
-        import xlsxwriter
-        try:
-            # Get filepath
-            filepath = self._get_filepath_to_export(filepath, ext=".xlsx")
-            if filepath is None:
-                return None
-            # get and store data
-            data, headers = self._get_data_to_export()
-            date = datetime.now().strftime("%y-%m-%d %I:%M%p")
-            wb = xlsxwriter.Workbook(filepath, {'nan_inf_to_errors': True})
-            ws = wb.add_worksheet()
-            # write headers
-            ws.write('A1', "File")
-            ws.write('A2', "Analysis date")
-            ws.merge_range('B1:H1', f"{self.dsa.filepath}")
-            ws.merge_range('B2:H2', f"{date}")
-            ws.write_row(2, 0, headers)
-            for i, row in enumerate(data):
-                ws.write_row(i+3, 0, row)
-            wb.close()
-            self.log.log(f"Saved data in {filepath}", level=1)
-        except:
-            self.log.log_unknown_exception()
+        self._export(filepath, ext=".xlsx")
+
+    def export_as_binary(self, toggle, filepath=None):
+        """
+        Export the quantities, edges and fits in a binary format
+        (chosen from the extension: '.npz', '.h5' or '.parquet').
+
+        Only HDF5 files can be memory-mapped.
+        """
+        self._export(filepath, ext=".npz",
+                     filetypes="Numpy (*.npz);;HDF5 (*.h5 *.hdf5);;"
+                               "Parquet (*.parquet)")
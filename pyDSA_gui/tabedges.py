@@ -45,7 +45,7 @@ class TabEdges(Tab):
         self.ui.tab2_spinbox.setMinimum(cropt[0])
         self.ui.tab2_spinbox.setMaximum(cropt[1])
         # update the detected edge
-        self.update_edge(blit=False)
+        self.update_edge(blit=False, publish=False)
         # Update the baseline
         pt1, pt2 = self.dsa.get_baseline_display_points(self.app.current_ind)
         self.ui.mplwidgetdetect.update_baseline(pt1, pt2, blit=False)
@@ -59,7 +59,8 @@ class TabEdges(Tab):
     def leave_tab(self):
         # reset zoom
         self.ui.mplwidgetdetect.reset_zoom()
-        #
+        # Save settings as infofile
+        self.dsa.save_infofile()
         return True
 
     def enable_options(self):
@@ -75,7 +76,9 @@ class TabEdges(Tab):
         im = self.dsa.get_current_precomp_im(self.app.current_ind)
         self.ui.mplwidgetdetect.update_image(im.values, blit=False)
         # update edge
-        self.update_edge(blit=True)
+        self.update_edge(blit=True, publish=False)
+        # prepare next frames
+        self.dsa.prefetch(self.app.current_ind)
 
     def enable_frame_sliders(self):
         # Preserve current ind
@@ -120,7 +123,10 @@ class TabEdges(Tab):
                    'size_ratio': self.ui.tab2_size_ratio.value()/100}
         return canny, contour, options
 
-    def update_edge(self, toggle=False, blit=True):
+    def update_edge(self, toggle=False, blit=True, publish=True):
+        # Publish the parameters (only when the widgets changed)
+        if publish:
+            self.dsa.params.update('edge')
         try:
             edge = self.dsa.get_current_edge_pts(self.app.current_ind)
         except:
@@ -51,7 +51,7 @@ class TabFits(Tab):
         self.ui.tab3_ellipse_ymin.setMaximum(sizey)
         self.ui.tab3_ellipses_ymin.setMaximum(sizey)
         # update the edge fit
-        self.update_fit(blit=False)
+        self.update_fit(blit=False, publish=False)
         # Update the baseline
         pt1, pt2 = self.dsa.get_baseline_display_points(self.app.current_ind)
         self.ui.mplwidgetfit.update_baseline(pt1, pt2, blit=False)
@@ -65,7 +65,8 @@ class TabFits(Tab):
     def leave_tab(self):
         # reset zoom
         self.ui.mplwidgetfit.reset_zoom()
-        #
+        # Save settings as infofile
+        self.dsa.save_infofile()
         return True
 
     def enable_options(self):
@@ -84,7 +85,9 @@ class TabFits(Tab):
         im = self.dsa.get_current_precomp_im(self.app.current_ind)
         self.ui.mplwidgetfit.update_image(im.values, blit=False)
         # update fit
-        self.update_fit(blit=True)
+        self.update_fit(blit=True, publish=False)
+        # prepare next frames
+        self.dsa.prefetch(self.app.current_ind)
 
     def enable_frame_sliders(self):
         # Preserve current ind
@@ -127,7 +130,10 @@ class TabFits(Tab):
               'sigma': self.ui.tab3_wetting_ridge_sigma.value()/100}
         return circle, ellipse, ellipses, polyline, spline, wr
 
-    def update_fit(self, toggle=True, blit=True):
+    def update_fit(self, toggle=True, blit=True, publish=True):
+        # Publish the parameters (only when the widgets changed)
+        if publish:
+            self.dsa.params.update('fit')
         try:
             fit, fit_center = self.dsa.get_current_fit_pts(self.app.current_ind)
         except:
@@ -24,6 +24,7 @@ import re
 
 from .tab import Tab
 from .files_helper import select_files, select_file
+from .frame_sources import is_stack
 
 
 class TabImport(Tab):
@@ -133,6 +134,12 @@ class TabImport(Tab):
             return None
         else:
             filepath = filepath[0]
+        # Stack of frames
+        if is_stack(filepath):
+            success = self.import_stack(filepath)
+            if success:
+                self.ui.tabdata.setEnabled(False)
+            return success
         # Image
         success = self.import_image(filepath, log=False)
         # Video
@@ -229,6 +236,31 @@ class TabImport(Tab):
             self.update_from_infofile()
         return success
 
+    def import_stack(self, filepath=None, log=True):
+        # Select stack to import
+        if filepath is None:
+            filepath = select_file('Open stack')[0]
+        # Import stack
+        success = self.dsa.import_stack(filepath, log=log)
+        if success:
+            # Enable frame sliders
+            self.enable_frame_sliders()
+            # Update stack display
+            im = self.dsa.get_current_raw_im(self.app.current_ind)
+            self.ui.mplwidgetimport.update_image(im.values, replot=True)
+            # Enable cropping sliders
+            self.enable_cropping()
+            # Enable baseline
+            self.enable_baseline()
+            # Enable options
+            self.app.enable_options()
+            # De-init other tabs
+            self.app.tab2.initialized = False
+            self.app.tab3.initialized = False
+            # initilize stuff from infofile
+            self.update_from_infofile()
+        return success
+
     def update_from_infofile(self):
         sizey = abs(self.ui.mplwidgetimport.ax.viewLim.height)
         infos = self.dsa.read_infofile()
@@ -267,9 +299,11 @@ class TabImport(Tab):
 
     def set_first_frame(self, frame_number):
         self.ui.tab1_spinbox_frame.setValue(frame_number)
+        self.publish_params()
 
     def set_last_frame(self, frame_number):
         self.ui.tab1_spinbox_frame.setValue(frame_number)
+        self.publish_params()
 
     def zoom_to_area(self):
         xlims, ylims = self.ui.mplwidgetimport.rect_hand.lims
@@ -293,6 +327,11 @@ class TabImport(Tab):
     def remove_scaling(self):
         self.ui.mplwidgetimport.is_scaling = False
         self.ui.mplwidgetimport.scaling_hand.reset()
+        self.publish_params()
+
+    def publish_params(self, *args):
+        # Signal that the precomputation parameters changed
+        self.dsa.params.update('precomp')
 
     def get_params(self, arg=None):
         dic = {}
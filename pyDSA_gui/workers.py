@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+__author__ = "Gaby Launay"
+__copyright__ = "Gaby Launay 2018-2019"
+__credits__ = ""
+__license__ = "GPL3"
+__version__ = ""
+__email__ = "gaby.launay@tutanota.com"
+__status__ = "Development"
+
+
+import sys
+from PyQt5 import QtCore
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Worker(QtCore.QObject):
+    """
+    Run a computation in a separate thread.
+
+    The computation is a function `job(hook, partial)`, where `hook(i, maxi)`
+    reports the progress (and raise `Cancelled` if the computation has been
+    stopped) and `partial(res)` sends back intermediate results.
+    Results are sent back to the main thread through Qt signals,
+    so that they can be safely used to update the gui.
+    """
+    progress = QtCore.pyqtSignal(int, int)
+    partial = QtCore.pyqtSignal(object)
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(object)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.stop = False
+
+    def hook(self, i, maxi):
+        if self.stop:
+            raise Cancelled()
+        self.progress.emit(i, maxi)
+
+    def run(self):
+        try:
+            res = self.job(self.hook, self.partial.emit)
+        except Cancelled:
+            self.cancelled.emit()
+        except:
+            self.failed.emit(sys.exc_info())
+        else:
+            if self.stop:
+                self.cancelled.emit()
+            else:
+                self.finished.emit(res)
+
+
+class BackgroundTask(QtCore.QObject):
+    """
+    Run a job in a worker thread, and call the given callbacks
+    (in the main thread) when the worker reports something.
+    """
+
+    def __init__(self, job, on_progress=None, on_partial=None,
+                 on_finished=None, on_failed=None, on_cancelled=None):
+        super().__init__()
+        self.callbacks = {'progress': on_progress,
+                          'partial': on_partial,
+                          'finished': on_finished,
+                          'failed': on_failed,
+                          'cancelled': on_cancelled}
+        self.worker = Worker(job)
+        self.thread = QtCore.QThread()
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        queued = QtCore.Qt.QueuedConnection
+        self.worker.progress.connect(self._on_progress, queued)
+        self.worker.partial.connect(self._on_partial, queued)
+        # (quit from the worker thread, so that `wait` can be called
+        #  from the main thread without blocking forever)
+        direct = QtCore.Qt.DirectConnection
+        for name in ['finished', 'failed', 'cancelled']:
+            sig = getattr(self.worker, name)
+            sig.connect(self.thread.quit, direct)
+        self.worker.finished.connect(self._on_finished, queued)
+        self.worker.failed.connect(self._on_failed, queued)
+        self.worker.cancelled.connect(self._on_cancelled, queued)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.worker.stop = True
+
+    def wait(self):
+        self.thread.wait()
+
+    def is_running(self):
+        return self.thread.isRunning()
+
+    def _call(self, name, *args):
+        callback = self.callbacks[name]
+        if callback is not None:
+            callback(*args)
+
+    @QtCore.pyqtSlot(int, int)
+    def _on_progress(self, i, maxi):
+        self._call('progress', i, maxi)
+
+    @QtCore.pyqtSlot(object)
+    def _on_partial(self, res):
+        self._call('partial', res)
+
+    @QtCore.pyqtSlot(object)
+    def _on_finished(self, res):
+        self._call('finished', res)
+
+    @QtCore.pyqtSlot(object)
+    def _on_failed(self, exc_info):
+        self._call('failed', exc_info)
+
+    @QtCore.pyqtSlot()
+    def _on_cancelled(self):
+        self._call('cancelled')
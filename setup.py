@@ -43,7 +43,7 @@ setup(
     packages=find_packages(exclude=['contrib', 'docs', 'tests', 'samples']),
     install_requires=['pyQt5', 'pyDSA_core==1.4.1', 'numpy',
                       'matplotlib>=2.2.0', 'xlsxwriter'],
-    extras_require={},
+    extras_require={'hdf5': ['h5py'], 'parquet': ['pyarrow']},
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     entry_points={
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pytest
+
+from pyDSA_gui import batch
+from pyDSA_gui.batch import BatchQueue
+from pyDSA_gui.log import Log
+
+from test_headless import make_dataset
+
+
+class MockLog(object):
+    def __init__(self):
+        self.messages = []
+
+    def log(self, message, level=1):
+        self.messages.append((message, level))
+
+    def log_unknown_exception(self):
+        self.messages.append(('exception', 3))
+
+
+class TestBatchQueue(object):
+
+    def test_add_from_file(self, tmp_path):
+        listing = tmp_path/"batch.txt"
+        listing.write_text("# comment\n\n  a.mp4\nb*.png  b.info\n")
+        queue = BatchQueue(MockLog(), nmb_workers=1)
+        queue.add_from_file(str(listing), infofile_path="default.info")
+        assert [(item.pattern, item.infofile_path)
+                for item in queue.items] == [("a.mp4", "default.info"),
+                                             ("b*.png", "b.info")]
+        assert [item.status for item in queue.items] == ['pending']*2
+
+    def test_item_size(self, tmp_path):
+        for i in range(3):
+            (tmp_path/f"im{i}.png").write_bytes(b"0"*100)
+        queue = BatchQueue(MockLog())
+        queue.add(str(tmp_path/"im*.png"))
+        queue.add(str(tmp_path/"missing.mp4"))
+        assert [item.size for item in queue.items] == [300, 0]
+
+    def test_large_files_use_all_workers(self, tmp_path, monkeypatch):
+        calls = []
+
+        def run_item(pattern, infofile_path, formats, nmb_workers):
+            calls.append((pattern, nmb_workers))
+            if pattern.startswith('fail'):
+                raise Exception()
+            return pattern != 'wrong', 1.
+        monkeypatch.setattr(batch, '_run_item', run_item)
+        log = MockLog()
+        queue = BatchQueue(log, nmb_workers=4, large_size=0)
+        for pattern in ['a', 'wrong', 'fail']:
+            queue.add(pattern)
+        assert not queue.run()
+        # one after the other
+        assert calls == [('a', 4), ('wrong', 4), ('fail', 4)]
+        assert [item.status for item in queue.items] == ['done', 'failed',
+                                                         'failed']
+        assert [item.duration for item in queue.items] == [1., 1., 0]
+        assert ('exception', 3) in log.messages
+        assert log.messages[0] == ("Batch: [1/3] a: done (1.0s)", 1)
+
+    def test_resume(self, tmp_path, monkeypatch):
+        calls = []
+
+        def run_item(pattern, infofile_path, formats, nmb_workers):
+            calls.append(pattern)
+            return True, 1.
+        monkeypatch.setattr(batch, '_run_item', run_item)
+        queue = BatchQueue(MockLog(), nmb_workers=1)
+        queue.add('a')
+        queue.add('b')
+        queue.items[0].status = 'done'
+        assert queue.run()
+        # only the pending files are analyzed
+        assert calls == ['b']
+        summary = queue.get_summary().splitlines()
+        assert summary[0].split() == ['File', 'Size', '(MB)', 'Status',
+                                      'Time', '(s)']
+        assert summary[2].split() == ['b', '0.0', 'done', '1.0']
+
+    def make_queue(self, tmp_path, nmb_workers):
+        patterns = []
+        for name in ['a', 'b']:
+            os.mkdir(tmp_path/name)
+            patterns.append(make_dataset(tmp_path/name))
+        queue = BatchQueue(Log(None), nmb_workers=nmb_workers,
+                           formats=['csv'])
+        listing = tmp_path/"batch.txt"
+        listing.write_text(f"# test images\n{patterns[0]}\n\n"
+                           f"{patterns[1]} {tmp_path/'missing.info'}\n")
+        queue.add_from_file(str(listing))
+        return queue
+
+    @pytest.mark.parametrize('nmb_workers', [1, 2])
+    def test_run(self, tmp_path, nmb_workers):
+        queue = self.make_queue(tmp_path, nmb_workers)
+        assert [item.infofile_path for item in queue.items] == [
+            None, str(tmp_path/'missing.info')]
+        # (the second item has no valid infofile)
+        assert not queue.run()
+        assert [item.status for item in queue.items] == ['done', 'failed']
+        assert os.path.isfile(tmp_path/"a"/"infofile.csv")
+        assert not os.path.isfile(tmp_path/"b"/"infofile.csv")
+        summary = queue.get_summary().splitlines()
+        assert len(summary) == 3
+        assert "done" in summary[1] and "failed" in summary[2]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+from IMTreatment.utils import make_unit
+
+from pyDSA_gui.display_transform import DisplayTransform
+from pyDSA_gui.params import DSAParams
+
+from test_dsa_backend import EDGES, FITS, PRECOMP, import_images
+
+
+PARAMS = {'dx': 0.1*make_unit('mm'), 'lims': [[10, 110], [20, 70]]}
+
+
+def to_display(pts, params):
+    """ Display coordinates, as computed with the unum parameters. """
+    pts = np.array(pts, dtype=float).transpose()
+    dx = params['dx'].asNumber()
+    lims = params['lims']
+    pts[0] = pts[0]/dx - lims[0][0]
+    pts[1] = lims[1][1] - pts[1]/dx
+    return pts
+
+
+class TestDisplayTransform(object):
+
+    def test_points(self):
+        transform = DisplayTransform(PARAMS)
+        pts = np.array([[0, 0], [1.5, 2], [10, 3.2]])
+        assert np.allclose(transform(pts, axis=1),
+                           to_display(pts, PARAMS).transpose())
+        assert np.allclose(transform(pts.transpose()),
+                           to_display(pts, PARAMS))
+        # single point
+        assert np.allclose(transform([1.5, 2]), [5, 50])
+
+    def test_input_not_modified(self):
+        transform = DisplayTransform(PARAMS)
+        pts = np.array([[1, 2], [3, 4]])
+        transform(pts)
+        assert np.all(pts == [[1, 2], [3, 4]])
+
+    def test_backend(self, tmp_path):
+        dsa = import_images(tmp_path)
+        transform = dsa.get_display_transform()
+        # only recomputed when the parameters change
+        dsa.get_current_edge_pts(2)
+        assert dsa.get_display_transform() is transform
+        dsa.params = DSAParams(dict(PRECOMP, dx=2*make_unit('mm')), EDGES,
+                               FITS)
+        transform = dsa.get_display_transform()
+        assert transform.scale[0] == 0.5
+        edge = dsa.get_current_edge(2)
+        assert np.allclose(dsa.get_current_edge_pts(2),
+                           to_display(edge.xy, dsa.get_precomp_params()))
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import concurrent.futures as cf
+import multiprocessing as mp
+import cv2
+import numpy as np
+import os
+import pytest
+import shutil
+
+from IMTreatment.utils import make_unit
+
+from pyDSA_gui import dsa_pipeline
+from pyDSA_gui.headless import HeadlessApp
+from pyDSA_gui.params import DSAParams
+
+
+dirname = os.path.dirname(__file__)
+PRECOMP = {'dt': 1*make_unit('s'), 'dx': 1*make_unit('mm'), 'dl': 1,
+           'scaling_pts': [], 'lims': [[0, 1599], [0, 275]],
+           'baseline_pts': [[0, 40], [1599, 40]], 'cropt': [1, 8]}
+EDGES = ({'threshold1': 20, 'threshold2': 80, 'dilatation_steps': 1,
+          'smooth_size': 0},
+         {'level': 0.5},
+         {'nmb_edges': 2, 'ignored_pixels': 10, 'size_ratio': 0.5})
+FITS = ({'triple_pts': [[0, 0]]*2}, )*3 + ({'deg': 5}, {'k': 5, 's': 0.5},
+                                           {'pos_estimate': 0.1,
+                                            'sigma': 0.1})
+
+
+def import_images(tmp_path, nmb_workers=1):
+    """ Return a headless backend, with the test images imported. """
+    filepaths = []
+    for i in range(1, 9):
+        filepaths.append(str(tmp_path / f"test{i}.png"))
+        # (copied once, the results store is only reused for the same files)
+        if not os.path.isfile(filepaths[-1]):
+            shutil.copy(os.path.join(dirname, f"test{i}.png"), filepaths[-1])
+    dsa = HeadlessApp(nmb_workers=nmb_workers).dsa
+    dsa.params = DSAParams(PRECOMP, EDGES, FITS, edge_method='canny',
+                           fit_method='circle')
+    dsa.edge_detection_method = 'canny'
+    dsa.fit_method = 'circle'
+    assert dsa.import_images(filepaths)
+    return dsa
+
+
+class TestComputeFits(object):
+
+    def test_progressive(self, tmp_path):
+        dsa = import_images(tmp_path)
+        updates = []
+        dsa.compute_fits(progressive=True,
+                         on_update=lambda: updates.append(
+                             list(dsa.fits_frames)))
+        assert updates[-1] == list(range(1, 9))
+        assert list(dsa.fits_frames) == list(range(1, 9))
+        assert all(fit is not None for fit in dsa.fit_cache)
+        dsa.close()
+
+    def test_cancelled(self, tmp_path, monkeypatch):
+        dsa = import_images(tmp_path)
+        process_frame = dsa_pipeline.process_frame
+
+        def cancel_on_frame_2(source, ind, *args):
+            # (as the cancel button)
+            if ind == 2:
+                dsa.cancel()
+            return process_frame(source, ind, *args)
+        monkeypatch.setattr(dsa_pipeline, 'process_frame', cancel_on_frame_2)
+        finished = []
+        dsa.compute_fits(progressive=True,
+                         on_finished=lambda: finished.append(True))
+        assert finished == [True]
+        # Passes: [0], ..., [0, 4], then cancelled during [0, 2, 4, 6]
+        assert list(dsa.fits_frames) == [1, 5]
+        assert [fit is not None for fit in dsa.fit_cache] == [
+            True, False, False, False, True, False, False, False]
+        assert len(dsa.fits.fits) == 2
+        dsa.close()
+
+
+def get_keys(precomp, edges, fits):
+    dsa = HeadlessApp().dsa
+    dsa.params = DSAParams(precomp, edges, fits)
+    dsa.edge_detection_method = 'canny'
+    dsa.fit_method = 'circle'
+    return dsa.get_edge_key(), dsa.get_fit_key()
+
+
+class TestCacheKeys(object):
+
+    def setup_method(self):
+        self.keys = get_keys(PRECOMP, EDGES, FITS)
+
+    def test_temporal_params(self):
+        # temporal crop and time step do not change the results
+        precomp = dict(PRECOMP, cropt=[2, 5], dt=0.5*make_unit('s'))
+        assert get_keys(precomp, EDGES, FITS) == self.keys
+
+    def test_spatial_params(self):
+        for name, value in [('dx', 2*make_unit('mm')),
+                            ('lims', [[0, 800], [0, 275]]),
+                            ('baseline_pts', [[0, 30], [1599, 30]])]:
+            keys = get_keys(dict(PRECOMP, **{name: value}), EDGES, FITS)
+            assert keys[0] != self.keys[0]
+            assert keys[1] != self.keys[1]
+
+    def test_fit_params(self):
+        fits = ({'triple_pts': [[0, 5]]*2}, ) + FITS[1:]
+        keys = get_keys(PRECOMP, EDGES, fits)
+        assert keys[0] == self.keys[0]
+        assert keys[1] != self.keys[1]
+        # (parameters of the other methods are ignored)
+        fits = FITS[:3] + ({'deg': 3}, ) + FITS[4:]
+        assert get_keys(PRECOMP, EDGES, fits) == self.keys
+
+    def test_stable_between_processes(self):
+        # (keys are stored with the results, to be reused in other sessions)
+        ctx = mp.get_context('spawn')
+        with cf.ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+            keys = ex.submit(get_keys, PRECOMP, EDGES, FITS).result()
+        assert keys == self.keys
+
+
+class TestCheckCache(object):
+
+    def setup_method(self):
+        self.dsa = None
+
+    def teardown_method(self):
+        if self.dsa is not None:
+            self.dsa.close()
+
+    def compute(self, tmp_path):
+        self.dsa = import_images(tmp_path)
+        self.dsa.compute_fits()
+        self.edges = list(self.dsa.edge_cache)
+        self.fits = list(self.dsa.fit_cache)
+        assert all(fit is not None for fit in self.fits)
+
+    def set_params(self, precomp=PRECOMP, edges=EDGES, fits=FITS):
+        self.dsa.params = DSAParams(precomp, edges, fits)
+
+    def test_temporal_params(self, tmp_path):
+        self.compute(tmp_path)
+        self.set_params(dict(PRECOMP, cropt=[2, 5], dt=0.5*make_unit('s')))
+        assert not self.dsa.check_cache()
+        assert all(edge is old for edge, old in zip(self.dsa.edge_cache,
+                                                     self.edges))
+        assert all(fit is old for fit, old in zip(self.dsa.fit_cache,
+                                                   self.fits))
+        # (and the fits are not recomputed)
+        self.dsa.compute_fits()
+        assert all(fit is old for fit, old in zip(self.dsa.fit_cache,
+                                                   self.fits))
+        assert list(self.dsa.fits_frames) == [2, 3, 4, 5]
+
+    def test_fit_params(self, tmp_path):
+        self.compute(tmp_path)
+        self.set_params(fits=({'triple_pts': [[0, 5]]*2}, ) + FITS[1:])
+        assert self.dsa.check_cache()
+        assert all(edge is old for edge, old in zip(self.dsa.edge_cache,
+                                                     self.edges))
+        assert all(fit is None for fit in self.dsa.fit_cache)
+
+    def test_edge_params(self, tmp_path):
+        self.compute(tmp_path)
+        edges = (dict(EDGES[0], threshold1=30), ) + EDGES[1:]
+        self.set_params(edges=edges)
+        assert self.dsa.check_cache()
+        assert all(edge is None for edge in self.dsa.edge_cache)
+        assert all(fit is None for fit in self.dsa.fit_cache)
+
+
+class TestRunInds(object):
+
+    def setup_method(self):
+        self.dsa = None
+
+    def teardown_method(self):
+        if self.dsa is not None:
+            self.dsa.close()
+
+    def set_stride(self, N):
+        self.dsa.params = DSAParams(PRECOMP, EDGES, FITS, run={'N': N})
+
+    def test_nested(self, tmp_path):
+        self.dsa = import_images(tmp_path)
+        self.set_stride(4)
+        assert self.dsa.get_run_inds() == [0, 4]
+        self.set_stride(2)
+        assert self.dsa.get_run_inds() == [0, 2, 4, 6]
+        self.dsa.params = DSAParams(dict(PRECOMP, cropt=[2, 8]), EDGES,
+                                    FITS, run={'N': 3})
+        assert self.dsa.get_run_inds() == [1, 4, 7]
+
+    def test_refined(self, tmp_path, monkeypatch):
+        self.dsa = import_images(tmp_path)
+        computed = []
+        process_frame = dsa_pipeline.process_frame
+        monkeypatch.setattr(dsa_pipeline, 'process_frame',
+                            lambda source, ind, *args: computed.append(ind)
+                            or process_frame(source, ind, *args))
+        self.set_stride(4)
+        self.dsa.compute_fits()
+        assert computed == [0, 4]
+        fits = list(self.dsa.fit_cache)
+        # Only the missing frames are computed
+        self.set_stride(2)
+        self.dsa.compute_fits()
+        assert computed == [0, 4, 2, 6]
+        assert list(self.dsa.fits_frames) == [1, 3, 5, 7]
+        assert self.dsa.fit_cache[0] is fits[0]
+        assert self.dsa.fit_cache[4] is fits[4]
+
+    def test_resumed(self, tmp_path, monkeypatch):
+        # Results of a previous session are loaded from the results store
+        self.dsa = import_images(tmp_path)
+        self.set_stride(4)
+        self.dsa.compute_fits()
+        self.dsa.close()
+        self.dsa = import_images(tmp_path)
+        computed = []
+        process_frame = dsa_pipeline.process_frame
+        monkeypatch.setattr(dsa_pipeline, 'process_frame',
+                            lambda source, ind, *args: computed.append(ind)
+                            or process_frame(source, ind, *args))
+        self.set_stride(2)
+        self.dsa.compute_fits()
+        assert computed == [2, 6]
+
+
+class TestDSAMem(object):
+
+    def get_backend(self, tmp_path, use_memmap):
+        from pyDSA_gui.dsa_backend import DSA_mem
+        filepaths = []
+        for i in range(1, 9):
+            filepaths.append(str(tmp_path / f"test{i}.png"))
+            shutil.copy(os.path.join(dirname, f"test{i}.png"), filepaths[-1])
+        self.filepaths = filepaths
+        dsa = DSA_mem(HeadlessApp(), params=DSAParams(PRECOMP, EDGES, FITS),
+                      use_memmap=use_memmap)
+        dsa.edge_detection_method = 'canny'
+        dsa.fit_method = 'circle'
+        # (in reverse order, sorted when importing)
+        assert dsa.import_images(filepaths[::-1])
+        return dsa
+
+    @pytest.mark.parametrize('use_memmap', [False, True])
+    def test_import_images(self, tmp_path, use_memmap):
+        dsa = self.get_backend(tmp_path, use_memmap)
+        assert dsa.nmb_frames == 8
+        assert (dsa.frames is not None) == use_memmap
+        assert os.path.isfile(tmp_path/"infofile.frames.npy") == use_memmap
+        for ind in [0, 5]:
+            data = cv2.imread(self.filepaths[ind], cv2.IMREAD_GRAYSCALE)
+            im = dsa.get_current_raw_im(ind)
+            assert np.all(im.values == data.transpose()[:, ::-1])
+        im = dsa.get_current_precomp_im(5)
+        assert im.shape == (1600, 276)
+
+    @pytest.mark.parametrize('use_memmap', [False, True])
+    def test_temporal_crop_keeps_caches(self, tmp_path, use_memmap):
+        dsa = self.get_backend(tmp_path, use_memmap)
+        edge = dsa.get_current_edge(3)
+        fit = dsa.get_current_fit(3)
+        dsa.params = DSAParams(dict(PRECOMP, cropt=[2, 6]), EDGES, FITS)
+        dsa.precompute_images()
+        assert dsa.get_current_edge(3) is edge
+        assert dsa.get_current_fit(3) is fit
+        # (but not when the images change)
+        dsa.params = DSAParams(dict(PRECOMP, lims=[[0, 800], [0, 275]]),
+                               EDGES, FITS)
+        dsa.precompute_images()
+        assert dsa.get_current_edge(3) is not edge
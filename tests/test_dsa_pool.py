@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+import pytest
+
+from pyDSA_gui.dsa_pool import FitPool, SharedFrames, _has_shared_memory
+from pyDSA_gui.frame_sources import FrameSource, image_from_array
+
+
+pytestmark = pytest.mark.skipif(not _has_shared_memory(),
+                                reason="requires python >= 3.8")
+
+
+class FakeSource(FrameSource):
+    """
+    Synthetic video, whose frame `ind` is filled with `ind`.
+
+    Frames in `bad_frames` cannot be read, frames in `resized_frames`
+    do not have the size of the others.
+    """
+    input_type = 'video'
+
+    def __init__(self, nmb_frames, bad_frames=(), resized_frames=()):
+        super().__init__("fake.mp4")
+        self.nmb_frames = nmb_frames
+        self.sizex, self.sizey = 12, 10
+        self.bad_frames = bad_frames
+        self.resized_frames = resized_frames
+
+    def open(self):
+        pass
+
+    def get_frame(self, ind, lims=None):
+        if ind in self.bad_frames:
+            raise OSError(f"Can't decode frame number {ind}")
+        shape = (self.sizey, self.sizex)
+        if ind in self.resized_frames:
+            shape = (self.sizey + 1, self.sizex)
+        return image_from_array(np.full(shape, ind, dtype=np.uint8))
+
+
+# (unknown methods, so that the workers do not spend time detecting)
+PARAMS = ({'lims': [[0, 11], [0, 9]], 'baseline_pts': [[0, 2], [11, 2]], 'dx': 1},
+          'none', None, 'none', None)
+
+
+class TestSharedFrames(object):
+
+    def setup_method(self):
+        self.frames = SharedFrames(2, (10, 12))
+
+    def teardown_method(self):
+        self.frames.close()
+
+    def test_put(self):
+        values = np.arange(120, dtype=np.uint8).reshape(10, 12)
+        slot, offset = self.frames.put(values)
+        assert (slot, offset) == (0, 0)
+        slot, offset = self.frames.put(values + 1)
+        assert (slot, offset) == (1, 120)
+        stored = np.ndarray((10, 12), dtype=np.uint8,
+                            buffer=self.frames.shm.buf, offset=offset)
+        assert np.all(stored == values + 1)
+        del stored
+
+    def test_ring(self):
+        values = np.zeros((10, 12), dtype=np.uint8)
+        slot1, _ = self.frames.put(values)
+        slot2, _ = self.frames.put(values)
+        assert not self.frames.has_free_slot()
+        self.frames.release(slot1)
+        assert self.frames.has_free_slot()
+        assert self.frames.put(values)[0] == slot1
+
+    def test_wrong_shape(self):
+        with pytest.raises(ValueError):
+            self.frames.put(np.zeros((11, 12), dtype=np.uint8))
+        # (the slot is not lost)
+        assert len(self.frames.free_slots) == 2
+
+
+class TestSharedIteration(object):
+
+    def setup_method(self):
+        self.pool = FitPool(nmb_workers=2)
+
+    def teardown_method(self):
+        self.pool.shutdown()
+
+    def test_ordered(self):
+        source = FakeSource(20, bad_frames=[3], resized_frames=[5])
+        inds = list(range(2, 20))
+        results = list(self.pool.iter_frames(source, inds, *PARAMS,
+                                             shared=True))
+        assert [res[0] for res in results] == inds
+        for ind, edge, fit, message in results:
+            assert edge is None
+            if ind in [3, 5]:
+                assert fit is None
+                assert message.startswith(f"Can't process frame number {ind}")
+            else:
+                assert fit is not None
+                assert message == "Couldn't find a drop here"
+
+    def test_stopped(self):
+        source = FakeSource(50)
+        results = []
+        for res in self.pool.iter_frames(source, range(50), *PARAMS,
+                                         shared=True,
+                                         poll=lambda: len(results) >= 5):
+            results.append(res)
+            if len(results) == 5:
+                # Workers skip the frames they did not start yet
+                self.pool.stop()
+        assert [res[0] for res in results] == list(range(len(results)))
+        assert all(res[3] in ["Couldn't find a drop here", "Stopped"]
+                   for res in results)
+        # The pool can still be used
+        results = list(self.pool.iter_frames(source, [7, 8], *PARAMS,
+                                             shared=True))
+        assert [res[0] for res in results] == [7, 8]
+        assert all(res[2] is not None for res in results)
+
+    def test_interrupted(self):
+        source = FakeSource(50)
+        frames = self.pool.iter_frames(source, range(50), *PARAMS,
+                                       shared=True)
+        assert [next(frames)[0] for _ in range(3)] == [0, 1, 2]
+        # Closing the generator stops the remaining frames
+        frames.close()
+        assert self.pool.stop_event.is_set()
+        results = list(self.pool.iter_frames(source, [10], *PARAMS,
+                                             shared=True))
+        assert [res[0] for res in results] == [10]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pytest
+import zipfile
+
+from pyDSA_gui import exports
+
+
+NAMES = ['Frame number', 'CA (left)']
+UNITS = {'Frame number': '', 'CA (left)': '°'}
+METADATA = {'file': 'drop.avi', 'date': '2019-01-01 00:00:00'}
+
+
+def get_columns(nmb):
+    return [np.arange(nmb, dtype=float), np.linspace(90, 100, nmb)]
+
+
+class TestExports(object):
+
+    def test_headers(self):
+        assert exports.get_headers(['Position (x, left)'],
+                                   {'Position (x, left)': 'mm'}) \
+            == ['Position (x left) [mm]']
+
+    def test_iter_chunks(self):
+        chunks = list(exports.iter_chunks(get_columns(5), 2))
+        assert [start for start, _ in chunks] == [0, 2, 4]
+        assert [chunk.shape for _, chunk in chunks] \
+            == [(2, 2), (2, 2), (1, 2)]
+        assert list(exports.iter_chunks([], 2)) == []
+
+    def test_save_csv(self, tmp_path):
+        filepath = str(tmp_path/"res.csv")
+        columns = get_columns(5)
+        exports.save_csv(filepath, NAMES, columns, UNITS, METADATA,
+                         chunk_size=2)
+        with open(filepath) as f:
+            lines = f.read().splitlines()
+        assert lines[:3] == ['# File: drop.avi',
+                             '# Analysis date: 2019-01-01 00:00:00',
+                             '# Frame number [], CA (left) [°]']
+        assert len(lines) == 8
+        data = np.loadtxt(filepath, delimiter=',')
+        assert np.allclose(data, np.column_stack(columns))
+
+    def test_save_xlsx(self, tmp_path):
+        filepath = str(tmp_path/"res.xlsx")
+        exports.save_xlsx(filepath, NAMES, get_columns(5), UNITS, METADATA,
+                          chunk_size=2)
+        with zipfile.ZipFile(filepath) as f:
+            sheet = f.read('xl/worksheets/sheet1.xml').decode()
+        assert 'drop.avi' in sheet
+        assert 'mergeCell' not in sheet
+        # 3 header rows and 5 data rows
+        assert sheet.count('<row ') == 8
+
+    def test_add_extension(self):
+        assert exports.add_extension('res', '.npz') == 'res.npz'
+        assert exports.add_extension('res.parquet', '.npz') == 'res.parquet'
+        assert exports.add_extension('res.h5', '.npz') == 'res.h5'
+        assert exports.add_extension('res', '.npz',
+                                     'HDF5 (*.h5 *.hdf5)') == 'res.h5'
+        assert exports.add_extension('res', '.csv', '') == 'res.csv'
+
+    def test_save_hdf5_mappable(self, tmp_path):
+        h5py = pytest.importorskip('h5py')
+        filepath = str(tmp_path/"res.h5")
+        arrays = {'CA (left)': np.linspace(90, 100, 5)}
+        exports.save_hdf5(filepath, arrays, {'units': {'CA (left)': '°'}})
+        with h5py.File(filepath, 'r') as f:
+            dset = f['CA (left)']
+            assert dset.attrs['unit'] == '°'
+            # contiguous data, that can be memory-mapped
+            offset = dset.id.get_offset()
+            dtype = dset.dtype
+        assert offset is not None
+        data = np.memmap(filepath, dtype=dtype, mode='r',
+                         offset=offset, shape=(5, ))
+        assert np.allclose(data, arrays['CA (left)'])
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from pyDSA_gui.frame_cache import FrameCache, get_image_size
+
+
+class MockImage(object):
+    def __init__(self, nbytes):
+        self.values = np.zeros(nbytes, dtype=np.uint8)
+
+
+class TestFrameCache(object):
+
+    def test_image_size(self):
+        im = MockImage(100)
+        im.axe_x = np.zeros(10)
+        assert get_image_size(im) == 180
+
+    def test_get_put(self):
+        cache = FrameCache(1000)
+        im = MockImage(100)
+        assert cache.get(0) is None
+        cache.put(0, im)
+        assert cache.get(0) is im
+        assert 0 in cache
+        assert len(cache) == 1
+        assert cache.size == 100
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_eviction_by_size(self):
+        cache = FrameCache(350)
+        for i in range(3):
+            cache.put(i, MockImage(100))
+        assert cache.size == 300
+        # least recently used frame is evicted first
+        cache.get(0)
+        cache.put(3, MockImage(100))
+        assert 1 not in cache
+        assert list(cache.frames) == [2, 0, 3]
+        assert cache.size == 300
+        # a big frame evicts several frames
+        cache.put(4, MockImage(250))
+        assert list(cache.frames) == [3, 4]
+        assert cache.size == 350
+
+    def test_replace_and_remove(self):
+        cache = FrameCache(1000)
+        cache.put(0, MockImage(100))
+        cache.put(0, MockImage(200))
+        assert len(cache) == 1
+        assert cache.size == 200
+        cache.remove(0)
+        assert cache.size == 0
+        cache.remove(0)
+        assert len(cache) == 0
+
+    def test_too_big_frame(self):
+        cache = FrameCache(100)
+        cache.put(0, MockImage(50))
+        cache.put(1, MockImage(200))
+        assert 1 not in cache
+        assert 0 in cache
+
+    def test_peek_does_not_count(self):
+        cache = FrameCache(1000)
+        im0 = MockImage(100)
+        cache.put(0, im0)
+        cache.put(1, MockImage(100))
+        assert cache.peek(0) is im0
+        assert cache.peek(2) is None
+        assert cache.hits == 0 and cache.misses == 0
+        # peek does not refresh the frame
+        cache.max_size = 250
+        cache.put(2, MockImage(100))
+        assert 0 not in cache
+
+    def test_clear(self):
+        cache = FrameCache(1000)
+        cache.put(0, MockImage(100))
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.size == 0
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pickle
+import pytest
+import shutil
+import struct
+
+import cv2
+import numpy as np
+
+from pyDSA_gui import frame_sources
+from pyDSA_gui.frame_sources import (ImagesSource, StackSource, VideoSource,
+                                     crop_array, image_from_array,
+                                     is_stack, natural_sort_key,
+                                     probe_image_size, read_tiff_pages,
+                                     roi_slices)
+
+
+dirname = os.path.dirname(__file__)
+
+
+def test_roi_slices():
+    assert roi_slices(None, 40, 30) == ((0, 40), (0, 30))
+    assert roi_slices([[5, 14], [3, 10]], 40, 30) == ((5, 15), (3, 11))
+    # (only the pixels inside the limits)
+    assert roi_slices([[4.5, 14.5], [2.2, 9.9]], 40, 30) == ((5, 15),
+                                                             (3, 10))
+    # (clipped to the frame)
+    assert roi_slices([[-10, 100], [-1, 29]], 40, 30) == ((0, 40), (0, 30))
+
+
+class TestCropArray(object):
+
+    def setup_method(self):
+        rng = np.random.default_rng(0)
+        self.data = rng.integers(0, 256, (30, 40), dtype=np.uint8)
+
+    def test_whole_frame(self):
+        data, origin = crop_array(self.data)
+        assert origin == (0, 0)
+        assert data.shape == self.data.shape
+        assert np.shares_memory(data, self.data)
+
+    def test_same_as_image_crop(self):
+        lims = [[5.5, 14], [3, 10.2]]
+        data, origin = crop_array(self.data, lims)
+        assert origin == (6, 3)
+        assert np.shares_memory(data, self.data)
+        im = image_from_array(data, origin)
+        full = image_from_array(self.data)
+        full.crop(intervx=lims[0], intervy=lims[1], inplace=True)
+        assert np.all(im.axe_x == full.axe_x)
+        assert np.all(im.axe_y == full.axe_y)
+        assert np.all(im.values == full.values)
+
+    def test_color_frame(self):
+        data = np.dstack([self.data]*3)
+        im = image_from_array(*crop_array(data, [[5, 14], [3, 10]]))
+        ref = image_from_array(*crop_array(self.data, [[5, 14], [3, 10]]))
+        assert np.all(im.values == ref.values)
+
+
+class MockCapture(object):
+    """ Video capture returning the given raw frames. """
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return True, self.data
+
+    def grab(self):
+        return True
+
+    def set(self, prop, value):
+        return True
+
+
+class TestVideoSource(object):
+
+    def setup_method(self):
+        self.filepath = os.path.join(dirname, "wetting_ridge.mp4")
+
+    def test_open(self):
+        source = VideoSource(self.filepath)
+        source.open()
+        assert source.use_luma
+        vid = cv2.VideoCapture(self.filepath)
+        vid.set(cv2.CAP_PROP_POS_FRAMES, 3)
+        _, data = vid.read()
+        # (gray levels of the frames converted by opencv)
+        ref = image_from_array(data)
+        for im in [source.get_frame(3),
+                   pickle.loads(pickle.dumps(source.clone())).get_frame(3)]:
+            assert im.shape == (source.sizex, source.sizey)
+            diff = np.abs(im.values.astype(int) - ref.values)
+            assert np.mean(diff) < 1
+            assert np.max(diff) <= 2
+        # Region of interest
+        im = source.get_frame(3, lims=[[100, 199], [50, 149]])
+        assert np.all(im.values == source.get_frame(3).values[100:200,
+                                                              50:150])
+        source.close()
+
+    def get_source(self, data):
+        source = VideoSource(self.filepath)
+        source.sizex, source.sizey = 6, 4
+        source.vid = MockCapture(data)
+        source.pos = 0
+        source.use_luma = True
+        source.luma_lut = VideoSource.luma_luts[1]
+        return source
+
+    def test_is_luma(self):
+        source = self.get_source(None)
+        assert source._is_luma(np.zeros((4, 6), dtype=np.uint8))
+        # I420 / NV12
+        assert source._is_luma(np.zeros((6, 6), dtype=np.uint8))
+        assert not source._is_luma(np.zeros((4, 6), dtype=np.uint16))
+        assert not source._is_luma(np.zeros((4, 6, 3), dtype=np.uint8))
+        assert not source._is_luma(np.zeros((1, 24), dtype=np.uint8))
+
+    def test_get_frame_i420(self):
+        data = np.full((6, 6), 200, dtype=np.uint8)
+        data[:4] = np.arange(24).reshape(4, 6)
+        im = self.get_source(data).get_frame(0)
+        assert im.shape == (6, 4)
+        assert np.all(im.values == data[:4].transpose()[:, ::-1])
+
+    def test_limited_range(self):
+        data = np.array([[16, 235, 0, 255, 125, 126]]*4, dtype=np.uint8)
+        source = self.get_source(data)
+        source.luma_lut = VideoSource.luma_luts[0]
+        im = source.get_frame(0)
+        assert list(im.values[:, 0]) == [0, 255, 0, 255, 127, 128]
+
+
+def test_natural_sort_key():
+    filepaths = ["img10.png", "img2.png", "IMG1.png", "img2b.png",
+                 "img02_3.png", "a/img1.png"]
+    assert sorted(filepaths, key=natural_sort_key) == [
+        "a/img1.png", "IMG1.png", "img2.png", "img02_3.png", "img2b.png",
+        "img10.png"]
+
+
+class TestImagesSource(object):
+
+    def setup_method(self):
+        self.filepaths = [os.path.join(dirname, f"test{i}.png")
+                          for i in range(1, 4)]
+
+    def test_probe_image_size(self):
+        data = cv2.imread(self.filepaths[0], cv2.IMREAD_GRAYSCALE)
+        assert probe_image_size(self.filepaths[0]) == data.shape[::-1]
+
+    def test_open(self):
+        source = ImagesSource(self.filepaths)
+        source.open()
+        assert source.nmb_frames == 3
+        im = source.get_frame(1)
+        assert im.shape == (source.sizex, source.sizey)
+        assert im.filepath == self.filepaths[1]
+
+    def test_get_dt(self, tmp_path):
+        filepaths = []
+        for i, path in enumerate(self.filepaths):
+            filepaths.append(str(tmp_path / os.path.basename(path)))
+            shutil.copy(path, filepaths[-1])
+            # (no EXIF data in the test images, modification times are used)
+            os.utime(filepaths[-1], (1000 + 0.5*i, 1000 + 0.5*i))
+        source = ImagesSource(filepaths)
+        source.open()
+        assert source.get_dt() == 1
+        source = ImagesSource(filepaths, dt_from_timestamps=True)
+        source.open()
+        assert np.allclose(source.get_timestamps(), [1000, 1000.5, 1001])
+        assert source.get_dt() == 0.5
+        # (kept when sent to the workers)
+        assert source.clone().get_dt() == 0.5
+
+    def test_timestamps_read_once(self, monkeypatch):
+        calls = []
+        get_exif_time = frame_sources.get_exif_time
+        monkeypatch.setattr(frame_sources, 'get_exif_time',
+                            lambda path: calls.append(path)
+                            or get_exif_time(path))
+        source = ImagesSource(self.filepaths)
+        source.open()
+        assert source.get_dt() == 1
+        assert calls == []
+        source = ImagesSource(self.filepaths, dt_from_timestamps=True)
+        source.open()
+        assert calls == self.filepaths
+        for i in range(3):
+            source.get_dt()
+        source.clone().get_dt()
+        assert calls == self.filepaths
+
+
+def write_tiff(filepath, frames, photometric=1):
+    """
+    Write (nmb_frames, height, width) uint8 or uint16 frames
+    as an uncompressed multi-page tiff.
+    """
+    frames = np.asarray(frames)
+    nmb_frames, height, width = frames.shape
+    bits = frames.dtype.itemsize*8
+    with open(filepath, 'wb') as f:
+        f.write(b'II' + struct.pack('<HI', 42, 0))
+        prev_link = 4
+        for frame in frames:
+            data_offset = f.tell()
+            f.write(frame.astype(f"<u{bits//8}").tobytes())
+            ifd_offset = f.tell()
+            f.seek(prev_link)
+            f.write(struct.pack('<I', ifd_offset))
+            f.seek(ifd_offset)
+            entries = [(256, 3, width), (257, 3, height), (258, 3, bits),
+                       (259, 3, 1), (262, 3, photometric),
+                       (273, 4, data_offset), (277, 3, 1),
+                       (278, 3, height), (279, 4, frame.size*bits//8)]
+            f.write(struct.pack('<H', len(entries)))
+            for tag, typ, value in entries:
+                fmt = '<HHIH2x' if typ == 3 else '<HHII'
+                f.write(struct.pack(fmt, tag, typ, 1, value))
+            prev_link = f.tell()
+            f.write(struct.pack('<I', 0))
+
+
+class TestStackSource(object):
+
+    def setup_method(self):
+        rng = np.random.default_rng(0)
+        self.frames = rng.integers(0, 256, (4, 30, 40), dtype=np.uint8)
+
+    def check_frames(self, source, frames):
+        source.open()
+        assert source.nmb_frames == len(frames)
+        assert (source.sizex, source.sizey) == (40, 30)
+        for i, frame in enumerate(frames):
+            im = source.get_frame(i)
+            assert np.all(im.values == frame.transpose()[:, ::-1])
+        # Region of interest
+        im = source.get_frame(2, lims=[[5, 14], [3, 10]])
+        assert im.axe_x[0] == 5 and im.axe_y[0] == 3
+        assert np.all(im.values == source.get_frame(2).values[5:15, 3:11])
+        source.close()
+
+    def test_uint8_tiff(self, tmp_path):
+        filepath = str(tmp_path / "stack.tif")
+        write_tiff(filepath, self.frames)
+        assert is_stack(filepath)
+        source = StackSource(filepath)
+        self.check_frames(source, self.frames)
+        assert source.offsets is not None
+
+    def test_uint16_tiff(self, tmp_path):
+        filepath = str(tmp_path / "stack.tif")
+        # 12-bits values, the brightest frame being the last one
+        frames = self.frames.astype(np.uint16) << 2
+        frames[-1] = frames[-1] << 2
+        write_tiff(filepath, frames)
+        source = StackSource(filepath)
+        source.open()
+        assert source.shift == 4
+        self.check_frames(source, (frames >> 4).astype(np.uint8))
+
+    def test_white_is_zero(self, tmp_path):
+        filepath = str(tmp_path / "stack.tif")
+        write_tiff(filepath, 255 - self.frames, photometric=0)
+        self.check_frames(StackSource(filepath), self.frames)
+        filepath = str(tmp_path / "stack16.tif")
+        write_tiff(filepath, 65535 - (self.frames.astype(np.uint16) << 8),
+                   photometric=0)
+        self.check_frames(StackSource(filepath), self.frames)
+
+    def test_npy(self, tmp_path):
+        filepath = str(tmp_path / "stack.npy")
+        np.save(filepath, self.frames)
+        assert is_stack(filepath)
+        self.check_frames(StackSource(filepath), self.frames)
+
+    def test_compressed_tiff(self, tmp_path):
+        from PIL import Image as PILImage
+        filepath = str(tmp_path / "stack.tif")
+        ims = [PILImage.fromarray(frame) for frame in self.frames]
+        ims[0].save(filepath, save_all=True, append_images=ims[1:],
+                    compression='tiff_deflate')
+        source = StackSource(filepath)
+        self.check_frames(source, self.frames)
+        assert source.offsets is None
+
+    @pytest.mark.parametrize('ext', ['.npy', '.tif', '.tiff'])
+    def test_clone(self, tmp_path, monkeypatch, ext):
+        filepath = str(tmp_path / f"stack{ext}")
+        frames = self.frames.astype(np.uint16) << 4
+        if ext == '.npy':
+            np.save(filepath, frames)
+        elif ext == '.tif':
+            write_tiff(filepath, frames)
+        else:
+            from PIL import Image as PILImage
+            ims = [PILImage.fromarray(frame) for frame in self.frames]
+            ims[0].save(filepath, save_all=True, append_images=ims[1:],
+                        compression='tiff_deflate')
+        source = StackSource(filepath)
+        source.open()
+        # (as sent to the workers)
+        clone = pickle.loads(pickle.dumps(source.clone()))
+        reads = []
+        read = StackSource._read
+        monkeypatch.setattr(StackSource, '_read',
+                            lambda self, ind: reads.append(ind)
+                            or read(self, ind))
+        im = clone.get_frame(3)
+        assert reads == [3]
+        assert clone.shift == source.shift
+        assert np.all(im.values == source.get_frame(3).values)
+        clone.close()
+        source.close()
+
+    def test_not_a_stack(self, tmp_path):
+        filepath = str(tmp_path / "single.tif")
+        write_tiff(filepath, self.frames[:1])
+        assert not is_stack(filepath)
+        assert not is_stack(os.path.join(dirname, "test1.png"))
+        assert not is_stack(str(tmp_path / "missing.tif"))
+
+    def test_pages_read_once(self, tmp_path, monkeypatch):
+        filepath = str(tmp_path / "stack.tif")
+        write_tiff(filepath, self.frames)
+        calls = []
+        read = frame_sources._read_tiff_pages
+        monkeypatch.setattr(frame_sources, "_read_tiff_pages",
+                            lambda path: calls.append(path) or read(path))
+        assert is_stack(filepath)
+        StackSource(filepath).open()
+        assert calls == [filepath]
+        pages, bo = read_tiff_pages(filepath)
+        assert bo == '<'
+        assert len(pages) == 4
+        assert pages[0]['photometric'] == (1, )
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import cv2
+import os
+import pytest
+import shutil
+
+import numpy as np
+
+from pyDSA_gui.frame_sources import ImagesSource
+from pyDSA_gui.frame_store import MemmapFrames, decode_images
+
+
+dirname = os.path.dirname(__file__)
+
+
+class TestMemmapFrames(object):
+
+    def setup_method(self):
+        self.filepaths = [os.path.join(dirname, f"test{i}.png")
+                          for i in range(1, 4)]
+
+    def get_frames(self, tmp_path):
+        filepaths = []
+        for path in self.filepaths:
+            filepaths.append(str(tmp_path / os.path.basename(path)))
+            shutil.copy(path, filepaths[-1])
+        source = ImagesSource(filepaths)
+        source.open()
+        filepath = str(tmp_path / "frames.npy")
+        return source, MemmapFrames.from_source(source, filepath)
+
+    def test_from_source(self, tmp_path):
+        source, frames = self.get_frames(tmp_path)
+        assert frames.nmb_frames == 3
+        assert (frames.sizex, frames.sizey) == (source.sizex, source.sizey)
+        for i in range(3):
+            assert np.all(frames.get_values(i)[0]
+                          == source.get_frame(i).values)
+        assert MemmapFrames.is_up_to_date(frames.filepath, source)
+
+    def test_get_values_is_a_view(self, tmp_path):
+        _, frames = self.get_frames(tmp_path)
+        lims = [[10, 50], [20, 60]]
+        values, origin = frames.get_values(1, lims)
+        assert origin == (10, 20)
+        assert values.shape == (41, 41)
+        assert np.shares_memory(values, frames.values)
+
+    def test_get_image_is_a_view(self, tmp_path):
+        _, frames = self.get_frames(tmp_path)
+        lims = [[10, 50], [20, 60]]
+        im = frames.get_image(2, lims)
+        values, _ = frames.get_values(2, lims)
+        assert np.shares_memory(im.values, frames.values)
+        assert np.all(im.values == values)
+        assert im.axe_x[0] == 10 and im.axe_y[0] == 20
+        assert not np.any(im.mask)
+        # Axes are shared with the other frames, but not modified by them
+        im2 = frames.get_image(0, lims)
+        im2.scale(scalex=2, inplace=True)
+        assert frames.get_image(2, lims).axe_x[0] == 10
+
+    def test_file_is_not_modified(self, tmp_path):
+        _, frames = self.get_frames(tmp_path)
+        before = np.load(frames.filepath).copy()
+        im = frames.get_image(0)
+        im.values[:] = 0
+        assert np.all(np.load(frames.filepath) == before)
+
+
+class TestDecodeImages(object):
+
+    def setup_method(self):
+        self.filepaths = [os.path.join(dirname, f"test{i}.png")
+                          for i in range(1, 9)]
+
+    def test_decode(self):
+        calls = []
+        frames = decode_images(self.filepaths, nmb_threads=4,
+                               hook=lambda i, n: calls.append((i, n)))
+        assert frames.dtype == np.uint8
+        assert sorted(calls) == [(i, 8) for i in range(8)]
+        # same orientation as the Image objects
+        source = ImagesSource(self.filepaths)
+        source.open()
+        assert frames.shape == (8, source.sizex, source.sizey)
+        for i in range(8):
+            assert np.all(frames[i] == source.get_frame(i).values)
+
+    def test_invalid_image(self, tmp_path):
+        path = str(tmp_path / "wrong.png")
+        with open(path, 'w') as f:
+            f.write('not an image')
+        with pytest.raises(IOError):
+            decode_images(self.filepaths[:3] + [path], nmb_threads=2)
+
+    def test_wrong_size(self, tmp_path):
+        path = str(tmp_path / "small.png")
+        cv2.imwrite(path, np.zeros((10, 10), dtype=np.uint8))
+        with pytest.raises(IOError):
+            decode_images(self.filepaths[:3] + [path], nmb_threads=2)
@@ -42,9 +42,15 @@ class TestGui(object):
         self.delay = 100
         pwd = os.path.dirname(os.path.realpath(__file__))
         filelist = glob.glob(join(pwd, '*.info'))
+        filelist += glob.glob(join(pwd, '*.results'))
         for filepath in filelist:
             os.remove(filepath)
 
+    def wait_for_computation(self):
+        while self.w.dsa.is_computing():
+            QTest.qWait(self.delay)
+        QTest.qWait(self.delay)
+
     def test_whole_process(self):
         QTest.qWait(self.delay)
 
@@ -133,12 +139,12 @@ class TestGui(object):
         #======================================================================
         # Goto analyze tab
         self.ui.tabWidget.setCurrentIndex(3)
-        QTest.qWait(self.delay)
+        self.wait_for_computation()
         # Set number of frames to take
         self.ui.tab4_set_N.setValue(10)
         QTest.qWait(self.delay)
         self.w.tab4.compute()
-        QTest.qWait(self.delay)
+        self.wait_for_computation()
         self.ui.tab4_yaxis2_box.setChecked(True)
         QTest.qWait(self.delay)
         self.ui.tab4_combo_xaxis.setCurrentIndex(1)
@@ -159,7 +165,7 @@ class TestGui(object):
         QTest.qWait(self.delay)
         # Goto analyze tab
         self.ui.tabWidget.setCurrentIndex(3)
-        QTest.qWait(self.delay)
+        self.wait_for_computation()
         self.ui.tab4_combo_yaxis.setCurrentIndex(13)
         QTest.qWait(self.delay)
         self.ui.tab4_combo_yaxis2.setCurrentIndex(12)
@@ -172,7 +178,7 @@ class TestGui(object):
         QTest.qWait(self.delay)
         # Goto analyze tab
         self.ui.tabWidget.setCurrentIndex(3)
-        QTest.qWait(self.delay)
+        self.wait_for_computation()
 
         #======================================================================
         # TAB 5
@@ -210,7 +216,7 @@ class TestGui(object):
         self.ui.tabWidget.setCurrentIndex(2)
         QTest.qWait(self.delay)
         self.ui.tabWidget.setCurrentIndex(3)
-        QTest.qWait(self.delay)
+        self.wait_for_computation()
         self.ui.tab4_combo_yaxis.setCurrentIndex(6)
         QTest.qWait(self.delay)
         self.ui.tab4_yaxis2_box.setChecked(False)
@@ -235,7 +241,7 @@ class TestGui(object):
         self.ui.tabWidget.setCurrentIndex(2)
         QTest.qWait(self.delay)
         self.ui.tabWidget.setCurrentIndex(3)
-        QTest.qWait(self.delay)
+        self.wait_for_computation()
         self.ui.tab4_combo_yaxis.setCurrentIndex(6)
         QTest.qWait(self.delay)
         self.ui.tab4_yaxis2_box.setChecked(False)
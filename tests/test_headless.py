@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+from pyDSA_gui.headless import HeadlessApp
+from pyDSA_gui.params import DSAParams, freeze
+
+from test_dsa_backend import EDGES, FITS, PRECOMP, import_images
+
+
+def make_dataset(tmp_path):
+    """ Return the pattern of the test images, with their infofile. """
+    dsa = import_images(tmp_path)
+    dsa.save_infofile()
+    dsa.close()
+    return str(tmp_path/"test*.png")
+
+
+class TestHeadlessApp(object):
+
+    def test_params_round_trip(self, tmp_path):
+        pattern = make_dataset(tmp_path)
+        app = HeadlessApp(nmb_workers=1)
+        assert app.import_files(pattern)
+        assert app.set_params()
+        params = app.dsa.params
+        assert isinstance(params, DSAParams)
+        assert params.get_precomp_params() == freeze(PRECOMP)
+        assert params.get_edge_params() == freeze(EDGES)
+        assert params.get_fit_params() == freeze(FITS)
+        assert params.get_run_params() == {'N': 1}
+        assert app.dsa.edge_detection_method == 'canny'
+        assert app.dsa.fit_method == 'circle'
+        app.dsa.close()
+
+    def test_run(self, tmp_path):
+        pattern = make_dataset(tmp_path)
+        output = str(tmp_path/"results.csv")
+        app = HeadlessApp(nmb_workers=1)
+        assert app.run(pattern, outputs=[output])
+        with open(output) as f:
+            lines = [line for line in f.read().splitlines()
+                     if not line.startswith('#')]
+        # (one line per frame)
+        frames = [float(line.split(',')[0]) for line in lines]
+        assert frames == list(range(1, 9))
+
+    def test_corrupted_params_kept(self, tmp_path):
+        pattern = make_dataset(tmp_path)
+        infofile_path = str(tmp_path/"params.info")
+        with open(infofile_path, 'w') as f:
+            f.write("{not json")
+        app = HeadlessApp(nmb_workers=1)
+        assert not app.run(pattern, infofile_path=infofile_path,
+                           outputs=[str(tmp_path/"results.csv")])
+        assert os.path.isfile(infofile_path)
+        assert not os.path.isfile(str(tmp_path/"results.csv"))
+
+    def test_no_files(self, tmp_path):
+        app = HeadlessApp(nmb_workers=1)
+        assert not app.run(str(tmp_path/"*.png"))
+
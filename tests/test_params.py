@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pickle
+import pytest
+from IMTreatment.utils import make_unit
+
+from pyDSA_gui.params import FrozenDict, freeze, GuiParams, DSAParams
+
+
+PRECOMP = {'dt': 1*make_unit('s'), 'dx': 0.1*make_unit('mm'), 'dl': 1,
+           'scaling_pts': [], 'lims': np.array([[0, 100], [0, 50]]),
+           'baseline_pts': [[0, 10], [100, 10]], 'cropt': [1, 10]}
+EDGES = ({'threshold1': 20}, {'level': 0.5}, {'nmb_edges': 2})
+FITS = ({'triple_pts': [[0, 1]]*2}, ) * 3 + ({'deg': 5}, {'k': 5},
+                                             {'sigma': 0.1})
+
+
+class MockTab(object):
+    def __init__(self, params):
+        self.params = params
+        self.calls = 0
+
+    def get_params(self):
+        self.calls += 1
+        return self.params
+
+
+class MockApp(object):
+    def __init__(self):
+        self.tab1 = MockTab(PRECOMP)
+        self.tab2 = MockTab(EDGES)
+        self.tab3 = MockTab(FITS)
+        self.tab4 = MockTab({'N': 1})
+
+
+class TestFreeze(object):
+
+    def test_freeze(self):
+        params = freeze({'a': [1, np.int64(2)], 'b': {'c': np.array([3.])}})
+        assert isinstance(params, FrozenDict)
+        assert params['a'] == (1, 2)
+        assert type(params['a'][1]) is int
+        assert params['b']['c'] == (3., )
+        assert freeze(EDGES)[0] == EDGES[0]
+
+    def test_read_only(self):
+        params = freeze({'a': 1})
+        with pytest.raises(TypeError):
+            params['a'] = 2
+        with pytest.raises(TypeError):
+            del params['a']
+        with pytest.raises(TypeError):
+            params.update({'b': 2})
+
+    def test_hash(self):
+        params1 = freeze(PRECOMP)
+        params2 = freeze(dict(PRECOMP))
+        assert hash(params1) == hash(params2)
+        assert params1 == params2
+        params3 = freeze(dict(PRECOMP, dx=0.2*make_unit('mm')))
+        assert hash(params1) != hash(params3)
+
+    def test_pickle(self):
+        params = freeze(PRECOMP)
+        params2 = pickle.loads(pickle.dumps(params))
+        assert isinstance(params2, FrozenDict)
+        assert params2 == params
+
+
+class TestGuiParams(object):
+
+    def test_snapshots(self):
+        app = MockApp()
+        params = GuiParams(app)
+        params.get_precomp_params()
+        edges = params.get_edge_params()
+        # read once from the widgets
+        assert params.get_edge_params() is edges
+        assert app.tab2.calls == 1
+        # only the changed parameters are read again
+        fits = params.get_fit_params()
+        params.update('edge')
+        assert params.get_edge_params() is not edges
+        assert params.get_fit_params() is fits
+        # precomputation parameters invalidate everything
+        params.update('precomp')
+        assert params.get_fit_params() is not fits
+        params.update()
+        params.get_precomp_params()
+        assert app.tab1.calls == 2
+
+    def test_published_by_tabimport(self):
+        from types import SimpleNamespace
+        from pyDSA_gui.tabimport import TabImport
+        app = MockApp()
+        params = GuiParams(app)
+        spinbox = SimpleNamespace(setValue=lambda value: None)
+        ui = SimpleNamespace(tab1_spinbox_frame=spinbox)
+        tab = TabImport(ui, app, SimpleNamespace(params=params), None)
+        edges = params.get_edge_params()
+        precomp = params.get_precomp_params()
+        tab.set_first_frame(2)
+        assert params.get_precomp_params() is not precomp
+        assert params.get_edge_params() is not edges
+        precomp = params.get_precomp_params()
+        tab.publish_params('1.5')
+        assert params.get_precomp_params() is not precomp
+
+
+class TestDSAParams(object):
+
+    def test_from_infofile(self):
+        infos = dict(PRECOMP, edge_params=EDGES, fit_params=FITS,
+                     edge_method='contour')
+        params = DSAParams.from_infofile(infos)
+        assert params.get_edge_params() == freeze(EDGES)
+        assert params.get_run_params() == {'N': 1}
+        assert params.edge_method == 'contour'
+        assert params.fit_method == 'ellipses'
+        with pytest.raises(ValueError):
+            DSAParams.from_infofile(PRECOMP)
+
+
+class TestParamsKeys(object):
+
+    def setup_method(self):
+        from pyDSA_gui.headless import HeadlessApp
+        self.dsa = HeadlessApp().dsa
+        self.dsa.params = DSAParams(PRECOMP, EDGES, FITS)
+        self.dsa.edge_detection_method = 'canny'
+        self.dsa.fit_method = 'ellipses'
+
+    def test_keys_memoized(self, monkeypatch):
+        edge_key = self.dsa.get_edge_key()
+        fit_key = self.dsa.get_fit_key()
+        calls = []
+        get_key = self.dsa._get_key
+        monkeypatch.setattr(self.dsa, '_get_key',
+                            lambda params: calls.append(1) or get_key(params))
+        assert self.dsa.get_edge_key() is edge_key
+        assert self.dsa.get_fit_key() is fit_key
+        assert calls == []
+
+    def test_keys_change(self):
+        edge_key = self.dsa.get_edge_key()
+        fit_key = self.dsa.get_fit_key()
+        # fit parameters do not change the edges
+        fits = (FITS[0], FITS[1], {'triple_pts': [[0, 2]]*2}) + FITS[3:]
+        self.dsa.params = DSAParams(PRECOMP, EDGES, fits)
+        assert self.dsa.get_edge_key() == edge_key
+        assert self.dsa.get_fit_key() != fit_key
+        # edge method changes both
+        self.dsa.edge_detection_method = 'contour'
+        assert self.dsa.get_edge_key() != edge_key
+        # same parameters, same keys
+        self.dsa.edge_detection_method = 'canny'
+        self.dsa.params = DSAParams(PRECOMP, EDGES, FITS)
+        assert self.dsa.get_edge_key() == edge_key
+        assert self.dsa.get_fit_key() == fit_key
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+import numpy as np
+
+from pyDSA_gui.prefetcher import Prefetcher
+from test_dsa_backend import import_images
+
+
+def wait_for(condition, timeout=10):
+    t0 = time.time()
+    while not condition():
+        if time.time() - t0 > timeout:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestPrefetcher(object):
+
+    def test_requested_frames(self, tmp_path):
+        dsa = import_images(tmp_path)
+        prefetcher = Prefetcher(dsa, nmb_frames=3, max_step=4)
+        # (stopped, to look at the queue)
+        prefetcher.stop()
+        prefetcher.request(1, None)
+        assert prefetcher.queue == [2, 3, 4]
+        # scrubbing two frames at a time
+        prefetcher.request(3, None)
+        assert prefetcher.queue == [5, 7]
+        # scrubbing backward
+        prefetcher.request(2, None)
+        assert prefetcher.queue == [1, 0]
+        # a jump does not change the direction
+        prefetcher.request(7, None)
+        assert prefetcher.queue == [6, 5, 4]
+
+    def test_prefetch(self, tmp_path):
+        dsa = import_images(tmp_path)
+        im = dsa.get_current_precomp_im(2)
+        dsa.prefetch(2)
+        try:
+            assert wait_for(lambda: all(dsa.precomp_frames.peek(i)
+                                        is not None
+                                        for i in range(3, 8)))
+        finally:
+            dsa.stop_prefetching()
+        assert dsa.prefetcher is None
+        prefetched = dsa.precomp_frames.peek(3)
+        assert dsa.get_current_precomp_im(3) is prefetched
+        # same as the frames computed in the main thread
+        dsa.precomp_frames.clear()
+        im = dsa.get_current_precomp_im(3)
+        assert im is not prefetched
+        assert np.all(im.values == prefetched.values)
+
+    def test_outdated_params(self, tmp_path):
+        dsa = import_images(tmp_path)
+        dsa.get_current_precomp_im(2)
+        params = dsa.precomp_frames_params
+        prefetcher = Prefetcher(dsa)
+        try:
+            # parameters changed since the request
+            prefetcher._prefetch(3, dict(params))
+            assert dsa.precomp_frames.peek(3) is None
+            prefetcher._prefetch(3, params)
+            assert dsa.precomp_frames.peek(3) is not None
+        finally:
+            prefetcher.stop()
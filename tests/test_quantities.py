@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import pytest
+
+from pyDSA_gui.quantities import (QUANTITIES, DISPLAYED_QUANTITIES,
+                                  QuantityEngine, get_displayed_quantities)
+
+
+class MockFits(object):
+    """ Temporal fits returning fixed arrays, counting the calls. """
+
+    def __init__(self):
+        self.dt = 0.5
+        self.times = np.arange(4)*self.dt
+        self.calls = {}
+        self.pt1s = np.array([[1., 0], [2, 0], [4, 0], [7, 0]])
+        self.pt2s = np.array([[10., 0], [11, 0], [11, 0], [12, 0]])
+        self.thetas = np.array([[80., 100], [85, 95], [90, 90], [70, 120]])
+        self.volumes = np.array([1., 0, 2, 3])
+        self.tps = [np.array([[0., 1], [0, 2], [0, 3], [0, 4]]),
+                    np.array([[0., 3], [0, 2], [0, 1], [0, 0]])]
+
+    def _call(self, name, value):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        return value
+
+    def get_drop_positions(self):
+        return self._call('positions', (self.pt1s.copy(), self.pt2s.copy()))
+
+    def get_drop_centers(self):
+        return self._call('centers', (self.pt1s + self.pt2s)/2)
+
+    def get_contact_angles(self):
+        return self._call('thetas', self.thetas.copy())
+
+    def get_base_diameters(self):
+        return self._call('base_diameters', self.pt2s[:, 0] - self.pt1s[:, 0])
+
+    def get_drop_heights(self):
+        return self._call('heights', np.ones(4))
+
+    def get_drop_areas(self):
+        return self._call('areas', np.ones(4)*2)
+
+    def get_drop_volumes(self):
+        return self._call('volumes', self.volumes.copy())
+
+    def get_ridge_height(self):
+        return self._call('ridge_heights', (np.ones(4), np.ones(4)*2))
+
+    def get_triple_points(self):
+        return self._call('triple_points', self.tps)
+
+    def get_triple_pts_contact_angles(self):
+        return self._call('tp_thetas', self.thetas.copy())
+
+
+class TestQuantities(object):
+
+    def setup_method(self):
+        self.fits = MockFits()
+        self.eng = QuantityEngine(self.fits, np.arange(4), 'mm', 's',
+                                  wetting_ridge=True)
+
+    def test_values(self):
+        # (as computed before the registry)
+        fits = self.fits
+        thetas = fits.thetas
+        expected = {
+            'Frame number': np.arange(4),
+            'Time': fits.times,
+            'Position (x, left)': fits.pt1s[:, 0],
+            'Position (x, right)': fits.pt2s[:, 0],
+            'Position (x, center)': (fits.pt1s[:, 0] + fits.pt2s[:, 0])/2,
+            'CL velocity (x, left)': np.gradient(fits.pt1s[:, 0], 0.5),
+            'CL velocity (x, right)': np.gradient(fits.pt2s[:, 0], 0.5),
+            'CA (left)': thetas[:, 0],
+            'CA (right)': 180 - thetas[:, 1],
+            'CA (mean)': (thetas[:, 0] + 180 - thetas[:, 1])/2,
+            'Base radius': (fits.pt2s[:, 0] - fits.pt1s[:, 0])/2,
+            'Height': np.ones(4),
+            'Area': np.ones(4)*2,
+            'Volume': fits.volumes,
+            'Volume (est.)': [1, np.nan, 2, 3],
+            'Ridge height (left)': np.ones(4),
+            'Ridge height (right)': np.ones(4)*2,
+            'Ridge height (mean)': np.ones(4)*2,
+            'CA (TP, left)': thetas[:, 0],
+            'CA (TP, right)': 180 - thetas[:, 1],
+            'CA (TP, mean)': (thetas[:, 0] + 180 - thetas[:, 1])/2}
+        assert set(expected) == set(QUANTITIES)
+        for name, vals in expected.items():
+            assert np.allclose(self.eng.get(name)[0], vals, equal_nan=True)
+
+    def test_units(self):
+        assert self.eng.get('Time')[1] == 's'
+        assert self.eng.get('CL velocity (x, left)')[1] == 'mm/s'
+        assert self.eng.get('Area')[1] == 'mm^2'
+        assert self.eng.get('CA (TP, mean)')[1] == '°'
+
+    def test_shared_arrays(self):
+        for name in QUANTITIES:
+            self.eng.get(name)
+        assert all(nmb == 1 for nmb in self.fits.calls.values())
+        # estimated volume does not modify the volumes
+        assert np.all(self.eng.get('Volume')[0] == self.fits.volumes)
+
+    def test_wetting_ridge_only(self):
+        eng = QuantityEngine(self.fits, np.arange(4), 'mm', 's')
+        vals, unit = eng.get('Ridge height (left)')
+        assert len(vals) == 0
+        assert unit == ""
+        with pytest.raises(KeyError):
+            eng.get('Unknown')
+
+    def test_displayed_quantities(self):
+        assert set(DISPLAYED_QUANTITIES) <= set(QUANTITIES)
+        quants = get_displayed_quantities('ellipses')
+        assert quants[:3] == ['Frame number', 'Time', 'Position (x, right)']
+        assert 'CA (TP, left)' not in quants
+        assert get_displayed_quantities('wetting ridge') \
+            == DISPLAYED_QUANTITIES
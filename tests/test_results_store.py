@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import os
+import pickle
+import pytest
+import sqlite3
+
+from pyDSA_gui import results_store
+from pyDSA_gui.results_store import ResultsStore, get_input_id, safe_loads
+
+
+class Unsafe(object):
+    def __reduce__(self):
+        return (os.system, ('echo unsafe', ))
+
+
+class UnsafeMemmap(object):
+    """ Create a file when unpickled. """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def __reduce__(self):
+        return (np.memmap, (self.filepath, np.uint8, 'w+', 0, (10, )))
+
+
+class TestResultsStore(object):
+
+    def test_round_trip(self, tmp_path):
+        filepath = str(tmp_path/"test.results")
+        store = ResultsStore(filepath, flush_every=2)
+        for ind in range(3):
+            store.save_edge('edge_key', ind, np.arange(ind + 1))
+        store.save_fit('fit_key', 1, np.ones(2))
+        edges = store.load_edges('edge_key', [0, 2, 5])
+        assert sorted(edges) == [0, 2]
+        assert np.all(edges[2] == [0, 1, 2])
+        assert store.load_edges('other_key', [0]) == {}
+        assert list(store.load_fits('fit_key', [0, 1])) == [1]
+        store.close()
+
+    def test_resume(self, tmp_path):
+        filepath = str(tmp_path/"test.results")
+        store = ResultsStore(filepath)
+        store.save_fit('fit_key', 3, np.ones(2))
+        store.close()
+        store = ResultsStore(filepath)
+        fits = store.load_fits('fit_key', range(10))
+        assert list(fits) == [3]
+        store.close()
+
+    def test_other_version_dropped(self, tmp_path, monkeypatch):
+        filepath = str(tmp_path/"test.results")
+        store = ResultsStore(filepath)
+        store.save_edge('edge_key', 0, np.ones(2))
+        store.close()
+        monkeypatch.setattr(results_store, 'get_core_version',
+                            lambda: 'other')
+        store = ResultsStore(filepath)
+        assert store.load_edges('edge_key', [0]) == {}
+        store.close()
+
+    def test_unsafe_not_loaded(self, tmp_path):
+        filepath = str(tmp_path/"test.results")
+        store = ResultsStore(filepath)
+        store.close()
+        db = sqlite3.connect(filepath)
+        db.execute("INSERT INTO edges VALUES (?, ?, ?)",
+                   ('edge_key', 0, pickle.dumps(Unsafe())))
+        db.commit()
+        db.close()
+        store = ResultsStore(filepath)
+        assert store.load_edges('edge_key', [0]) == {}
+        store.close()
+
+    def test_unsafe_numpy_not_loaded(self, tmp_path):
+        filepath = str(tmp_path/"created")
+        with pytest.raises(pickle.UnpicklingError):
+            safe_loads(pickle.dumps(UnsafeMemmap(filepath)))
+        assert not os.path.exists(filepath)
+
+    def test_results_loaded(self, tmp_path):
+        import pyDSA_core as dsa
+        from test_dsa_backend import import_images, EDGES, FITS
+        from pyDSA_gui import dsa_pipeline
+        dsa_hdd = import_images(tmp_path)
+        im = dsa_hdd.get_current_precomp_im(0)
+        edge = dsa_pipeline.detect_edge(im, 'canny', EDGES)
+        assert isinstance(safe_loads(pickle.dumps(edge)), dsa.DropEdges)
+        for method in ['circle', 'ellipse', 'ellipses', 'spline',
+                       'wetting ridge']:
+            fit, _ = dsa_pipeline.compute_fit(edge, method, FITS)
+            fit2 = safe_loads(pickle.dumps(fit))
+            assert type(fit2) is type(fit)
+        dsa_hdd.close()
+
+    def test_other_input_dropped(self, tmp_path):
+        video = tmp_path/"video.avi"
+        video.write_bytes(b"0"*10)
+        filepath = str(tmp_path/"test.results")
+        input_id = get_input_id(str(video))
+        store = ResultsStore(filepath, input_id)
+        store.save_edge('edge_key', 0, np.ones(2))
+        store.close()
+        store = ResultsStore(filepath, get_input_id(str(video)))
+        assert list(store.load_edges('edge_key', [0])) == [0]
+        store.close()
+        # Replaced video
+        video.write_bytes(b"1"*12)
+        assert get_input_id(str(video)) != input_id
+        store = ResultsStore(filepath, get_input_id(str(video)))
+        assert store.load_edges('edge_key', [0]) == {}
+        store.close()
+
+    def test_input_id(self, tmp_path):
+        filepaths = []
+        for i in range(3):
+            filepaths.append(str(tmp_path/f"im{i}.png"))
+            with open(filepaths[-1], 'wb') as f:
+                f.write(b"0")
+        input_id = get_input_id(filepaths)
+        assert get_input_id(list(filepaths)) == input_id
+        assert get_input_id(filepaths[:2]) != input_id
+        os.utime(filepaths[1], ns=(10**9, 10**9))
+        assert get_input_id(filepaths) != input_id
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#!/usr/env python3
+
+# Copyright (C) 2018-2019 Gaby Launay
+
+# Author: Gaby Launay  <gaby.launay@tutanota.com>
+
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import threading
+
+import pytest
+from PyQt5 import QtCore
+
+from pyDSA_gui.workers import BackgroundTask, Cancelled
+
+
+@pytest.fixture(scope='module')
+def qapp():
+    app = QtCore.QCoreApplication.instance()
+    if app is None:
+        app = QtCore.QCoreApplication(sys.argv)
+    return app
+
+
+def run_task(qapp, job, stop_at=None):
+    """ Run the job in a background task and return the callbacks calls. """
+    calls = []
+    threads = set()
+
+    def callback(name):
+        def func(*args):
+            threads.add(threading.current_thread())
+            calls.append((name, ) + args)
+        return func
+    task = BackgroundTask(job,
+                          **{f'on_{name}': callback(name)
+                             for name in ['progress', 'partial', 'finished',
+                                          'failed', 'cancelled']})
+    task.start()
+    if stop_at is not None:
+        stop_at.wait(10)
+        task.stop()
+    task.wait()
+    assert not task.is_running()
+    # deliver the queued signals
+    qapp.processEvents()
+    # callbacks are called in the main thread
+    assert threads <= {threading.main_thread()}
+    return calls
+
+
+class TestBackgroundTask(object):
+
+    def test_finished(self, qapp):
+        def job(hook, partial):
+            for i in range(3):
+                hook(i, 3)
+                partial(i)
+            return 'res'
+        calls = run_task(qapp, job)
+        assert calls == [('progress', 0, 3), ('partial', 0),
+                         ('progress', 1, 3), ('partial', 1),
+                         ('progress', 2, 3), ('partial', 2),
+                         ('finished', 'res')]
+
+    def test_failed(self, qapp):
+        def job(hook, partial):
+            hook(0, 1)
+            raise ValueError('wrong')
+        calls = run_task(qapp, job)
+        assert [call[0] for call in calls] == ['progress', 'failed']
+        exc_type, exc, _ = calls[1][1]
+        assert exc_type is ValueError
+        assert str(exc) == 'wrong'
+
+    def test_cancelled(self, qapp):
+        started = threading.Event()
+        done = []
+
+        def job(hook, partial):
+            started.set()
+            # (stops at the next progress report)
+            for i in range(1000):
+                hook(i, 1000)
+                threading.Event().wait(0.01)
+                done.append(i)
+            return 'res'
+        calls = run_task(qapp, job, stop_at=started)
+        assert calls[-1] == ('cancelled', )
+        assert len(done) < 1000
+        assert 'finished' not in [call[0] for call in calls]
+
+    def test_cancelled_after_the_job(self, qapp):
+        started = threading.Event()
+        resume = threading.Event()
+
+        def job(hook, partial):
+            started.set()
+            # (does not report progress, so cannot be interrupted)
+            resume.wait(10)
+            return 'res'
+        threading.Timer(0.1, resume.set).start()
+        calls = run_task(qapp, job, stop_at=started)
+        assert calls == [('cancelled', )]
+
+    def test_job_raising_cancelled(self, qapp):
+        def job(hook, partial):
+            partial('first pass')
+            raise Cancelled()
+        calls = run_task(qapp, job)
+        assert calls == [('partial', 'first pass'), ('cancelled', )]